@@ -19,7 +19,7 @@ requirements = [
     'netCDF4>=1.4',
     'dask[complete]',
     'bottleneck>=1.2.1',
-    'xarray>=0.12.0',
+    'xarray>=0.13.0',
     'pyproj>=1.9.5.1',
     'pint>=0.8',
     'boltons>=18.0',
@@ -62,7 +62,7 @@ setup(
     setup_requires=setup_requirements,
     test_suite='tests',
     tests_require=test_requirements,
-    extras_require={'docs': docs_requirements},
+    extras_require={'docs': docs_requirements, 'numba': ['numba>=0.40']},
     url='https://github.com/Ouranosinc/xclim',
     version='0.9-beta',
     zip_safe=False,
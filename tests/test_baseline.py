@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from xclim import indices as xci
+from xclim.baseline import Baseline, PercentileStore
+from xclim.utils import percentile_doy
+
+
+def tasmax(years=('1961', '1992')):
+    np.random.seed(0)
+    time = pd.date_range('{}-01-01'.format(years[0]), '{}-12-31'.format(years[1]), freq='D')
+    return xr.DataArray(280 + 10 * np.random.rand(len(time)), coords=[time, ], dims='time', name='tasmax',
+                        attrs={'standard_name': 'air_temperature',
+                               'cell_methods': 'time: maximum within days',
+                               'units': 'K'})
+
+
+class TestPercentileStore:
+
+    def test_get(self, tmpdir):
+        tx = tasmax()
+        store = PercentileStore(str(tmpdir))
+
+        p = store.get(tx, period=('1961', '1970'), window=5, per=[.1, .9])
+        assert p.dims == ('dayofyear', 'percentiles')
+        assert len(store.files()) == 2
+
+        exp = percentile_doy(tx.sel(time=slice('1961', '1970')), window=5, per=.9)
+        np.testing.assert_allclose(store.get(tx, period=('1961', '1970'), window=5, per=.9), exp)
+        assert len(store.files()) == 2
+
+        store.get(tx, period=('1961', '1970'), window=3, per=.9)
+        assert len(store.files()) == 3
+
+    def test_key(self, tmpdir):
+        tx = tasmax()
+        store = PercentileStore(str(tmpdir))
+        key = store.key(tx, ('1961', '1970'), 5, .9)
+        assert store.key(tx.copy(), ('1961', '1970'), 5, .9) == key
+        assert store.key(tx.assign_coords(time=tx.time + pd.Timedelta(days=1)), ('1961', '1970'), 5, .9) != key
+        assert store.key(tx.chunk({'time': 365}), ('1961', '1970'), 5, .9) != key
+        assert store.key(tx.chunk({'time': 365}), ('1961', '1970'), 5, .9) == \
+            store.key(tx.chunk({'time': 365}), ('1961', '1970'), 5, .9)
+
+    def test_values(self, tmpdir):
+        tx = tasmax()
+        other = tx.copy(data=tx.values + 1)
+        store = PercentileStore(str(tmpdir))
+        assert store.key(other, ('1961', '1970'), 5, .9) != store.key(tx, ('1961', '1970'), 5, .9)
+
+        p = store.get(tx, period=('1961', '1970'), per=.9)
+        q = store.get(other, period=('1961', '1970'), per=.9)
+        assert len(store.files()) == 2
+        np.testing.assert_allclose(q, p + 1)
+
+    def test_write(self, tmpdir):
+        tx = tasmax()
+        store = PercentileStore(str(tmpdir))
+        store.get(tx, period=('1961', '1970'), per=.9)
+        assert [f for f in os.listdir(str(tmpdir)) if not f.endswith('.nc')] == []
+
+    def test_default_dir(self, tmpdir, monkeypatch):
+        monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+        store = PercentileStore()
+        assert store.path == os.path.join(str(tmpdir), 'xclim', 'baseline')
+
+    def test_evict(self, tmpdir):
+        tx = tasmax()
+        store = PercentileStore(str(tmpdir))
+        store.get(tx, period=('1961', '1970'), per=.1)
+        first = store.files()[0]
+        size = store.size()
+
+        store.max_size = 2 * size
+        store.get(tx, period=('1961', '1970'), per=.5)
+        store.get(tx, period=('1961', '1970'), per=.9)
+        assert len(store.files()) == 2
+        assert not os.path.exists(first)
+
+    def test_indices(self, tmpdir):
+        tx = tasmax()
+        ref = Baseline(period=('1961', '1990'), window=5, store=PercentileStore(str(tmpdir)))
+        t90 = percentile_doy(tx.sel(time=slice('1961', '1990')), window=5, per=.9)
+
+        np.testing.assert_array_equal(xci.tx90p(tx, ref), xci.tx90p(tx, t90))
+        np.testing.assert_array_equal(xci.warm_spell_duration_index(tx, ref, window=3),
+                                      xci.warm_spell_duration_index(tx, t90, window=3))
+        assert len(ref.store.files()) == 1
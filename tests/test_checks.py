@@ -91,3 +91,185 @@ class TestMissingAnyFills:
         ts = tasmin_series(a)
         miss = checks.missing_any(ts, freq='A-JUN')
         np.testing.assert_equal(miss, [False])
+
+    @pytest.mark.parametrize('calendar,ndays', [('360_day', 360), ('noleap', 365), ('all_leap', 366),
+                                                ('standard', 366), ('julian', 366)])
+    def test_cftime(self, calendar, ndays):
+        times = xr.cftime_range('1999-12-01', periods=ndays + 62, freq='D', calendar=calendar)
+        da = xr.DataArray(np.arange(ndays + 62.), [('time', times)])
+        da[ndays + 40] = np.nan
+
+        np.testing.assert_array_equal(checks.missing_any(da, 'YS'), [True, False, True])
+        np.testing.assert_array_equal(checks.missing_any(da, 'AS-DEC'), [False, True])
+        miss = checks.missing_any(da, 'MS')
+        assert not miss[:13].any()
+        assert miss[13]
+
+
+class TestMissingPolicies:
+
+    def test_missing_pct(self, tas_series):
+        a = np.arange(365.)
+        a[5:10] = np.nan
+        a[40:50] = np.nan
+        ts = tas_series(a, start='1/1/2001')
+        np.testing.assert_array_equal(checks.missing_pct(ts, 'MS', tolerance=.2)[:3], [False, True, False])
+        np.testing.assert_array_equal(checks.missing_pct(ts, 'YS', tolerance=.05), [False])
+        np.testing.assert_array_equal(checks.missing_pct(ts, 'YS', tolerance=0), checks.missing_any(ts, 'YS'))
+
+        with pytest.raises(ValueError):
+            checks.missing_pct(ts, 'YS', tolerance=5)
+
+    def test_missing_wmo(self, tas_series):
+        a = np.arange(365. * 2)
+        a[5:10] = np.nan  # 5 consecutive in January
+        a[400:404] = np.nan  # 4 consecutive in February
+        a[410:420:2] = np.nan  # 9 in February
+        ts = tas_series(a, start='1/1/2001')
+        np.testing.assert_array_equal(checks.missing_wmo(ts, 'YS'), [True, False])
+        np.testing.assert_array_equal(checks.missing_wmo(ts, 'MS')[:2], [True, False])
+        np.testing.assert_array_equal(checks.missing_wmo(ts, 'YS', nm=9), [True, True])
+        np.testing.assert_array_equal(checks.missing_wmo(ts[1:], 'YS', nc=6), [True, False])
+
+        with pytest.raises(ValueError):
+            checks.missing_wmo(ts, '7D')
+
+    def test_shared_counts(self, tas_series):
+        a = np.arange(365.)
+        a[5:10] = np.nan
+        ts = tas_series(a)
+        misses = checks.missing_cache.misses
+        checks.missing_any(ts, 'MS')
+        checks.missing_pct(ts, 'MS')
+        checks.missing_wmo(ts, 'MS')
+        assert checks.missing_cache.misses == misses + 2
+
+    def test_valid_missing_data_threshold(self, tas_series):
+        a = np.arange(365.)
+        a[5:10] = np.nan
+        ts = tas_series(a, start='1/1/2001')
+
+        def compute(da, freq='MS'):
+            return da.resample(time=freq).max()
+
+        out = checks.valid_missing_data_threshold(compute, threshold=.2)(ts)
+        assert out[0] == 30
+        out = checks.valid_missing_data_threshold(compute, threshold=.1)(ts, freq='YS')
+        assert out[0] == 364
+        assert np.isnan(checks.valid_missing_data_threshold(compute)(ts)[0])
+
+
+class TestExpectedDays:
+
+    def test_days_in_month(self):
+        np.testing.assert_array_equal(checks.days_in_month([1900, 1900, 2000, 2001], 2, 'standard'),
+                                      [28, 28, 29, 28])
+        np.testing.assert_array_equal(checks.days_in_month([1900, 2000], 2, 'julian'), [29, 29])
+        np.testing.assert_array_equal(checks.days_in_month([2000, 2001], [2, 3], '360_day'), [30, 30])
+        np.testing.assert_array_equal(checks.days_in_month(1582, 10, 'standard'), 21)
+
+    @pytest.mark.parametrize('freq', ['YS', 'AS-JUL', 'A-JUN', 'QS-DEC', 'Q-NOV', 'MS', 'M', '2MS', '7D'])
+    def test_shift(self, freq):
+        times = xr.cftime_range('1999-07-01', periods=1000, freq='D', calendar='noleap')
+        da = xr.DataArray(np.arange(1000.), [('time', times)])
+        index = da.resample(time=freq).count().indexes['time']
+        np.testing.assert_array_equal(checks.expected_days(index, freq), checks._shifted_days(index, freq))
+
+        times = pd.date_range('1999-07-01', periods=1000, freq='D')
+        index = xr.DataArray(np.arange(1000.), [('time', times)]).resample(time=freq).count().indexes['time']
+        np.testing.assert_array_equal(checks.expected_days(index, freq), checks._shifted_days(index, freq))
+
+
+class TestMaskCache:
+
+    def test_hits(self, tas_series):
+        cache = checks.MaskCache()
+        a = np.arange(360.)
+        a[5:10] = np.nan
+        ts = tas_series(a)
+
+        m1 = cache(checks.missing_any, ts, 'MS')
+        m2 = cache(checks.missing_any, ts, 'MS')
+        assert m1 is m2
+        cache(checks.missing_any, ts, 'YS')
+        assert (cache.hits, cache.misses) == (1, 2)
+
+        # Same missing values pattern in a different array.
+        cache(checks.missing_any, tas_series(a + 1), 'MS')
+        assert cache.hits == 2
+
+        # Modified values
+        ts[20] = np.nan
+        np.testing.assert_array_equal(cache(checks.missing_any, ts, 'MS'), checks.missing_any(ts, 'MS'))
+        assert cache.misses == 3
+
+    def test_sharing(self, tas_series, monkeypatch):
+        cache = checks.MaskCache()
+        ts = tas_series(np.arange(360.))
+        calls = []
+        fingerprint = checks.MaskCache.fingerprint
+        monkeypatch.setattr(checks.MaskCache, 'fingerprint',
+                            staticmethod(lambda da: calls.append(1) or fingerprint(da)))
+
+        # In-memory arrays are hashed once per object within the context, and on each call outside of it.
+        with cache.sharing():
+            for freq in ['MS', 'MS', 'YS']:
+                cache(checks.valid_count, ts, freq)
+            assert len(calls) == 1
+            cache(checks.valid_count, ts.copy(), 'MS')
+            assert len(calls) == 2
+        cache(checks.valid_count, ts, 'MS')
+        assert len(calls) == 3
+        assert (cache.hits, cache.misses) == (3, 2)
+
+    def test_dask(self, tas_series):
+        cache = checks.MaskCache()
+        ts = tas_series(np.arange(360.)).chunk({'time': 100})
+        cache(checks.missing_any, ts, 'MS')
+        cache(checks.missing_any, ts.copy(), 'MS')
+        cache(checks.missing_any, ts + 1, 'MS')
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_freed(self, tas_series):
+        import gc
+
+        cache = checks.MaskCache()
+        ts = tas_series(np.arange(360.))
+        cache(checks.missing_any, ts, 'MS')
+        assert len(cache) == 1
+        del ts
+        gc.collect()
+        assert len(cache) == 0
+
+    def test_coords(self, tas_series):
+        from xclim import atmos
+
+        def tile(lat):
+            ts = tas_series(np.arange(360.))
+            return xr.concat([ts, ts + 1], dim=xr.DataArray(lat, dims='lat', name='lat')).transpose('time', 'lat')
+
+        cache = checks.MaskCache()
+        t1, t2 = tile([0., 1.]), tile([10., 11.])
+        cache(checks.missing_any, t1, 'MS')
+        cache(checks.missing_any, t2, 'MS')
+        assert cache.misses == 2
+
+        out1 = atmos.tx_max(t1, freq='MS')
+        out2 = atmos.tx_max(t2, freq='MS')
+        assert out2.shape == out1.shape == (12, 2)
+        np.testing.assert_array_equal(out2.lat, [10, 11])
+
+    def test_owner(self, tas_series):
+        import gc
+
+        cache = checks.MaskCache()
+        ts = tas_series(np.arange(360.))
+        with cache.owner(ts):
+            cache(checks.missing_any, ts[:200], 'MS')
+        gc.collect()
+        assert len(cache) == 1
+        cache(checks.missing_any, ts[:200], 'MS')
+        assert cache.hits == 1
+        del ts
+        gc.collect()
+        assert len(cache) == 0
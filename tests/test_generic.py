@@ -1,13 +1,17 @@
 import numpy as np
+import pandas as pd
 import xarray as xr
+import pytest
+from scipy import stats
 from scipy.stats import lognorm
 
-from xclim import generic
+import xclim
+from xclim import generic, lmoments
 
 
 class TestFA(object):
 
-    def setup(self):
+    def setup_method(self):
         self.nx, self.ny = 2, 3
         x = np.arange(0, self.nx)
         y = np.arange(0, self.ny)
@@ -41,6 +45,74 @@ class TestFA(object):
         q0 = lognorm.ppf(1 - 1. / T, *p0)
         np.testing.assert_array_equal(q[0, 0, 0], q0)
 
+    @pytest.mark.parametrize('dist,params', [('norm', (10, 2)),
+                                             ('gumbel_r', (10, 2)),
+                                             ('pearson3', (.8, 10, 2)),
+                                             ('gamma', (3, 1, 2)),
+                                             ('lognorm', (.5, 1, 2)),
+                                             ('genextreme', (-.1, 10, 2)),
+                                             ('genextreme', (.2, 10, 2))])
+    def test_fit_moments(self, dist, params):
+        dc = getattr(stats, dist)
+        x = dc.rvs(*params, size=(20000, 2), random_state=1)
+        da = xr.DataArray(x, dims=('time', 'x')).chunk({'x': 1})
+
+        p = generic.fit(da, dist, method='MM')
+        assert p.dims == ('dparams', 'x')
+        assert p.attrs['estimator'] == 'Method of moments'
+        np.testing.assert_allclose(p.isel(x=0), params, rtol=.1, atol=.02)
+
+        # The moments of the fitted distribution match those of the sample, up to the number of parameters.
+        m, v, s = dc.stats(*p.isel(x=0).values, moments='mvs')
+        n = len(params)
+        np.testing.assert_allclose([m, np.sqrt(v), s][:n], [x[:, 0].mean(), x[:, 0].std(), stats.skew(x[:, 0])][:n])
+
+    def test_fa_moments(self):
+        q = generic.fa(self.da, [2, 10], 'norm', method='MM')
+        p0 = stats.norm.fit(self.da.values[:, 0, 0])
+        np.testing.assert_allclose(q[:, 0, 0], stats.norm.isf([.5, .1], *p0))
+
+        with pytest.raises(ValueError):
+            generic.fit(self.da, 'beta', method='MM')
+
+    def test_fa_lmoments(self):
+        q = generic.fa(self.da.chunk({'x': 1}), [2, 10], 'genextreme', method='lmoments')
+        assert q.dims == ('return_period', 'x', 'y')
+        assert q.attrs['estimator'] == 'Method of L-moments'
+
+        p = lmoments.fit(self.da.values[:, 0, 0], 'genextreme')
+        np.testing.assert_allclose(q[:, 0, 0], stats.genextreme.isf([.5, .1], *p))
+
+    def test_fa_bootstrap(self):
+        T = [2, 10]
+        ci = generic.fa_bootstrap(self.da, T, 'gumbel_r', ci=.9, n=200, seed=3)
+        assert ci.dims == ('return_period', 'bounds', 'x', 'y')
+        np.testing.assert_array_equal(ci.bounds, ['lower', 'upper'])
+
+        # The bounds are reproducible, whatever the chunks, and contain the point estimates.
+        np.testing.assert_array_equal(ci, generic.fa_bootstrap(self.da.chunk({'x': 1}), T, 'gumbel_r', ci=.9, n=200,
+                                                               seed=3, batch=30))
+        q = generic.fa(self.da, T, 'gumbel_r', method='lmoments')
+        assert (ci.sel(bounds='lower') < q).all()
+        assert (ci.sel(bounds='upper') > q).all()
+
+        # Wider intervals at higher confidence levels.
+        ci99 = generic.fa_bootstrap(self.da, T, 'gumbel_r', ci=.99, n=200, seed=3)
+        assert (ci99.sel(bounds='upper') > ci.sel(bounds='upper')).all()
+
+        with pytest.raises(ValueError):
+            generic.fa_bootstrap(self.da, T, 'gumbel_r', method='ML')
+
+    @pytest.mark.parametrize('method', ['ML', 'MM', 'lmoments'])
+    def test_time_chunks(self, method):
+        dac = self.da.chunk({'time': 20})
+        np.testing.assert_allclose(generic.fa(dac, [2, 10], 'gumbel_r', method=method),
+                                   generic.fa(self.da, [2, 10], 'gumbel_r', method=method))
+        if method != 'ML':
+            np.testing.assert_array_equal(generic.fa_bootstrap(dac, [2, 10], 'gumbel_r', method=method, n=50, seed=3),
+                                          generic.fa_bootstrap(self.da, [2, 10], 'gumbel_r', method=method, n=50,
+                                                               seed=3))
+
 
 class TestSelectResampleOp():
 
@@ -60,3 +132,45 @@ class TestSelectResampleOp():
         q = q_series(np.arange(1000))
         o = generic.select_resample_op(q, 'count', freq='AS-DEC', season='DJF')
         assert o[0] == 31 + 29
+
+
+class TestRollingResampleOp():
+
+    def da(self):
+        time = xr.IndexVariable('time', pd.date_range('2000-01-01', periods=1500, freq='D'))
+        x = np.random.RandomState(0).gamma(.5, 5, (1500, 3))
+        x[[10, 400, 401, 1200], [0, 1, 1, 2]] = np.nan
+        return xr.DataArray(x, dims=('time', 'x'), coords={'time': time}, attrs={'units': 'mm'})
+
+    @pytest.mark.parametrize('op,how', [('max', 'sum'), ('min', 'mean')])
+    def test_simple(self, op, how):
+        da = self.da()
+        exp = getattr(getattr(da.rolling(time=5), how)().resample(time='MS'), op)(dim='time')
+
+        out = generic.rolling_resample_op(da, 5, op, freq='MS', how=how)
+        assert out.dims == ('time', 'x')
+        assert out.units == 'mm'
+        np.testing.assert_allclose(out, exp)
+        np.testing.assert_array_equal(out.time, exp.time)
+
+        out = generic.rolling_resample_op(da.chunk({'time': 100}), 5, op, freq='MS', how=how)
+        np.testing.assert_allclose(out, exp)
+
+    def test_max_chunk(self):
+        da = self.da()
+        exp = generic.rolling_resample_op(da, 5, 'max', freq='MS')
+        with xclim.set_options(max_chunk=1500):
+            out = generic.rolling_resample_op(da.chunk({'time': 100}), 5, 'max', freq='MS')
+        assert out.chunks[1] == (1, 1, 1)
+        np.testing.assert_array_equal(out, exp)
+
+    def test_indexer(self):
+        da = self.da()
+        out = generic.rolling_resample_op(da, 3, 'max', freq='AS-DEC', season='DJF')
+        for i in range(da.x.size):
+            exp = generic.select_resample_op(da[:, i].rolling(time=3).mean(), 'max', freq='AS-DEC', season='DJF')
+            np.testing.assert_allclose(out[:, i], exp)
+
+    def test_errors(self):
+        with pytest.raises(ValueError):
+            generic.rolling_resample_op(self.da(), 3, 'mean')
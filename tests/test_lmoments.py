@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from xclim import lmoments
+
+
+class TestLmoments:
+
+    def test_lmoments(self):
+        x = stats.genextreme.rvs(-.1, 10, 2, size=(3, 30), random_state=2)
+        x[0, 3] = np.nan
+        lm = lmoments.lmoments(x)
+        assert lm.shape == (3, 4)
+
+        # Direct computation of the probability weighted moments of the valid values.
+        v = np.sort(x[0][~np.isnan(x[0])])
+        n = v.size
+        j = np.arange(n)
+        b = [np.mean(v * np.prod([(j - i) / (n - 1 - i) for i in range(r)], axis=0)) for r in range(4)]
+        l2 = 2 * b[1] - b[0]
+        expected = [b[0], l2, (6 * b[2] - 6 * b[1] + b[0]) / l2, (20 * b[3] - 30 * b[2] + 12 * b[1] - b[0]) / l2]
+        np.testing.assert_allclose(lm[0], expected)
+
+        # The L-scale is half the mean absolute difference between pairs of values.
+        v = x[1]
+        np.testing.assert_allclose(lm[1, 1], np.abs(v[:, None] - v).sum() / (v.size * (v.size - 1)) / 2)
+
+        with pytest.raises(ValueError):
+            lmoments.lmoments(x, nmom=5)
+
+    @pytest.mark.parametrize('dist,params', [('norm', (10, 2)),
+                                             ('gumbel_r', (10, 2)),
+                                             ('pearson3', (.8, 10, 2)),
+                                             ('pearson3', (-.8, 10, 2)),
+                                             ('gamma', (3, 1, 2)),
+                                             ('lognorm', (.5, 1, 2)),
+                                             ('genextreme', (-.1, 10, 2)),
+                                             ('genextreme', (.2, 10, 2))])
+    def test_fit(self, dist, params):
+        x = getattr(stats, dist).rvs(*params, size=(2, 50000), random_state=1)
+        p = lmoments.fit(x, dist)
+        assert p.shape == (2, len(params))
+        np.testing.assert_allclose(p[0], params, rtol=.02, atol=.01)
+
+    def test_unknown(self):
+        with pytest.raises(ValueError):
+            lmoments.fit(np.ones(10), 'beta')
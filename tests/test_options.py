@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+import xclim
+from xclim import atmos, baseline, indices, run_length as rl
+from xclim.options import OPTIONS
+from xclim.testing.common import tas_series, tasmax_series
+
+TAS_SERIES = tas_series
+TASMAX_SERIES = tasmax_series
+
+
+class TestSetOptions:
+
+    def test_context(self):
+        assert OPTIONS['dtype'] is None
+        with xclim.set_options(dtype='float32'):
+            assert OPTIONS['dtype'] == 'float32'
+        assert OPTIONS['dtype'] is None
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            xclim.set_options(not_an_option=1)
+        with pytest.raises(ValueError):
+            xclim.set_options(dtype='int8')
+        with pytest.raises(ValueError):
+            xclim.set_options(max_chunk=0)
+        assert OPTIONS['max_chunk'] == 1000000
+
+    def test_backend(self):
+        with xclim.set_options(backend='numpy'):
+            assert rl.get_kernel('rle') is rl._numpy_kernels['rle']
+
+    def test_max_chunk(self, tas_series):
+        tas = tas_series(np.arange(365.))
+        tas = xr.concat([tas] * 10, dim='x').chunk({'time': 100})
+        with xclim.set_options(max_chunk=365 * 2):
+            out = rl.rle(tas > 100)
+        assert out.chunks == ((2,) * 5, (365,))
+
+    def test_baseline(self, tmpdir):
+        with xclim.set_options(baseline_dir=str(tmpdir), baseline_max_size=1000):
+            store = baseline.PercentileStore()
+        assert store.path == str(tmpdir)
+        assert store.max_size == 1000
+
+    def test_missing_policy(self, tasmax_series):
+        a = np.arange(365.) + 250
+        a[5:10] = np.nan
+        tx = tasmax_series(a, start='1/1/2001')
+        assert np.isnan(atmos.tx_mean(tx, freq='MS')[0])
+        with xclim.set_options(missing_policy='pct', missing_options={'tolerance': .2}):
+            assert not np.isnan(atmos.tx_mean(tx, freq='MS')[0])
+
+
+class TestFloat32:
+
+    def test_indicators(self, tasmax_series):
+        tx = tasmax_series(np.arange(365.) + 250, start='1/1/2001')
+
+        with xclim.set_options(dtype='float32'):
+            out = atmos.tx_days_above(tx, thresh='300 K')
+            assert out.dtype == np.float32
+            assert atmos.tx_mean(tx).dtype == np.float32
+            assert xclim.utils._cast(tx).attrs == tx.attrs
+
+        np.testing.assert_array_equal(out, atmos.tx_days_above(tx, thresh='300 K'))
+        assert atmos.tx_mean(tx).dtype == np.float64
+
+    def test_counts(self, tas_series):
+        tas = tas_series(np.arange(365.) % 20)
+        with xclim.set_options(dtype='float32'):
+            assert rl.rle(tas > 5).dtype == np.int16
+            assert rl.longest_run(tas > 5).dtype == np.int16
+            assert rl.resample_longest_run(tas > 5, 'MS').dtype == np.int16
+            assert rl.first_run(tas > 5, 3).dtype == np.float32
+            assert xclim.utils.threshold_count(tas, '>', 5, 'MS').dtype == np.int16
+            assert indices.tx_days_above(tas, thresh='5 K', freq='MS').dtype == np.int16
+            assert indices.daily_freezethaw_cycles(tas, tas, freq='MS').dtype == np.int16
+        assert rl.longest_run(tas > 5).dtype == np.int64
+
+    def test_long_counts(self, tas_series):
+        # Counts are bounded by the length of the periods, not of the whole series.
+        tas = tas_series(np.arange(40000.) % 20, start='1/1/1900')
+        t90 = xclim.utils.percentile_doy(tas, per=.9)
+        with xclim.set_options(dtype='float32'):
+            assert indices.tx_days_above(tas, thresh='5 K').dtype == np.int16
+            assert indices.tg90p(tas, t90).dtype == np.int16
+            assert rl.resample_longest_run(tas > 5, 'YS').dtype == np.int16
+            assert rl.longest_run(tas > 5).dtype == np.int32
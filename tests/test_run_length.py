@@ -4,6 +4,7 @@ import xarray as xr
 import pandas as pd
 import numpy as np
 import os
+import pytest
 
 TAS_SERIES = tas_series
 TESTS_HOME = os.path.abspath(os.path.dirname(__file__))
@@ -21,6 +22,69 @@ class TestRLE:
 
         v, l, p = rl.rle_1d(da != 0)
 
+    def test_rle(self):
+        values = np.zeros(365, bool)
+        time = pd.date_range('7/1/2000', periods=len(values), freq=pd.DateOffset(days=1))
+        values[1:11] = True
+        values[20:23] = True
+        values[-1] = True
+        da = xr.DataArray(values, coords={'time': time}, dims='time')
+
+        d = rl.rle(da)
+        np.testing.assert_array_equal(d[[1, 20, 364]], [10, 3, 1])
+        assert d.sum() == values.sum()
+
+    def test_chunked(self):
+        np.random.seed(0)
+        time = pd.date_range('7/1/2000', periods=400, freq=pd.DateOffset(days=1))
+        da = xr.DataArray(np.random.rand(400, 3, 4) > .4, coords={'time': time}, dims=('time', 'x', 'y'))
+        dac = da.chunk({'time': 50, 'x': 1})
+
+        np.testing.assert_array_equal(rl.longest_run(da), rl.longest_run(dac))
+        np.testing.assert_array_equal(rl.windowed_run_count(da, 3), rl.windowed_run_count(dac, 3))
+        np.testing.assert_array_equal(rl.windowed_run_events(da, 3), rl.windowed_run_events(dac, 3))
+        np.testing.assert_array_equal(rl.first_run(da, 3), rl.first_run(dac, 3))
+
+        lt_orig = da.resample(time='M').apply(rl.longest_run_ufunc)
+        lt_Ndim = dac.resample(time='M').apply(rl.longest_run, dim='time')
+        np.testing.assert_array_equal(lt_orig, lt_Ndim)
+
+
+class TestKernels:
+
+    @pytest.mark.parametrize('name,args', [('rle', ()), ('longest_run', ()), ('windowed_run_events', (3,)),
+                                           ('windowed_run_count', (3,)), ('first_run', (3,))])
+    def test_numba_numpy(self, name, args):
+        pytest.importorskip('numba')
+        np.random.seed(0)
+        a = np.random.rand(10, 5, 100) > .3
+        a[0, 0] = False
+        a[0, 1] = True
+        np.testing.assert_array_equal(rl._numba_kernels()[name](a, *args), rl._numpy_kernels[name](a, *args))
+
+    @pytest.mark.parametrize('name', ['longest_run', 'windowed_run_events', 'windowed_run_count', 'first_run'])
+    def test_grouped_numba_numpy(self, name):
+        pytest.importorskip('numba')
+        np.random.seed(0)
+        a = np.random.rand(10, 5, 100) > .3
+        starts = np.array([0, 7, 31, 32, 60])
+        name = 'grouped_' + name
+        np.testing.assert_array_equal(rl._numba_kernels()[name](a, starts, 3),
+                                      rl._numpy_kernels[name](a, starts, 3))
+
+    @pytest.mark.parametrize('backend', ['numpy', 'default'])
+    def test_1d(self, backend, monkeypatch):
+        if backend == 'numpy':
+            monkeypatch.setattr(rl, 'numba', None)
+        np.random.seed(1)
+        a = np.random.rand(20, 50) > .4
+        k = rl.get_kernel('windowed_run_count')
+        np.testing.assert_array_equal(k(a, 3), [rl.windowed_run_count_1d(x, 3) for x in a])
+        k = rl.get_kernel('first_run')
+        np.testing.assert_array_equal(k(a, 3), [rl.first_run_1d(x, 3) for x in a])
+        k = rl.get_kernel('longest_run')
+        np.testing.assert_array_equal(k(a), [rl.longest_run_1d(x) for x in a])
+
 
 class TestLongestRun:
     nc_pr = os.path.join(TESTS_DATA, 'NRCANdaily', 'nrcan_canada_daily_pr_1990.nc')
@@ -156,3 +220,41 @@ class TestWindowedRunCount:
         lt_orig = da3d.resample(time='M').apply(rl.windowed_run_count_ufunc, window=4)
         lt_Ndim = da3d.resample(time='M').apply(rl.windowed_run_count, window=4, dim='time')
         np.testing.assert_array_equal(lt_orig, lt_Ndim)
+
+
+class TestResampleRunLength:
+
+    @pytest.mark.parametrize('freq', ['MS', 'YS', 'QS-DEC'])
+    def test_simple(self, freq):
+        np.random.seed(0)
+        time = pd.date_range('7/1/2000', periods=800, freq=pd.DateOffset(days=1))
+        da = xr.DataArray(np.random.rand(800, 2, 3) > .3, coords={'time': time}, dims=('time', 'x', 'y'))
+        dac = da.chunk({'time': 100})
+
+        exp = da.resample(time=freq).apply(rl.longest_run, dim='time')
+        xr.testing.assert_equal(rl.resample_longest_run(dac, freq), exp)
+
+        for func, rfunc in [(rl.windowed_run_count, rl.resample_windowed_run_count),
+                            (rl.windowed_run_events, rl.resample_windowed_run_events),
+                            (rl.first_run, rl.resample_first_run)]:
+            exp = da.resample(time=freq).apply(func, window=3, dim='time')
+            xr.testing.assert_equal(rfunc(dac, 3, freq), exp)
+
+    def test_max_chunk(self):
+        time = pd.date_range('1/1/2001', periods=400, freq=pd.DateOffset(days=1))
+        da = xr.DataArray(np.ones((400, 10, 10), bool), coords={'time': time}, dims=('time', 'x', 'y'))
+        dac = da.chunk({'time': 100})
+
+        out = rl._apply_grouped_rl('longest_run', dac, 'MS', 'time', max_chunk=400 * 25)
+        assert max(out.chunks[1]) == 5
+        np.testing.assert_array_equal(out, rl.resample_longest_run(da, 'MS'))
+
+    def test_run_across_periods(self):
+        values = np.zeros(365, bool)
+        time = pd.date_range('1/1/2001', periods=len(values), freq=pd.DateOffset(days=1))
+        values[25:36] = True
+        da = xr.DataArray(values, coords={'time': time}, dims='time')
+
+        np.testing.assert_array_equal(rl.resample_longest_run(da, 'MS')[:3], [6, 5, 0])
+        np.testing.assert_array_equal(rl.resample_windowed_run_events(da, 6, 'MS')[:3], [1, 0, 0])
+        np.testing.assert_array_equal(rl.resample_first_run(da, 3, 'MS')[:3], [25, 0, np.nan])
@@ -18,6 +18,12 @@ class Test_FA():
         out = streamflow.freq_analysis(ndq_series, mode='max', t=[2, 5], dist='gamma')
         assert out.long_name == 'N-year return period max annual 1-day flow'
 
+    def test_lmoments(self, ndq_series):
+        out = streamflow.freq_analysis(ndq_series, mode='max', t=[2, 5], dist='gumbel_r', method='lmoments')
+        ml = streamflow.freq_analysis(ndq_series, mode='max', t=[2, 5], dist='gumbel_r')
+        assert out.attrs['estimator'] == 'Method of L-moments'
+        np.testing.assert_allclose(out, ml, rtol=.2)
+
 
 class TestStats():
 
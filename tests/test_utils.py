@@ -25,8 +25,10 @@ import pandas as pd
 import pytest
 import xarray as xr
 import dask
+from pyproj import Geod
 
 
+import xclim
 from xclim import ensembles
 from xclim import indices
 from xclim import subset
@@ -58,19 +60,19 @@ class TestEnsembleStats:
 
     def test_calc_perc(self):
         ens = ensembles.create_ensemble(self.nc_files_simple)
-        out1 = ensembles.ensemble_percentiles(ens)
-        np.testing.assert_array_equal(np.percentile(ens['tg_mean'][:, 0, 5, 5], 10), out1['tg_mean_p10'][0, 5, 5])
-        np.testing.assert_array_equal(np.percentile(ens['tg_mean'][:, 0, 5, 5], 50), out1['tg_mean_p50'][0, 5, 5])
-        np.testing.assert_array_equal(np.percentile(ens['tg_mean'][:, 0, 5, 5], 90), out1['tg_mean_p90'][0, 5, 5])
+        out1 = ensembles.ensemble_percentiles(ens, split=True)
+        np.testing.assert_allclose(np.percentile(ens['tg_mean'][:, 0, 5, 5], 10), out1['tg_mean_p10'][0, 5, 5])
+        np.testing.assert_allclose(np.percentile(ens['tg_mean'][:, 0, 5, 5], 50), out1['tg_mean_p50'][0, 5, 5])
+        np.testing.assert_allclose(np.percentile(ens['tg_mean'][:, 0, 5, 5], 90), out1['tg_mean_p90'][0, 5, 5])
         assert np.all(out1['tg_mean_p90'] > out1['tg_mean_p50'])
         assert np.all(out1['tg_mean_p50'] > out1['tg_mean_p10'])
-        out1 = ensembles.ensemble_percentiles(ens, values=(25, 75))
+        out1 = ensembles.ensemble_percentiles(ens, values=(25, 75), split=True)
         assert np.all(out1['tg_mean_p75'] > out1['tg_mean_p25'])
 
     def test_calc_perc_blocks(self):
         ens = ensembles.create_ensemble(self.nc_files_simple)
-        out1 = ensembles.ensemble_percentiles(ens)
-        out2 = ensembles.ensemble_percentiles(ens, values=(10, 50, 90), time_block=10)
+        out1 = ensembles.ensemble_percentiles(ens, split=True)
+        out2 = ensembles.ensemble_percentiles(ens, values=(10, 50, 90), time_block=10, split=True)
         np.testing.assert_array_equal(out1['tg_mean_p10'], out2['tg_mean_p10'])
         np.testing.assert_array_equal(out1['tg_mean_p50'], out2['tg_mean_p50'])
         np.testing.assert_array_equal(out1['tg_mean_p90'], out2['tg_mean_p90'])
@@ -80,11 +82,11 @@ class TestEnsembleStats:
 
         ens.tg_mean[2, 0, 5, 5] = np.nan
         ens.tg_mean[2, 7, 5, 5] = np.nan
-        out1 = ensembles.ensemble_percentiles(ens)
+        out1 = ensembles.ensemble_percentiles(ens, split=True)
         np.testing.assert_array_equal(np.percentile(ens['tg_mean'][:, 0, 5, 5], 10), np.nan)
         np.testing.assert_array_equal(np.percentile(ens['tg_mean'][:, 7, 5, 5], 10), np.nan)
-        np.testing.assert_array_equal(np.nanpercentile(ens['tg_mean'][:, 0, 5, 5], 10), out1['tg_mean_p10'][0, 5, 5])
-        np.testing.assert_array_equal(np.nanpercentile(ens['tg_mean'][:, 7, 5, 5], 10), out1['tg_mean_p10'][7, 5, 5])
+        np.testing.assert_allclose(np.nanpercentile(ens['tg_mean'][:, 0, 5, 5], 10), out1['tg_mean_p10'][0, 5, 5])
+        np.testing.assert_allclose(np.nanpercentile(ens['tg_mean'][:, 7, 5, 5], 10), out1['tg_mean_p10'][7, 5, 5])
         assert np.all(out1['tg_mean_p90'] > out1['tg_mean_p50'])
         assert np.all(out1['tg_mean_p50'] > out1['tg_mean_p10'])
 
@@ -97,6 +99,183 @@ class TestEnsembleStats:
         np.testing.assert_array_equal(ens['tg_mean'][:, 0, 5, 5].min(dim='realization'), out1.tg_mean_min[0, 5, 5])
 
 
+class TestEnsembleAccumulator:
+    def ens(self, n=30):
+        data = np.random.RandomState(0).normal(size=(n, 12, 4))
+        data[3, 2, 1] = np.nan
+        data[:, 4, 3] = np.nan
+        return xr.Dataset({'tg_mean': (('realization', 'time', 'lat'), data, {'description': 'Mean temperature'})},
+                          coords={'time': pd.date_range('2000-01-01', periods=12, freq='MS'), 'lat': np.arange(4)})
+
+    def test_create_ensemble(self, tmp_path):
+        fns = []
+        for i, (start, periods) in enumerate([('2000-01-01', 24), ('2000-07-01', 24), ('2000-03-01', 12)]):
+            time = pd.date_range(start, periods=periods, freq='MS')
+            ds = xr.Dataset({'tg_mean': (('time', 'lat'), np.full((periods, 4), float(i)))},
+                            coords={'time': time, 'lat': np.arange(4)})
+            fns.append(str(tmp_path / 'ens{}.nc'.format(i)))
+            ds.to_netcdf(fns[-1])
+
+        with xclim.set_options(chunks={'time': 5}):
+            ens = ensembles.create_ensemble(fns)
+        assert ens.tg_mean.dims == ('realization', 'time', 'lat')
+        assert isinstance(ens.tg_mean.data, dask.array.Array)
+        assert max(ens.tg_mean.chunks[1]) <= 5
+        np.testing.assert_array_equal(ens.time, pd.date_range('2000-07-01', '2001-02-01', freq='MS'))
+        np.testing.assert_array_equal(ens.tg_mean[:, 0, 0], [0, 1, 2])
+
+        ens = ensembles.create_ensemble([fns[:1], fns[1:2]], mf_flag=True)
+        assert ens.time.size == 18
+
+    def test_create_ensemble_360_day(self, tmp_path):
+        fns = []
+        for i in range(2):
+            time = xr.cftime_range('2000-01-01', periods=90 - 30 * i, freq='D', calendar='360_day')
+            ds = xr.Dataset({'tg_mean': (('time',), np.full(time.size, float(i)))}, coords={'time': time})
+            fns.append(str(tmp_path / 'ens{}.nc'.format(i)))
+            ds.to_netcdf(fns[-1])
+
+        ens = ensembles.create_ensemble(fns)
+        assert ens.time.size == 60
+        assert ens.time[59].values == cftime.Datetime360Day(2000, 2, 30)
+
+    def test_weights(self):
+        ens = self.ens(8)
+        w = xr.DataArray([1, 2, 0, 1, 3, 1, 1, 2], dims=('realization',))
+
+        # Integer weights are equivalent to repeated realizations for the mean and standard deviation.
+        rep = ens.isel(realization=np.repeat(np.arange(8), w.values))
+        out = ensembles.ensemble_mean_std_max_min(ens, weights=w)
+        exp = ensembles.ensemble_mean_std_max_min(rep)
+        for v in exp.data_vars:
+            np.testing.assert_allclose(out[v], exp[v])
+
+        # Unit weights give the unweighted percentiles, and zero weights leave the realizations out.
+        exp = ensembles.ensemble_percentiles(ens)
+        out = ensembles.ensemble_percentiles(ens, weights=xr.ones_like(w))
+        np.testing.assert_allclose(out.tg_mean, exp.tg_mean)
+        out = ensembles.ensemble_percentiles(ens, weights=w.where(w == 0, 1))
+        exp = ensembles.ensemble_percentiles(ens.isel(realization=[0, 1, 3, 4, 5, 6, 7]))
+        np.testing.assert_allclose(out.tg_mean, exp.tg_mean)
+
+        # The weighted percentiles do not depend on the scale of the weights, nor on the chunks.
+        out = ensembles.ensemble_percentiles(ens, values=(25, 75), weights=w)
+        assert out.tg_mean.dims == ('time', 'lat', 'percentiles')
+        scaled = ensembles.ensemble_percentiles(ens, values=(25, 75), weights=w * 10)
+        np.testing.assert_allclose(scaled.tg_mean, out.tg_mean)
+        chunked = ensembles.ensemble_percentiles(ens.chunk({'realization': 4, 'time': 6}), values=(25, 75), weights=w)
+        np.testing.assert_allclose(chunked.tg_mean, out.tg_mean)
+        assert (out.tg_mean.sel(percentiles=75) >= out.tg_mean.sel(percentiles=25))[:, :3].all()
+        assert out.tg_mean[4, 3].isnull().all()
+
+        with pytest.raises(ValueError):
+            ensembles.ensemble_percentiles(ens, weights=w[:4])
+        with pytest.raises(ValueError):
+            ensembles.ensemble_mean_std_max_min(ens, weights=-w)
+
+    def test_ensemble_reduce(self, tmp_path):
+        ens = self.ens(6)
+        fns = []
+        for i in range(6):
+            fns.append(str(tmp_path / 'ens{}.nc'.format(i)))
+            ens.isel(realization=i).to_netcdf(fns[-1])
+
+        ms = ensembles.ensemble_mean_std_max_min(ensembles.create_ensemble(fns))
+        ps = ensembles.ensemble_percentiles(ensembles.create_ensemble(fns))
+        for processes in [1, 2]:
+            out = ensembles.ensemble_reduce(fns, stats=['mean', 'stdev'], values=(10, 50, 90), processes=processes)
+            assert set(out.data_vars) == {'tg_mean_mean', 'tg_mean_stdev', 'tg_mean'}
+            for v in ['tg_mean_mean', 'tg_mean_stdev', 'tg_mean']:
+                np.testing.assert_allclose(out[v], ms[v] if v in ms else ps[v])
+            np.testing.assert_array_equal(out.time, ms.time)
+
+        out = ensembles.ensemble_reduce(fns, stats=['max'], values=(50,), processes=1, split=True)
+        assert set(out.data_vars) == {'tg_mean_max', 'tg_mean_p50'}
+
+        with pytest.raises(ValueError):
+            ensembles.ensemble_reduce(fns, stats=['median'])
+
+    def test_mean_std_max_min(self):
+        ens = self.ens()
+        out = ensembles.ensemble_mean_std_max_min(ens.chunk({'realization': 1}))
+        assert isinstance(out.tg_mean_mean.data, dask.array.Array)
+        for stat, op in [('mean', 'mean'), ('stdev', 'std'), ('max', 'max'), ('min', 'min')]:
+            np.testing.assert_allclose(out['tg_mean_' + stat], getattr(ens.tg_mean, op)(dim='realization'))
+
+        # The lazy reduction gives the results of the accumulator, whatever the chunks and weights.
+        w = xr.DataArray(np.arange(30.) % 4, dims=('realization',))
+        exp = ensembles.ensemble_mean_std_max_min(ens, weights=w)
+        out = ensembles.ensemble_mean_std_max_min(ens.chunk({'realization': 7, 'time': 5}), weights=w)
+        assert list(out.data_vars) == list(exp.data_vars)
+        for v in exp.data_vars:
+            np.testing.assert_allclose(out[v], exp[v])
+        assert out.tg_mean_stdev.description == 'Mean temperature : stdev of ensemble'
+        np.testing.assert_array_equal(out.time, ens.time)
+
+    def test_percentiles(self):
+        ens = self.ens()
+        out = ensembles.ensemble_percentiles(ens.chunk({'realization': 1, 'time': 6}), values=(10, 50, 90))
+        assert isinstance(out.tg_mean.data, dask.array.Array)
+        assert out.tg_mean.dims == ('time', 'lat', 'percentiles')
+        np.testing.assert_array_equal(out.percentiles, [10, 50, 90])
+        np.testing.assert_allclose(out.tg_mean.sel(percentiles=10), np.nanpercentile(ens.tg_mean, 10, axis=0))
+        assert np.isnan(out.tg_mean.sel(percentiles=50)[4, 3])
+        assert out.tg_mean.description == 'Mean temperature : percentiles of ensemble'
+
+        out = ensembles.ensemble_percentiles(ens, values=(10, 50, 90), split=True)
+        assert set(out.data_vars) == {'tg_mean_p10', 'tg_mean_p50', 'tg_mean_p90'}
+        np.testing.assert_allclose(out.tg_mean_p90, np.nanpercentile(ens.tg_mean, 90, axis=0))
+        assert out.tg_mean_p90.description == 'Mean temperature : 90th percentile of ensemble'
+
+    def test_sketch(self):
+        ens = self.ens()
+        acc = ensembles.EnsembleAccumulator()
+        for i in range(ens.realization.size):
+            acc.update(ens.isel(realization=i))
+        out = acc.percentiles(values=(10, 50, 90))
+        assert set(out.data_vars) == {'tg_mean_p10', 'tg_mean_p50', 'tg_mean_p90'}
+        np.testing.assert_allclose(out.tg_mean_p10, np.nanpercentile(ens.tg_mean, 10, axis=0))
+
+        # With compacted sketches, the percentiles are approximated.
+        ens = self.ens(400)
+        acc = ensembles.EnsembleAccumulator(k=32)
+        for i in range(ens.realization.size):
+            acc.update(ens.isel(realization=i))
+        assert np.nanmax(np.abs(acc.percentiles(values=(50,)).tg_mean_p50)) < .25
+
+    def test_merge(self):
+        ens = self.ens()
+        acc = ensembles.EnsembleAccumulator(k=8)
+        parts = [ensembles.EnsembleAccumulator(k=8) for _ in range(3)]
+        for i in range(ens.realization.size):
+            acc.update(ens.isel(realization=i))
+            parts[i % 3].update(ens.isel(realization=i))
+
+        merged = parts[0]
+        merged.merge(parts[1])
+        merged.merge(parts[2])
+        assert merged.count == acc.count == 30
+
+        for v in acc.mean_std_max_min().data_vars:
+            np.testing.assert_allclose(merged.mean_std_max_min()[v], acc.mean_std_max_min()[v])
+
+        # The sketches hold the same total weight.
+        levels = merged._stats['tg_mean']['levels']
+        assert sum(len(rows) * 2 ** h for (h, rows) in enumerate(levels)) == 30
+        with pytest.raises(ValueError):
+            ensembles.EnsembleAccumulator(sketch=False).percentiles()
+
+    def test_weighted_nanquantile(self):
+        arr = self.ens().tg_mean.transpose('time', 'lat', 'realization').values
+        np.testing.assert_allclose(ensembles._weighted_nanquantile(arr, np.ones(30), [0, .1, .5, 1]),
+                                   utils.nanquantile(arr, [0, .1, .5, 1]))
+
+        # The sorted values are placed at the normalized cumulated weight before them: 1 -> 0, 2 -> 2/3, 3 -> 1.
+        x = np.array([3., 1, np.nan, 2])
+        np.testing.assert_allclose(ensembles._weighted_nanquantile(x, [1, 2, 1, 1], [.25, .5, 1]), [1.375, 1.75, 3])
+        np.testing.assert_allclose(ensembles._weighted_nanquantile(x, [.1, .2, .1, .1], [.25, .5, 1]), [1.375, 1.75, 3])
+
+
 class TestDailyDownsampler:
 
     def test_std_calendar(self):
@@ -225,6 +404,14 @@ class TestIndicator:
 
         np.testing.assert_array_almost_equal(txk, txc + 273.15)
 
+    def test_missing_policy(self, tas_series):
+        a = tas_series(np.arange(360.))
+        a[5:10] = np.nan
+        assert np.isnan(UniIndTemp()(a, freq='MS')[0])
+
+        ind = UniIndTemp(missing_policy='pct', missing_options={'tolerance': .2})
+        assert not np.isnan(ind(a, freq='MS')[0])
+
     def test_json(self, pr_series):
         ind = UniIndPr()
         meta = ind.json()
@@ -273,6 +460,70 @@ class TestIndicator:
 
         assert isinstance(txc.data, dask.array.core.Array)
 
+    def test_compute_many(self, tas_series, monkeypatch):
+        from xclim import atmos, checks, compute_many
+
+        tasmax = tas_series(np.arange(730.) + 250, start='1/1/2000')
+        tasmax[400] = np.nan
+        tasmin = tas_series(np.arange(730.) + 240, start='1/1/2000')
+        ds = xr.Dataset({'tasmax': tasmax, 'tasmin': tasmin}).chunk({'time': 100})
+
+        calls = []
+        valid_count = checks.valid_count
+        monkeypatch.setattr(checks, 'valid_count', lambda da, freq: calls.append(freq) or valid_count(da, freq))
+
+        inds = [atmos.tx_max, atmos.tx_mean, atmos.tn_min, (atmos.tx_days_above, {'thresh': '300 K'})]
+        out = compute_many(ds, inds, freq='YS')
+        assert set(out.data_vars) == {'tx_max', 'tx_mean', 'tn_min', 'txgt_300 K'}
+        assert calls == ['YS', 'YS']
+        assert isinstance(out.tx_max.data, dask.array.core.Array)
+
+        np.testing.assert_array_equal(out.tx_max, atmos.tx_max(ds.tasmax, freq='YS'))
+        np.testing.assert_array_equal(out['txgt_300 K'], atmos.tx_days_above(ds.tasmax, thresh='300 K', freq='YS'))
+        assert np.isnan(out.tx_mean[1])
+
+        with pytest.raises(KeyError):
+            compute_many(ds, [atmos.tg_mean])
+
+        # The dataset is rechunked once, holding the whole time series in a single chunk.
+        out = compute_many(ds, [atmos.consecutive_frost_days], freq='YS', memory=8 * 365)
+        assert out.consecutive_frost_days.chunks == ((1, 1),)
+
+
+class TestPlanChunks:
+    def da(self, nt=3650, nx=100, ny=50):
+        return xr.DataArray(np.zeros((nt, ny, nx)), dims=('time', 'lat', 'lon'))
+
+    def test_resample(self):
+        from xclim import atmos, plan_chunks
+        da = self.da()
+
+        # The spatial fields fit in the budget.
+        assert plan_chunks(da, [atmos.tx_max], memory=8 * 5000 * 400) == {'time': 400, 'lat': -1, 'lon': -1}
+        assert plan_chunks(da, [atmos.tx_max], memory=8 * 5000 * 4000) == {'time': -1, 'lat': -1, 'lon': -1}
+
+        # At least a year is held in each chunk.
+        assert plan_chunks(da, [atmos.tx_max], memory=8 * 366 * 100) == {'time': 366, 'lat': 10, 'lon': 10}
+
+    def test_full_time(self):
+        from xclim import atmos, plan_chunks
+        da = self.da()
+
+        inds = [atmos.tx_max, (atmos.consecutive_frost_days, {'freq': 'MS'})]
+        assert plan_chunks(da, inds, memory=8 * 3650 * 100) == {'time': -1, 'lat': 10, 'lon': 10}
+        assert plan_chunks(da, inds, memory=8 * 3650 * 10000) == {'time': -1, 'lat': -1, 'lon': -1}
+
+        # Moving window maxima are reduced over the whole time series at once.
+        assert plan_chunks(da, [atmos.max_n_day_precipitation_amount], memory=8 * 3650 * 100)['time'] == -1
+
+    def test_dtype(self):
+        from xclim import atmos, plan_chunks
+        ds = xr.Dataset({'tasmin': self.da().astype(np.float32)})
+
+        assert plan_chunks(ds, [atmos.consecutive_frost_days], memory=4 * 3650 * 100)['lon'] == 10
+        with xclim.set_options(dtype='float64'):
+            assert plan_chunks(ds, [atmos.consecutive_frost_days], memory=4 * 3650 * 100)['lon'] == 7
+
 
 class TestKwargs:
 
@@ -298,6 +549,59 @@ class TestPercentileDOY:
         assert p1.sel(dayofyear=3).data == 2
         assert p1.attrs['units'] == 'K'
 
+    def test_multiple(self, tas_series):
+        tas = tas_series(np.arange(365 * 3.), start='1/1/2001')
+        tas[10:20] = np.nan
+        p = percentile_doy(tas.chunk({'time': 100}), window=5, per=[.1, .5, .9])
+        assert p.dims == ('dayofyear', 'percentiles')
+        np.testing.assert_array_equal(p.percentiles, [.1, .5, .9])
+
+        # Samples of the 3rd day of the year: days 1 to 5 of each year.
+        x = np.concatenate([tas[i:i + 5] for i in [0, 365, 730]])
+        np.testing.assert_allclose(p.sel(dayofyear=3), np.nanpercentile(x, [10, 50, 90]))
+        np.testing.assert_allclose(p.sel(percentiles=.5), percentile_doy(tas, window=5, per=.5))
+
+    def test_max_chunk(self, tas_series):
+        np.random.seed(0)
+        tas = tas_series(np.random.rand(365 * 3), start='1/1/2001')
+        tas = xr.concat([tas, tas + 1, tas + 2], dim='lat').chunk({'time': 100})
+        exp = percentile_doy(tas, window=5, per=[.1, .9])
+
+        # Slices of a few days of year, and one spatial cell per chunk.
+        with xclim.set_options(max_chunk=3 * 15 * 10):
+            p = percentile_doy(tas, window=5, per=[.1, .9])
+            assert p.chunks[-1] == (1, 1, 1)
+        xr.testing.assert_equal(p, exp)
+
+    def test_nanquantile(self):
+        np.random.seed(0)
+        a = np.random.rand(4, 5, 20)
+        a[0, 0, :5] = np.nan
+        a[1, 1] = np.nan
+        exp = np.moveaxis(np.nanpercentile(a, [0, 25, 90, 100], axis=-1), 0, -1)
+        np.testing.assert_allclose(utils.nanquantile(a, [0, .25, .9, 1]), exp)
+
+    def test_compare_doy(self, tas_series):
+        np.random.seed(0)
+        tas = tas_series(np.random.rand(365 * 4), start='1/1/2000')
+        tas = xr.concat([tas, tas + .1], dim='lon').transpose('time', 'lon')
+        t90 = percentile_doy(tas, window=5, per=.9)
+
+        thresh = xr.full_like(tas, np.nan)
+        thresh.data = adjust_doy_calendar(t90, tas).sel(dayofyear=tas.time.dt.dayofyear.values)
+        exp = tas > thresh
+
+        out = utils.compare_doy(tas, '>', t90)
+        assert out.dims == tas.dims
+        np.testing.assert_array_equal(out, exp)
+
+        out = utils.compare_doy(tas.chunk({'time': 100}), 'gt', t90)
+        assert out.chunks[0][0] == 100
+        np.testing.assert_array_equal(out, exp)
+
+        with pytest.raises(ValueError):
+            utils.compare_doy(tas, '==', t90)
+
 
 class TestAdjustDoyCalendar:
 
@@ -383,6 +687,35 @@ class TestConvertUnitsTo:
             np.testing.assert_array_equal(out, out1)
             np.testing.assert_array_equal(out, out2)
 
+    def test_dataarray(self, tas_series, pr_series):
+        tas = tas_series(np.array([0., 273.15, 300.]))
+        out = utils.convert_units_to(tas, 'degF')
+        np.testing.assert_allclose(out, [-459.67, 32., 80.33])
+        assert out.attrs['units'] == pint2cfunits(units.degF)
+        np.testing.assert_allclose(utils.convert_units_to(out, 'K'), tas)
+        assert utils.convert_units_to(tas, 'K') is tas
+
+        pr = pr_series(np.array([0., 1.]))
+        out = utils.convert_units_to(pr, 'mm/d', context='hydro')
+        np.testing.assert_allclose(out, [0, 86400])
+
+    def test_lazy(self, tas_series):
+        tas = tas_series(np.arange(365, dtype=np.float32)).chunk({'time': 100})
+        out = utils.convert_units_to(tas, 'degC')
+        assert isinstance(out.data, dask.array.core.Array)
+        assert out.chunks == tas.chunks
+        assert out.dtype == np.float32
+        assert out.name == tas.name
+        assert out.attrs['standard_name'] == tas.attrs['standard_name']
+        np.testing.assert_allclose(out, tas.values - 273.15, rtol=1e-6)
+
+    def test_conversion_factors(self):
+        scale, offset = utils.conversion_factors(units.degF, units.degC)
+        assert scale == pytest.approx(5 / 9, rel=1e-9)
+        assert offset == pytest.approx(-160 / 9, rel=1e-9)
+        utils.conversion_factors(units.degF, units.degC)
+        assert utils.conversion_factors.cache_info().hits >= 1
+
 
 class TestUnitConversion:
 
@@ -465,6 +798,36 @@ class TestSubsetGridPoint:
         with pytest.raises(ValueError):
             subset.subset_gridpoint(da, lon=-72.4, lat=46.1, start_yr=2056, end_yr=2055)
 
+    def test_multiple_points(self):
+        da = xr.open_dataset(self.nc_poslons).tas
+        lon = np.array([-72.4, 10.2, 179.9, -180, 120.])
+        lat = np.array([46.1, -33.3, 0., 89., -89.])
+        out = subset.subset_gridpoints(da, lon=lon, lat=lat, start_yr=2050, end_yr=2059)
+        assert out.dims == ('time', 'site')
+        assert np.unique(out.time.dt.year).size == 10
+
+        # Same points as the brute-force geodesic distances to all grid cells.
+        g = Geod(ellps='WGS84')
+        lon2, lat2 = np.meshgrid(da.lon.values, da.lat.values)
+        for i in range(lon.size):
+            d = g.inv(lon2.ravel(), lat2.ravel(), np.full(lon2.size, lon[i]), np.full(lat2.size, lat[i]))[2]
+            j = np.argmin(d)
+            assert out.lon[i] == lon2.ravel()[j]
+            assert out.lat[i] == lat2.ravel()[j]
+
+            pt = subset.subset_gridpoint(da, lon=lon[i], lat=lat[i], start_yr=2050, end_yr=2059)
+            np.testing.assert_array_equal(pt, out.isel(site=i))
+
+    def test_multiple_points_irregular(self):
+        y, x = np.mgrid[0:40, 0:50]
+        lon = -80 + .5 * x + .1 * y
+        lat = 40 + .4 * y - .05 * x
+        da = xr.DataArray(np.arange(lon.size).reshape(lon.shape), dims=('rlat', 'rlon'),
+                          coords={'lon': (('rlat', 'rlon'), lon), 'lat': (('rlat', 'rlon'), lat)})
+        out = subset.subset_gridpoints(da, lon=lon[[3, 20, 39], [7, 0, 49]] + .01, lat=lat[[3, 20, 39], [7, 0, 49]])
+        assert out.dims == ('site',)
+        np.testing.assert_array_equal(out, da.values[[3, 20, 39], [7, 0, 49]])
+
 
 class TestSubsetBbox:
     nc_poslons = os.path.join(TESTS_DATA, 'cmip3', 'tas.sresb1.giss_model_e_r.run1.atm.da.nc')
@@ -5,6 +5,8 @@
 from functools import partial
 
 from xclim import indices
+from xclim.options import set_options
+from xclim.utils import compute_many, plan_chunks
 import sys
 
 # from .stats import fit, test
@@ -45,6 +45,7 @@ max_n_day_precipitation_amount = Pr(identifier='rx{window}day',
                                     long_name='maximum {window}-day total precipitation',
                                     description="{freq} maximum {window}-day total precipitation",
                                     cellmethods='time: sum within days time: maximum over days',
+                                    full_time=True,
                                     compute=indices.max_n_day_precipitation_amount,
                                     )
 
@@ -65,6 +66,7 @@ maximum_consecutive_wet_days = Pr(identifier='cwd',
                                   description='{freq} maximum number of days with daily '
                                               'precipitation over {thresh} mm',
                                   cell_methods='time: sum within days time: sum over days',
+                                  full_time=True,
                                   compute=indices.maximum_consecutive_wet_days,
                                   )
 
@@ -76,6 +78,7 @@ maximum_consecutive_dry_days = Pr(identifier='cdd',
                                   description='{freq} maximum number of days with daily '
                                               'precipitation below {thresh} mm',
                                   cell_methods='time: sum within days time: sum over days',
+                                  full_time=True,
                                   compute=indices.maximum_consecutive_dry_days,
                                   )
 
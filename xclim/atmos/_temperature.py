@@ -106,6 +106,7 @@ heat_wave_frequency = TasminTasmax(identifier='heat_wave_frequency',
                                                "over a minimum number of days ({window}).",
                                    cell_methods='',
                                    keywords="health,",
+                                   full_time=True,
                                    compute=indices.heat_wave_frequency,
                                    )
 
@@ -121,6 +122,7 @@ heat_wave_max_length = TasminTasmax(identifier='heat_wave_max_length',
                                                 "a minimum number of days ({window}).",
                                     cell_methods='',
                                     keywords="health,",
+                                    full_time=True,
                                     compute=indices.heat_wave_max_length,
                                     )
 
@@ -131,6 +133,7 @@ heat_wave_index = Tasmax(identifier='hwi_{thresh}',
                          description='{freq} number of days that are part of a heatwave, '
                                      'defined as five or more consecutive days over {thresh}℃',
                          cell_methods='',
+                         full_time=True,
                          compute=indices.heat_wave_index,
                          )
 
@@ -238,6 +241,7 @@ cold_spell_duration_index = Tasmin(identifier='csdi_{window}',
                                               'percentile. The 10th percentile should be computed for '
                                               'a 5-day window centred on each calendar day in the  1961-1990 period',
                                    cell_methods='',
+                                   full_time=True,
                                    compute=indices.cold_spell_duration_index,
                                    )
 
@@ -249,6 +253,7 @@ cold_spell_days = Tas(identifier='csi_{thresh}',
                                   'or more consecutive days with mean daily '
                                   'temperature below  {thresh}°C',
                       cell_methods='',
+                      full_time=True,
                       compute=indices.cold_spell_days,
                       )
 
@@ -295,6 +300,7 @@ freshet_start = Tas(identifier='freshet_start',
                     long_name="Day of year of spring freshet start",
                     description="Day of year of spring freshet start, defined as the first day a temperature "
                                 "threshold of {thresh} is exceeded for at least {window} days.",
+                    full_time=True,
                     compute=indices.freshet_start)
 
 frost_days = Tasmin(identifier='frost_days',
@@ -324,6 +330,7 @@ consecutive_frost_days = Tasmin(identifier='consecutive_frost_days',
                                 description='{freq} maximum number of consecutive days with '
                                             'minimum daily temperature below 0°C',
                                 cell_methods='time: min within days time: maximum over days',
+                                full_time=True,
                                 compute=indices.consecutive_frost_days,
                                 )
 
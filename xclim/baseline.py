@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Baseline percentiles store
+==========================
+
+Percentile-based indices (`tg90p`, `tn10p`, `warm_spell_duration_index`, etc.) compare daily values against
+day-of-year percentiles computed over a reference period, typically 1961-1990. This module computes these baseline
+percentiles on demand and persists them to a local directory, so that they are computed only once for a given
+dataset, reference period, window and percentile.
+
+Example
+-------
+>>> from xclim import indices, baseline
+>>> ref = baseline.Baseline(period=('1961', '1990'), window=5)
+>>> out = indices.tx90p(tasmax, ref)
+"""
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+import xarray as xr
+from dask.base import tokenize
+
+from xclim import utils
+from xclim.options import OPTIONS
+
+
+class PercentileStore(object):
+    """Directory of day-of-year percentiles with size-bounded LRU eviction.
+
+    Each percentile is stored in its own netCDF file, named after a hash of a fingerprint of the reference data, the
+    reference period, the window and the percentile. The fingerprint is built from the variable name, attributes,
+    source file and coordinates, and the graph name of dask arrays, so that the data values themselves are never
+    hashed. When the total size of the files exceeds `max_size`, the least recently used files are deleted.
+
+    Parameters
+    ----------
+    path : str
+      Directory where the percentiles are stored. Defaults to the `baseline_dir` option, or `xclim/baseline` in the
+      user's cache directory.
+    max_size : int
+      Maximum total size of the stored files, in bytes. Defaults to the `baseline_max_size` option.
+    """
+
+    def __init__(self, path=None, max_size=None):
+        self.path = path or OPTIONS['baseline_dir'] or _default_dir()
+        self.max_size = max_size or OPTIONS['baseline_max_size']
+        os.makedirs(self.path, exist_ok=True)
+
+    def key(self, da, period, window, per):
+        """Return the file name of the percentile computed from the reference data `da`."""
+        token = tokenize(fingerprint(da), tuple(period), window, float(per))
+        return hashlib.sha1(token.encode()).hexdigest() + '.nc'
+
+    def get(self, da, period=('1961', '1990'), window=5, per=.9):
+        """Return the day-of-year percentiles of `da` over the reference period.
+
+        Percentiles found in the store are read from disk, the others are computed together in a single call to
+        `percentile_doy` and added to the store.
+
+        Parameters
+        ----------
+        da : xarray.DataArray
+          Input data, covering the reference period.
+        period : (str, str)
+          First and last dates of the reference period.
+        window : int
+          Number of days around each day of the year to include in the calculation.
+        per : float or sequence of floats
+          Percentile between [0,1]. If a sequence is given, the percentiles are stored along a `percentiles`
+          dimension.
+
+        Returns
+        -------
+        xarray.DataArray
+          The percentiles indexed by the day of the year.
+        """
+        ref = da.sel(time=slice(*period))
+        if ref.time.size == 0:
+            raise ValueError("The input data does not cover the reference period {}-{}.".format(*period))
+
+        pers = np.atleast_1d(per)
+        paths = {p: os.path.join(self.path, self.key(ref, period, window, p)) for p in pers}
+
+        out = {}
+        for p, fn in paths.items():
+            if os.path.exists(fn):
+                with xr.open_dataarray(fn) as stored:
+                    out[p] = stored.load()
+                os.utime(fn)
+
+        missing = [p for p in pers if p not in out]
+        if missing:
+            new = utils.percentile_doy(ref, window=window, per=missing).load()
+            for p in missing:
+                out[p] = new.sel(percentiles=p, drop=True)
+                self._write(out[p], paths[p])
+            self.evict()
+
+        if np.isscalar(per):
+            return out[per]
+        p = xr.concat([out[p] for p in pers], dim=xr.DataArray(pers, dims='percentiles', name='percentiles'))
+        # Same dimension order as `percentile_doy`.
+        return p.transpose('dayofyear', 'percentiles', *[d for d in p.dims if d not in ('dayofyear', 'percentiles')])
+
+    def _write(self, da, fn):
+        """Write the array to a temporary file unique to this writer, then move it into place."""
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        os.close(fd)
+        try:
+            da.to_netcdf(tmp)
+            os.replace(tmp, fn)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def files(self):
+        """Return the stored files, sorted from the least to the most recently used."""
+        fns = [os.path.join(self.path, f) for f in os.listdir(self.path) if f.endswith('.nc')]
+        return sorted(fns, key=os.path.getmtime)
+
+    def size(self):
+        """Return the total size of the stored files, in bytes."""
+        return sum(os.path.getsize(f) for f in self.files())
+
+    def evict(self):
+        """Delete the least recently used files until the total size is below `max_size`."""
+        fns = self.files()
+        size = sum(os.path.getsize(f) for f in fns)
+        while fns and size > self.max_size:
+            fn = fns.pop(0)
+            size -= os.path.getsize(fn)
+            os.remove(fn)
+
+    def clear(self):
+        """Delete all stored files."""
+        for fn in self.files():
+            os.remove(fn)
+
+
+def fingerprint(da):
+    """Return a token identifying the data array.
+
+    The token is built from the name, attributes, source file and coordinates of the array, and from the name of
+    the dask graph of dask-backed arrays or the values of in-memory arrays.
+
+    Parameters
+    ----------
+    da : xarray.DataArray
+      Input data.
+
+    Returns
+    -------
+    str
+      Fingerprint of the array.
+    """
+    coords = {k: tokenize(v.values) for k, v in da.coords.items()}
+    data = da.data.name if da.chunks is not None else tokenize(da.values)
+    return tokenize(da.name, da.dims, da.attrs, da.encoding.get('source'), coords, data)
+
+
+def _default_dir():
+    """Return the default directory of the percentile store, in the user's cache directory."""
+    cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache, 'xclim', 'baseline')
+
+
+class Baseline(object):
+    """Specification of the reference period used to compute day-of-year percentiles.
+
+    Percentile-based indices accept a `Baseline` instead of a precomputed percentile array. The percentiles are
+    then computed from the input data over the reference period, or read from the store if they were already
+    computed.
+
+    Parameters
+    ----------
+    period : (str, str)
+      First and last dates of the reference period.
+    window : int
+      Number of days around each day of the year to include in the calculation.
+    store : PercentileStore
+      Store where the percentiles are persisted. Defaults to a store in the user's cache directory.
+    """
+
+    def __init__(self, period=('1961', '1990'), window=5, store=None):
+        self.period = tuple(period)
+        self.window = window
+        self.store = store
+
+    def __repr__(self):
+        return "Baseline(period={}, window={})".format(self.period, self.window)
+
+    def percentiles(self, da, per):
+        """Return the day-of-year percentiles of `da` over the reference period."""
+        if self.store is None:
+            self.store = PercentileStore()
+        return self.store.get(da, self.period, self.window, per)
+
+
+def get_percentiles(thresh, da, per):
+    """Return the day-of-year percentiles given either as an array or as a baseline specification.
+
+    Parameters
+    ----------
+    thresh : xarray.DataArray or Baseline
+      Percentiles indexed by the day of the year, or the specification of the reference period over which they
+      are computed from `da`.
+    da : xarray.DataArray
+      Input data.
+    per : float
+      Percentile between [0,1], used if `thresh` is a baseline specification.
+
+    Returns
+    -------
+    xarray.DataArray
+      The percentiles indexed by the day of the year.
+    """
+    if isinstance(thresh, Baseline):
+        return thresh.percentiles(da, per)
+    return thresh
@@ -1,10 +1,16 @@
 import datetime as dt
+import hashlib
+import threading
+import weakref
+from contextlib import contextmanager
 from functools import wraps
+from inspect import signature
 from warnings import warn
 import logging
 import numpy as np
 import pandas as pd
 import xarray as xr
+from dask.base import tokenize
 
 logging.captureWarnings(True)
 
@@ -130,9 +136,20 @@ def valid_daily_mean_discharge(comp):
 
 
 def valid_missing_data_threshold(comp, threshold=0):
-    r"""Check that the relative number of missing data points does not exceed a threshold."""
-    # TODO
-    pass
+    r"""Decorator masking the periods where the relative number of missing data points exceeds a threshold.
+
+    The decorated computation must take the input array as first argument and a `freq` argument.
+    """
+    sig = signature(comp)
+
+    @wraps(comp)
+    def func(da, *args, **kwds):
+        ba = sig.bind(da, *args, **kwds)
+        ba.apply_defaults()
+        out = comp(da, *args, **kwds)
+        return out.where(~missing_pct(da, ba.arguments['freq'], tolerance=threshold))
+
+    return func
 
 
 def check_is_dataarray(comp):
@@ -162,20 +179,312 @@ def missing_any(da, freq, **kwds):
     out : DataArray
       A boolean array set to True if any month or year has missing values.
     """
-    c = da.notnull().resample(time=freq).sum(dim='time')
+    c = missing_cache(valid_count, da, freq)
+    return c != _expected(c, freq)
+
+
+def missing_pct(da, freq, tolerance=0.05, **kwds):
+    r"""Return a boolean DataArray indicating whether the fraction of missing days exceeds a tolerance.
+
+    Parameters
+    ----------
+    da : DataArray
+      Input array at daily frequency.
+    freq : str
+      Resampling frequency.
+    tolerance : float
+      Fraction of missing days, between 0 and 1, above which a period is considered missing.
+
+    Returns
+    -------
+    out : DataArray
+      A boolean array set to True if the fraction of missing days in a month or year exceeds the tolerance.
+    """
+    if not 0 <= tolerance <= 1:
+        raise ValueError("The tolerance must be between 0 and 1.")
+
+    c = missing_cache(valid_count, da, freq)
+    n = _expected(c, freq)
+    return (n - c) > tolerance * n
+
+
+def missing_wmo(da, freq, nm=11, nc=5, **kwds):
+    r"""Return a boolean DataArray indicating whether a period is missing according to the WMO criteria.
+
+    A month is considered missing if it has `nm` or more missing days, or `nc` or more consecutive missing days. A
+    period is considered missing if any of its months is missing, or if it is not fully covered by the input.
+
+    Parameters
+    ----------
+    da : DataArray
+      Input array at daily frequency.
+    freq : str
+      Resampling frequency, a multiple of months.
+    nm : int
+      Minimum number of missing days for a month to be considered missing.
+    nc : int
+      Minimum number of consecutive missing days for a month to be considered missing.
+
+    Returns
+    -------
+    out : DataArray
+      A boolean array set to True if any month of the period is missing.
+
+    References
+    ----------
+    World Meteorological Organization (2017). WMO Guidelines on the Calculation of Climate Normals. WMO-No. 1203.
+    """
+    if type(pd.tseries.frequencies.to_offset(freq)) not in _period_months:
+        raise ValueError("The WMO criteria apply to monthly or coarser frequencies, got `{}`.".format(freq))
+
+    c = missing_cache(valid_count, da, 'MS')
+    run = missing_cache(max_missing_run, da, 'MS')
+    mmiss = ((_expected(c, 'MS') - c) >= nm) | (run >= nc)
+    miss = mmiss.resample(time=freq).any(dim='time')
+
+    # Periods not fully covered by the input time series.
+    steps = xr.ones_like(da.time, dtype=int).resample(time=freq).sum(dim='time')
+    return miss | (steps != _expected(steps, freq))
+
+
+def valid_count(da, freq):
+    r"""Return the number of valid values in each period."""
+    return da.notnull().resample(time=freq).sum(dim='time')
+
+
+def max_missing_run(da, freq):
+    r"""Return the longest run of consecutive missing values in each period."""
+    from xclim import run_length as rl
 
-    if '-' in freq:
-        pfreq, anchor = freq.split('-')
+    return rl.resample_longest_run(da.isnull(), freq)
+
+
+def _expected(c, freq):
+    """Return the expected number of days in each period of a resampled array."""
+    n = expected_days(c.indexes['time'], freq)
+    return xr.DataArray(n, coords={'time': c.time}, dims='time')
+
+
+# Number of days in each month of common and leap years.
+_month_days = np.array([[31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31],
+                        [31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]])
+
+# Number of months spanned by monthly, quarterly and annual periods.
+_period_months = {pd.offsets.MonthBegin: 1, pd.offsets.MonthEnd: 1,
+                  pd.offsets.QuarterBegin: 3, pd.offsets.QuarterEnd: 3,
+                  pd.offsets.YearBegin: 12, pd.offsets.YearEnd: 12}
+
+
+def get_calendar(index):
+    r"""Return the name of the calendar of a time index."""
+    if isinstance(index, pd.DatetimeIndex):
+        return 'proleptic_gregorian'
+    if len(index) == 0:
+        return 'standard'
+    return index[0].calendar
+
+
+def days_in_month(year, month, calendar='standard'):
+    r"""Return the number of days in the given months.
+
+    Parameters
+    ----------
+    year : array_like
+      Years.
+    month : array_like
+      Months, from 1 to 12.
+    calendar : str
+      Calendar name, one of the keys of `xclim.utils.calendars`.
+
+    Returns
+    -------
+    ndarray
+      Number of days in each month.
+    """
+    from xclim.utils import calendars
+
+    year, month = np.broadcast_arrays(np.asarray(year, dtype=int), np.asarray(month, dtype=int))
+    if calendar not in calendars:
+        raise ValueError("Calendar `{}` is not recognized.".format(calendar))
+    if calendars[calendar] == 360:
+        return np.full(year.shape, 30)
+    if calendars[calendar] == 365:
+        return _month_days[0, month - 1]
+    if calendar in ['all_leap', '366_day']:
+        return _month_days[1, month - 1]
+
+    julian = year % 4 == 0
+    gregorian = julian & ((year % 100 != 0) | (year % 400 == 0))
+    if calendar == 'julian':
+        leap = julian
+    elif calendar in ['standard', 'gregorian']:
+        leap = np.where(year < 1583, julian, gregorian)
     else:
-        pfreq = freq
+        leap = gregorian
+
+    out = _month_days[leap.astype(int), month - 1]
+    if calendar in ['standard', 'gregorian']:
+        # The switch from the julian to the gregorian calendar skips 10 days in October 1582.
+        out = out - 10 * ((year == 1582) & (month == 10))
+    return out
+
+
+def expected_days(index, freq):
+    r"""Return the number of days in each resampling period.
+
+    Parameters
+    ----------
+    index : pandas.DatetimeIndex or xarray.CFTimeIndex
+      Labels of the resampling periods, as returned by `resample`.
+    freq : str
+      Resampling frequency.
+
+    Returns
+    -------
+    ndarray
+      The number of days in each period, given the calendar of the index.
+
+    Notes
+    -----
+    For monthly, quarterly and annual frequencies, the number of days is looked up in a cumulative table of the
+    number of days in each month spanned by the index, so that no date arithmetic is performed per period.
+    """
+    offset = pd.tseries.frequencies.to_offset(freq)
+
+    if isinstance(offset, pd.offsets.Tick):
+        return np.full(len(index), offset.nanos // 86400000000000)
+    if isinstance(offset, pd.offsets.Week):
+        return np.full(len(index), 7 * offset.n)
+
+    months = _period_months.get(type(offset))
+    if months is None or len(index) == 0:
+        return _shifted_days(index, freq)
+
+    k = months * offset.n
 
-    if pfreq.endswith('S'):
-        start_time = c.indexes['time']
+    # Absolute month number of the first month of each period.
+    first = np.asarray(index.year) * 12 + np.asarray(index.month) - 1
+    if type(offset) in [pd.offsets.MonthEnd, pd.offsets.QuarterEnd, pd.offsets.YearEnd]:
+        first = first - k + 1
+
+    m0 = first.min()
+    m = np.arange(m0, first.max() + k)
+    ndays = days_in_month(m // 12, m % 12 + 1, get_calendar(index))
+    cumdays = np.concatenate([[0], np.cumsum(ndays)])
+    return cumdays[first - m0 + k] - cumdays[first - m0]
+
+
+def _shifted_days(index, freq):
+    """Return the number of days in each resampling period by shifting the period labels."""
+    if freq.split('-')[0].endswith('S'):
+        start_time = index
         end_time = start_time.shift(1, freq=freq)
     else:
-        end_time = c.indexes['time']
+        end_time = index
         start_time = end_time.shift(-1, freq=freq)
 
-    n = (end_time - start_time).days
-    nda = xr.DataArray(n.values, coords={'time': c.time}, dims='time')
-    return c != nda
+    return np.asarray((end_time - start_time).days)
+
+
+class MaskCache(object):
+    r"""Memoized missing value masks and statistics.
+
+    Masks are keyed by the function computing them, a fingerprint of the input array and the other arguments, so
+    that computing multiple indicators from the same input at the same frequency computes its mask only once. The
+    missing value policies cache the statistics they are computed from, the number of valid values and the longest
+    run of missing values per period, so that they are shared between policies. The
+    fingerprint of a dask array is its graph name, that of an in-memory array a hash of its missing values pattern,
+    along with a token of its non-time coordinates in both cases. Within `sharing` or `owner` contexts, in-memory
+    arrays are hashed once and then identified by their `id`. Entries are freed when the input array they were
+    computed from is garbage collected, or the arrays given to `owner` when they are computed within that context.
+
+    Attributes
+    ----------
+    hits : int
+      Number of masks returned from the cache.
+    misses : int
+      Number of masks computed.
+    """
+
+    def __init__(self):
+        self._masks = {}
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._masks)
+
+    def __call__(self, func, da, freq, **kwds):
+        """Return `func(da, freq, **kwds)`, computing it only if it is not in the cache."""
+        key = (func, self._fingerprint(da), freq, tuple(sorted(kwds.items())))
+        if key in self._masks:
+            self.hits += 1
+            return self._masks[key]
+
+        self.misses += 1
+        out = func(da, freq, **kwds)
+        self._masks[key] = out
+        for obj in getattr(self._local, 'owners', None) or (da,):
+            weakref.finalize(obj, self._masks.pop, key, None)
+        return out
+
+    @contextmanager
+    def owner(self, *objs):
+        """Tie the entries added within the context to the lifetime of `objs`.
+
+        Use this when the arrays given to the cache are derived from the caller's inputs, e.g. by a time selection,
+        so that the entries are not freed as soon as the derived arrays are.
+        """
+        prev = getattr(self._local, 'owners', None)
+        self._local.owners = objs
+        try:
+            with self.sharing():
+                yield
+        finally:
+            self._local.owners = prev
+
+    @contextmanager
+    def sharing(self):
+        """Hash in-memory arrays only once within the context, identifying them by their `id` afterwards.
+
+        The arrays given to the cache within the context must not be modified in place.
+        """
+        prev = getattr(self._local, 'ids', None)
+        self._local.ids = {} if prev is None else prev
+        try:
+            yield
+        finally:
+            self._local.ids = prev
+
+    def _fingerprint(self, da):
+        """Return the fingerprint of an array, reusing that of the same in-memory array within `sharing`."""
+        ids = getattr(self._local, 'ids', None)
+        if ids is None or da.chunks is not None:
+            return self.fingerprint(da)
+
+        # A reference to the array is kept so that its `id` cannot be reused by another object within the context.
+        if id(da) not in ids:
+            ids[id(da)] = (self.fingerprint(da), da)
+        return ids[id(da)][0]
+
+    @staticmethod
+    def fingerprint(da):
+        """Return a hashable identifier of the missing values and coordinates of an array."""
+        time = da.indexes['time']
+        coord = (len(time), str(time[0]), str(time[-1])) if len(time) else ()
+        coords = tokenize({k: (v.dims, v.values) for k, v in da.coords.items() if k != 'time'})
+        if da.chunks is not None:
+            return (da.data.name, coord, coords)
+
+        mask = np.packbits(da.isnull().values)
+        return (hashlib.sha1(mask.tobytes()).hexdigest(), da.dims, da.shape, coord, coords)
+
+    def clear(self):
+        """Remove all masks and reset the counters."""
+        self._masks.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+missing_cache = MaskCache()
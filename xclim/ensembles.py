@@ -1,7 +1,15 @@
+import functools
+import multiprocessing
+import os
+import threading
+
+import dask.array as dsk
 import numpy as np
-import pandas as pd
 import xarray as xr
 
+from xclim import utils
+from xclim.options import OPTIONS, set_options
+
 
 def create_ensemble(ncfiles, mf_flag=False):
     """Create an xarray datset of ensemble of climate simulation from a list of netcdf files. Input data is
@@ -11,6 +19,9 @@ def create_ensemble(ncfiles, mf_flag=False):
     a new dimension (name:'realization'). In the case where input files have unequal time dimensions output
     ensemble dataset is created for overlapping time-steps common to all input files
 
+    The files are opened once each, and the ensemble is built lazily: the common time-steps are
+    found from the time coordinates only, so that no data variable is read.
+
     Parameters
     ----------
     ncfiles : sequence
@@ -19,6 +30,8 @@ def create_ensemble(ncfiles, mf_flag=False):
 
     mf_flag : Boolean . If true climate simulations are treated as multifile datasets before concatenation
 
+    The files are opened with the chunks given by the `chunks` option.
+
     Returns
     -------
     xarray dataset containing concatenated data from all input files
@@ -41,58 +54,69 @@ def create_ensemble(ncfiles, mf_flag=False):
     simulation 2 is also a list of .nc files
     >>> ens = utils.create_ensemble(ncfiles)
     """
-    dim = 'realization'
-    ds1 = []
-    start_end_flag = True
-    print('finding common time-steps')
-    for n in ncfiles:
-        if mf_flag:
-            ds = xr.open_mfdataset(n, concat_dim='time', decode_times=False, chunks={'time': 10})
-            ds['time'] = xr.open_mfdataset(n).time
-        else:
-            ds = xr.open_dataset(n, decode_times=False)
-            ds['time'] = xr.decode_cf(ds).time
-        # get times - use common
-        time1 = pd.to_datetime({'year': ds.time.dt.year, 'month': ds.time.dt.month, 'day': ds.time.dt.day})
-        if start_end_flag:
-            start1 = time1.values[0]
-            end1 = time1.values[-1]
-            start_end_flag = False
-        if time1.values.min() > start1:
-            start1 = time1.values.min()
-        if time1.values.max() < end1:
-            end1 = time1.values.max()
-
-    for n in ncfiles:
-        print('accessing file ', ncfiles.index(n) + 1, ' of ', len(ncfiles))
+    # Files are opened lazily, each of them once. Opening files is serialized anyway, see `_open_realization`.
+    datasets = [_open_realization(fn, mf_flag) for fn in ncfiles]
+
+    # Common time steps, found from the time coordinates only.
+    dates = [_date_keys(ds.time) for ds in datasets]
+    start = max(d[0] for d in dates)
+    end = min(d[-1] for d in dates)
+    if start > end:
+        raise ValueError("The files have no time step in common.")
+
+    datasets = [ds.isel(time=np.flatnonzero((d >= start) & (d <= end))) for (ds, d) in zip(datasets, dates)]
+
+    # The decoded time coordinate of the first realization is used for the whole ensemble.
+    ens = xr.concat([ds.drop('time') for ds in datasets], dim='realization', coords='minimal', compat='override')
+    return ens.assign_coords(time=datasets[0].time.values)
+
+
+# The netCDF and HDF5 libraries are not thread-safe when opening files, and xarray only locks reads.
+_open_lock = threading.Lock()
+
+
+def _open_realization(fn, mf_flag=False):
+    """Open the file, or the list of files if `mf_flag` is True, of a realization with the `chunks` option."""
+    with _open_lock:
         if mf_flag:
-            ds = xr.open_mfdataset(n, concat_dim='time', decode_times=False, chunks={'time': 10})
-            ds['time'] = xr.open_mfdataset(n).time
-        else:
-            ds = xr.open_dataset(n, decode_times=False, chunks={'time': 10})
-            ds['time'] = xr.decode_cf(ds).time
+            return xr.open_mfdataset(fn, combine='by_coords', chunks=OPTIONS['chunks'])
+        return xr.open_dataset(fn, chunks=OPTIONS['chunks'])
+
 
-        ds['time'].values = pd.to_datetime({'year': ds.time.dt.year, 'month': ds.time.dt.month, 'day': ds.time.dt.day})
+def _date_keys(time):
+    """Return the dates of a time coordinate as integers, comparable across calendars."""
+    return (time.dt.year * 10000 + time.dt.month * 100 + time.dt.day).values
 
-        ds = ds.where((ds.time >= start1) & (ds.time <= end1), drop=True)
 
-        ds1.append(ds.drop('time'))
-    print('concatenating files : adding dimension ', dim, )
-    ens = xr.concat(ds1, dim=dim)
-    # assign time coords
-    ens = ens.assign_coords(time=ds.time.values)
-    return ens
+def _check_weights(ens, weights):
+    """Return the weights of the realizations of the ensemble as a numpy array, or None."""
+    if weights is None:
+        return None
+    if weights.dims != ('realization',) or weights.size != ens.dims['realization']:
+        raise ValueError("The weights should be given along the `realization` dimension of the ensemble.")
+    w = np.asarray(weights.values, dtype=float)
+    if np.any(np.isnan(w)) or np.any(w < 0) or not np.any(w > 0):
+        raise ValueError("The weights should be positive or zero, and not all zero.")
+    return w
 
 
-def ensemble_mean_std_max_min(ens):
+def ensemble_mean_std_max_min(ens, weights=None):
     """Calculate ensemble statistics between a results from an ensemble of climate simulations
 
     Returns a dataset containing ensemble mean, standard-deviation,
     minimum and maximum for input climate simulations.
 
+    In-memory variables are accumulated one realization at a time (see `EnsembleAccumulator`). Dask-backed variables
+    are reduced lazily: the statistics of each chunk are accumulated the same way, then merged along the
+    `realization` dimension in a dask reduction, so that the results are dask arrays computed in parallel over the
+    chunks.
+
     Parameters
     ----------
     ens : Ensemble dataset (see xclim.utils.create_ensemble)
+    weights : xarray.DataArray
+      Weights of the realizations, along the `realization` dimension. The mean and standard deviation are then
+      weighted, and realizations with a weight of 0 are left out of all statistics. Weights need not sum to 1.
 
     Returns
     -------
@@ -109,37 +133,135 @@ def ensemble_mean_std_max_min(ens):
     >>> ens_means_std = utils.ensemble_mean_std_max_min(ens)
     >>> print(ens_mean_std['tas_mean'])
     """
-    dsOut = ens.drop(ens.data_vars)
-    for v in ens.data_vars:
+    w = _check_weights(ens, weights)
+    if w is None:
+        w = np.ones(ens.dims['realization'])
+
+    out = {}
+    eager = [v for v, da in ens.data_vars.items() if da.chunks is None]
+    if eager:
+        acc = EnsembleAccumulator(sketch=False)
+        for i in range(ens.dims['realization']):
+            acc.update(ens[eager].isel(realization=i), weight=w[i])
+        out.update(acc.mean_std_max_min().data_vars)
+
+    for v, da in ens.data_vars.items():
+        if v not in eager:
+            out.update(_lazy_mean_std_max_min(da, w))
+
+    names = ['{}_{}'.format(v, stat) for v in ens.data_vars for stat in _moments_stats]
+    return xr.Dataset({name: out[name] for name in names}).assign_coords(**ens.drop(ens.data_vars).coords)
+
+
+# Statistics accumulated for each value, and those returned by `ensemble_mean_std_max_min`.
+_moments_dtype = np.dtype([('n', float), ('mean', float), ('m2', float), ('min', float), ('max', float)])
+_moments_stats = ['mean', 'stdev', 'max', 'min']
+_stats_dtype = np.dtype([(stat, float) for stat in _moments_stats])
+
+
+def _lazy_mean_std_max_min(da, weights):
+    """Return the ensemble statistics of a dask-backed variable as dask arrays, see `ensemble_mean_std_max_min`."""
+    axis = da.get_axis_num('realization')
+    # Reductions to a scalar are not supported for structured arrays: add an axis to the realizations' values.
+    x = da.data if da.ndim > 1 else da.data[:, np.newaxis]
+    ind = tuple(range(x.ndim))
+
+    # Statistics of each chunk, reduced to a single element along the realization axis, then merged.
+    w = dsk.from_array(weights, chunks=(x.chunks[axis],))
+    partial = dsk.blockwise(_moments_block, ind, x, ind, w, (axis,), axis=axis, dtype=_moments_dtype,
+                            adjust_chunks={axis: 1}, meta=np.empty((0,) * x.ndim, dtype=_moments_dtype))
+    st = dsk.reduction(partial, _moments_chunk, _moments_combine, combine=_moments_combine, axis=axis,
+                       dtype=_moments_dtype, concatenate=True,
+                       meta=np.empty((0,) * (x.ndim - 1), dtype=_moments_dtype))
+    stats = st.map_blocks(_moments_final, dtype=_stats_dtype, meta=np.empty((0,) * (x.ndim - 1), dtype=_stats_dtype))
+    if da.ndim == 1:
+        stats = stats[0]
+
+    template = (tuple(d for d in da.dims if d != 'realization'),
+                {k: c for k, c in da.coords.items() if 'realization' not in c.dims}, dict(da.attrs), da.dtype)
+    return {'{}_{}'.format(da.name, stat): _ensemble_output(template, stats[stat], stat) for stat in _moments_stats}
+
+
+def _moments_block(x, weights, axis):
+    """Return the moments, minimum and maximum of a block along `axis`, kept as a single element."""
+    st = np.zeros(np.delete(x.shape, axis), dtype=_moments_dtype)
+    st['min'] = st['max'] = np.nan
+    for xi, wi in zip(np.moveaxis(x, axis, 0), weights):
+        if wi > 0:
+            _update_moments(st, np.asarray(xi, dtype=float), wi)
+    return np.expand_dims(st, axis)
+
+
+def _moments_chunk(st, axis, keepdims):
+    """Return the statistics of a block, already reduced by `_moments_block`."""
+    return st
+
+
+def _moments_combine(st, axis, keepdims):
+    """Merge the statistics along `axis`."""
+    st = np.moveaxis(st, axis[0], 0)
+    out = st[0:1].reshape(st.shape[1:]).copy()
+    for so in st[1:]:
+        _merge_moments(out, so)
+    return np.expand_dims(out, axis[0]) if keepdims else out
+
+
+def _moments_final(st):
+    """Return the mean, standard deviation, maximum and minimum from the accumulated statistics."""
+    out = np.empty(np.shape(st['n']), dtype=_stats_dtype)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out['mean'] = np.where(st['n'] > 0, st['mean'], np.nan)
+        out['stdev'] = np.sqrt(st['m2'] / st['n'])
+    out['max'] = st['max']
+    out['min'] = st['min']
+    return out
 
-        dsOut[v + '_mean'] = ens[v].mean(dim='realization')
-        dsOut[v + '_stdev'] = ens[v].std(dim='realization')
-        dsOut[v + '_max'] = ens[v].max(dim='realization')
-        dsOut[v + '_min'] = ens[v].min(dim='realization')
-        for vv in dsOut.data_vars:
-            dsOut[vv].attrs = ens[v].attrs
 
-            if 'description' in dsOut[vv].attrs.keys():
-                vv.split()
-                dsOut[vv].attrs['description'] = dsOut[vv].attrs['description'] + ' : ' + vv.split('_')[
-                    -1] + ' of ensemble'
+def _update_moments(st, x, weight):
+    """West (1979) update of the weighted mean and sum of squared deviations, minimum and maximum."""
+    valid = ~np.isnan(x)
+    st['n'] += np.where(valid, weight, 0)
+    delta = np.where(valid, x - st['mean'], 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        st['mean'] += np.where(valid, delta * weight / st['n'], 0)
+    st['m2'] += np.where(valid, weight * delta * (x - st['mean']), 0)
+    st['min'] = np.fmin(st['min'], x)
+    st['max'] = np.fmax(st['max'], x)
 
-    return dsOut
 
+def _merge_moments(st, so):
+    """Chan et al. (1979) update of the mean and sum of squared deviations, minimum and maximum."""
+    n = st['n'] + so['n']
+    delta = so['mean'] - st['mean']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        st['mean'] = np.where(n > 0, st['mean'] + delta * so['n'] / n, 0)
+        st['m2'] = np.where(n > 0, st['m2'] + so['m2'] + delta ** 2 * st['n'] * so['n'] / n, 0)
+    st['n'] = n
+    st['min'] = np.fmin(st['min'], so['min'])
+    st['max'] = np.fmax(st['max'], so['max'])
 
-def ensemble_percentiles(ens, values=(10, 50, 90), time_block=None):
+
+def ensemble_percentiles(ens, values=(10, 50, 90), time_block=None, split=False, weights=None):
     """Calculate ensemble statistics between a results from an ensemble of climate simulations
 
-    Returns a dataset containing ensemble statistics for input climate simulations.
-    Alternatively calculate ensemble percentiles (default) or ensemble mean and standard deviation
+    Returns a dataset containing ensemble percentiles for input climate simulations.
+
+    All percentiles are computed from a single sort along the `realization` dimension of each block of data, missing
+    values being ignored. Dask-backed ensembles are computed lazily, the `realization` dimension being held in a
+    single chunk and the time chunks divided accordingly to keep the size of the blocks.
 
     Parameters
     ----------
     ens : Ensemble dataset (see xclim.utils.create_ensemble)
     values : tuple of integers - percentile values to calculate  : default : (10, 50, 90)
     time_block : integer
-      for large ensembles iteratively calculate percentiles in time-step blocks (n==time_block).
-       If not defined the function tries to estimate an appropriate value
+      Not used anymore, since ensembles are processed by blocks. Kept for backward compatibility.
+    split : bool
+      If True, each percentile is stored in its own variable named `<v>_p<percentile>`, instead of along a
+      `percentiles` dimension.
+    weights : xarray.DataArray
+      Weights of the realizations, along the `realization` dimension. The percentiles are then interpolated between
+      the sorted values placed at their cumulated weights (see `_weighted_nanquantile`), from the same single sort.
 
     Returns
     -------
@@ -154,119 +276,384 @@ def ensemble_percentiles(ens, values=(10, 50, 90), time_block=None):
     >>> ens = utils.create_ensemble(ncfiles)
     Calculate default ensemble percentiles
     >>> ens_percs = utils.ensemble_statistics(ens)
-    >>> print(ens_percs['tas_p10'])
-    Calculate non-default percentiles (25th and 75th)
-    >>> ens_percs = utils.ensemble_statistics(ens, values=(25,75))
-    >>> print(ens_percs['tas_p25'])
-    Calculate by time blocks (n=10) if ensemble size is too large to load in memory
-    >>> ens_percs = utils.ensemble_statistics(ens, time_block=10)
+    >>> print(ens_percs['tas'].sel(percentiles=10))
+    Calculate non-default percentiles (25th and 75th), in separate variables
+    >>> ens_percs = utils.ensemble_statistics(ens, values=(25,75), split=True)
     >>> print(ens_percs['tas_p25'])
-
     """
+    w = _check_weights(ens, weights)
+    if w is None:
+        func, args = utils.nanquantile, ()
+    else:
+        func, args = _weighted_nanquantile, (xr.DataArray(w, dims=('realization',)),)
 
     ds_out = ens.drop(ens.data_vars)
-    dims = list(ens.dims)
-    for v in ens.data_vars:
-        # Percentile calculation requires load to memory : automate size for large ensemble objects
-        if not time_block:
-            time_block = round(2E8 / (ens[v].size / ens[v].shape[dims.index('time')]), -1)  # 2E8
-
-        if time_block > len(ens[v].time):
-            out = _calc_percentiles_simple(ens, v, values)
-
+    for v, da in ens.data_vars.items():
+        if da.chunks is not None:
+            nchunks = len(da.chunks[da.get_axis_num('realization')])
+            if nchunks > 1:
+                chunks = {'realization': -1}
+                if 'time' in da.dims:
+                    chunks['time'] = max(1, max(da.chunks[da.get_axis_num('time')]) // nchunks)
+                da = da.chunk(chunks)
+
+        out = xr.apply_ufunc(func, da, *args,
+                             input_core_dims=[['realization']] * (1 + len(args)),
+                             output_core_dims=[['percentiles']],
+                             dask='parallelized',
+                             output_dtypes=[np.float64],
+                             output_sizes={'percentiles': len(values)},
+                             kwargs={'q': np.asarray(values, dtype=float) / 100},
+                             keep_attrs=True)
+        out.coords['percentiles'] = list(values)
+
+        if split:
+            for p in values:
+                outvar = '{}_p{}'.format(v, p)
+                ds_out[outvar] = out.sel(percentiles=p, drop=True)
+                ds_out[outvar].attrs = dict(da.attrs)
+                if 'description' in da.attrs:
+                    ds_out[outvar].attrs['description'] = '{} : {}th percentile of ensemble'.format(
+                        da.attrs['description'], p)
+                else:
+                    ds_out[outvar].attrs['description'] = '{}th percentile of ensemble'.format(p)
         else:
-            # loop through blocks
-            Warning('large ensemble size detected : statistics will be calculated in blocks of ', int(time_block),
-                    ' time-steps')
-            out = _calc_percentiles_blocks(ens, v, values, time_block)
-        for vv in out.data_vars:
-            ds_out[vv] = out[vv]
+            out.attrs = dict(da.attrs)
+            if 'description' in da.attrs:
+                out.attrs['description'] = '{} : percentiles of ensemble'.format(da.attrs['description'])
+            else:
+                out.attrs['description'] = 'Percentiles of ensemble'
+            ds_out[v] = out
     return ds_out
 
 
-def _calc_percentiles_simple(ens, v, values):
-    ds_out = ens.drop(ens.data_vars)
-    dims = list(ens[v].dims)
-    outdims = [x for x in dims if 'realization' not in x]
-
-    print('loading ensemble data to memory')
-    arr = ens[v].load()  # percentile calc requires loading the array
-    coords = {}
-    for c in outdims:
-        coords[c] = arr[c]
-    for p in values:
-        outvar = v + '_p' + str(p)
-
-        out1 = _calc_perc(arr, p)
-
-        ds_out[outvar] = xr.DataArray(out1, dims=outdims, coords=coords)
-        ds_out[outvar].attrs = ens[v].attrs
-        if 'description' in ds_out[outvar].attrs.keys():
-            ds_out[outvar].attrs['description'] = '{} : {}th percentile of ensemble'.format(
-                ds_out[outvar].attrs['description'], str(p))
-        else:
-            ds_out[outvar].attrs['description'] = '{}th percentile of ensemble'.format(str(p))
+def ensemble_reduce(ncfiles, stats=('mean', 'stdev', 'max', 'min'), values=(), mf_flag=False, processes=None, k=256,
+                    split=False):
+    """Calculate ensemble statistics directly from a list of netcdf files.
 
-    return ds_out
+    Unlike `create_ensemble`, the ensemble is never concatenated: each file is reduced to partial statistics (see
+    `EnsembleAccumulator`) in a pool of processes, each process reading one realization at a time, and the partial
+    statistics are then merged. Memory use is thus bounded by a few realizations per process.
 
+    Parameters
+    ----------
+    ncfiles : sequence
+      List of netcdf file paths. If mf_flag is true ncfiles should be a list of lists where each sublist contains
+      input .nc files of a multifile dataset.
+    stats : sequence
+      Statistics to compute, among 'mean', 'stdev', 'max' and 'min'.
+    values : sequence of ints
+      Percentiles to compute, between [0, 100].
+    mf_flag : bool
+      If true climate simulations are treated as multifile datasets.
+    processes : int
+      Number of processes. Defaults to the number of CPUs. With 1, the files are reduced in the current process.
+    k : int
+      Capacity of the quantile sketches. Percentiles are exact for ensembles of up to `k` realizations.
+    split : bool
+      If True, each percentile is stored in its own variable, see `ensemble_percentiles`.
 
-def _calc_percentiles_blocks(ens, v, values, time_block):
-    ds_out = ens.drop(ens.data_vars)
-    dims = list(ens[v].dims)
-    outdims = [x for x in dims if 'realization' not in x]
-
-    blocks = list(range(0, len(ens.time) + 1, int(time_block)))
-    if blocks[-1] != len(ens[v].time):
-        blocks.append(len(ens[v].time))
-    arr_p_all = {}
-    for t in range(0, len(blocks) - 1):
-        print('Calculating block ', t + 1, ' of ', len(blocks) - 1)
-        time_sel = slice(blocks[t], blocks[t + 1])
-        arr = ens[v].isel(time=time_sel).load()  # percentile calc requires loading the array
-        coords = {}
-        for c in outdims:
-            coords[c] = arr[c]
-        for p in values:
-
-            out1 = _calc_perc(arr, p)
-
-            if t == 0:
-                arr_p_all[str(p)] = xr.DataArray(out1, dims=outdims, coords=coords)
-            else:
-                arr_p_all[str(p)] = xr.concat([arr_p_all[str(p)],
-                                               xr.DataArray(out1, dims=outdims, coords=coords)], dim='time')
-    for p in values:
-        outvar = v + '_p' + str(p)
-        ds_out[outvar] = arr_p_all[str(p)]
-        ds_out[outvar].attrs = ens[v].attrs
-        if 'description' in ds_out[outvar].attrs.keys():
-            ds_out[outvar].attrs['description'] = '{} : {}th percentile of ensemble'.format(
-                ds_out[outvar].attrs['description'], str(p))
-        else:
-            ds_out[outvar].attrs['description'] = '{}th percentile of ensemble'.format(str(p))
+    Returns
+    -------
+    xarray.Dataset
+      The statistics of variable `v` named `v_<stat>`, as in `ensemble_mean_std_max_min`, and its percentiles, as
+      in `ensemble_percentiles`, over the time steps common to all files.
+
+    Examples
+    --------
+    >>> import glob
+    >>> ncfiles = glob.glob('/*tas*.nc')
+    >>> out = ensemble_reduce(ncfiles, stats=['mean', 'stdev'], values=[10, 50, 90])
+    >>> print(out['tas_mean'])
+    """
+    invalid = set(stats) - {'mean', 'stdev', 'max', 'min'}
+    if invalid:
+        raise ValueError("Statistics {} are not among 'mean', 'stdev', 'max' and 'min'.".format(sorted(invalid)))
+
+    # Common time steps, found from the time coordinates only.
+    dates = []
+    for fn in ncfiles:
+        with _open_realization(fn, mf_flag) as ds:
+            dates.append(_date_keys(ds.time))
+    period = (max(d[0] for d in dates), min(d[-1] for d in dates))
+    if period[0] > period[1]:
+        raise ValueError("The files have no time step in common.")
+
+    # Each process reduces a subset of the files.
+    processes = min(processes or os.cpu_count(), len(ncfiles))
+    groups = [ncfiles[i::processes] for i in range(processes)]
+    func = functools.partial(_reduce_files, period=period, mf_flag=mf_flag, options=dict(OPTIONS), k=k,
+                             moments=bool(stats), sketch=bool(len(values)))
+    if processes == 1:
+        acc = functools.reduce(_merge, map(func, groups))
+    else:
+        # Forked processes may inherit the state of the netCDF and HDF5 libraries: start fresh interpreters instead.
+        with multiprocessing.get_context('spawn').Pool(processes) as pool:
+            acc = functools.reduce(_merge, pool.imap(func, groups))
+
+    out = xr.Dataset()
+    if stats:
+        ms = acc.mean_std_max_min()
+        out.update(ms[['{}_{}'.format(v, stat) for v in acc._stats for stat in stats]])
+    if len(values):
+        out.update(acc.percentiles(values, split=split))
+    return out
 
-    return ds_out
 
+def _merge(acc, other):
+    acc.merge(other)
+    return acc
 
-def _calc_perc(arr, p):
-    dims = arr.dims
-    # make sure time is the second dimension
-    if dims.index('time') != 1:
-        dims1 = [dims[dims.index('realization')], dims[dims.index('time')]]
-        for d in dims:
-            if d not in dims1:
-                dims1.append(d)
-        arr = arr.transpose(*dims1)
-        dims = dims1
-
-    nan_count = np.isnan(arr).sum(axis=dims.index('realization'))
-    out = np.percentile(arr, p, axis=dims.index('realization'))
-    if np.any((nan_count > 0) & (nan_count < arr.shape[dims.index('realization')])):
-        arr1 = arr.values.reshape(arr.shape[dims.index('realization')],
-                                  int(arr.size / arr.shape[dims.index('realization')]))
-        # only use nanpercentile where we need it (slow performace compared to standard) :
-        nan_index = np.where((nan_count > 0) & (nan_count < arr.shape[dims.index('realization')]))
-        t = np.ravel_multi_index(nan_index, nan_count.shape)
-        out[np.unravel_index(t, nan_count.shape)] = np.nanpercentile(arr1[:, t], p, axis=dims.index('realization'))
 
+def _reduce_files(ncfiles, period, mf_flag, options, **kwds):
+    """Return the statistics of the realizations stored in the given files over the given period.
+
+    The global `options` of the calling process are applied, as they are not inherited by spawned processes.
+    """
+    acc = EnsembleAccumulator(**kwds)
+    for fn in ncfiles:
+        with set_options(**options), _open_realization(fn, mf_flag) as ds:
+            d = _date_keys(ds.time)
+            acc.update(ds.isel(time=np.flatnonzero((d >= period[0]) & (d <= period[1]))).load())
+    return acc
+
+
+class EnsembleAccumulator(object):
+    """Running statistics of an ensemble, updated one realization at a time.
+
+    For each variable, the accumulator holds the number, or total weight, of valid values, the running mean and sum
+    of squared deviations (Welford's algorithm), the minimum and the maximum, as well as a quantile sketch. Missing
+    values are ignored. Accumulators built from different subsets of an ensemble can be merged, so that the
+    statistics of the whole ensemble are computed in parallel.
+
+    The quantile sketch is a stack of compactors: the realizations are stored in the first level until it holds `k`
+    of them, after which they are sorted and every other one is passed to the next level with twice the weight.
+    Percentiles are thus exact for up to `k` realizations, and approximated from at most `k log2(n / k)` stored
+    values otherwise.
+
+    Parameters
+    ----------
+    k : int
+      Capacity of each level of the quantile sketches, in realizations.
+    moments : bool
+      Whether to accumulate the mean, standard deviation, minimum and maximum.
+    sketch : bool
+      Whether to accumulate the quantile sketches.
+
+    Example
+    -------
+    >>> acc = EnsembleAccumulator()
+    >>> for fn in ncfiles:
+    ...     with xr.open_dataset(fn) as ds:
+    ...         acc.update(ds)
+    >>> stats = acc.mean_std_max_min()
+    >>> percs = acc.percentiles([10, 50, 90])
+    """
+
+    def __init__(self, k=256, moments=True, sketch=True):
+        self.k = 2 * max(1, k // 2)
+        self.moments = moments
+        self.sketch = sketch
+        self.count = 0
+        self._stats = {}
+        self._templates = {}
+        self._offset = 0
+
+    def update(self, ds, weight=1):
+        """Add a realization to the statistics.
+
+        Parameters
+        ----------
+        ds : xarray.Dataset
+          Single realization, without a `realization` dimension. Its variables are loaded in memory.
+        weight : float
+          Weight of the realization in the mean and standard deviation. Realizations with a weight of 0 are left out.
+          Only unit weights are supported by the quantile sketches.
+        """
+        if weight <= 0:
+            return
+        if self.sketch and weight != 1:
+            raise ValueError("The quantile sketches only support realizations of unit weight.")
+
+        for v, da in ds.data_vars.items():
+            x = np.asarray(da.values, dtype=float)
+            if v not in self._stats:
+                self._templates[v] = (da.dims, dict(da.coords), dict(da.attrs), da.dtype)
+                self._stats[v] = self._init(x.shape)
+            st = self._stats[v]
+
+            if self.moments:
+                _update_moments(st, x, weight)
+
+            if self.sketch:
+                st['levels'][0].append(x)
+                self._compress(st['levels'])
+        self.count += 1
+
+    def merge(self, other):
+        """Add the statistics accumulated by another accumulator.
+
+        Parameters
+        ----------
+        other : EnsembleAccumulator
+          Statistics of other realizations of the same variables.
+        """
+        for v, so in other._stats.items():
+            if v not in self._stats:
+                self._templates[v] = other._templates[v]
+                self._stats[v] = self._init(so['mean'].shape)
+            st = self._stats[v]
+
+            if self.moments:
+                _merge_moments(st, so)
+
+            if self.sketch:
+                for h, rows in enumerate(so['levels']):
+                    if h == len(st['levels']):
+                        st['levels'].append([])
+                    st['levels'][h].extend(rows)
+                self._compress(st['levels'])
+        self.count += other.count
+
+    def _init(self, shape):
+        return {'n': np.zeros(shape),
+                'mean': np.zeros(shape),
+                'm2': np.zeros(shape),
+                'min': np.full(shape, np.nan),
+                'max': np.full(shape, np.nan),
+                'levels': [[]]}
+
+    def _compress(self, levels):
+        """Compact the full levels of a quantile sketch, passing every other sorted value to the next level."""
+        for h, rows in enumerate(levels):
+            if len(rows) >= self.k:
+                m = len(rows) - len(rows) % 2
+                kept = np.sort(np.stack(rows[:m]), axis=0)[self._offset::2]
+                # Alternate between odd and even values, so that the errors of successive compactions cancel out.
+                self._offset = 1 - self._offset
+                if h + 1 == len(levels):
+                    levels.append([])
+                levels[h + 1].extend(kept)
+                levels[h] = rows[m:]
+
+    def _output(self, v, data, name, **extra):
+        return _ensemble_output(self._templates[v], data, name, **extra)
+
+    def mean_std_max_min(self):
+        """Return the ensemble mean, standard deviation, minimum and maximum of each variable.
+
+        Returns
+        -------
+        xarray.Dataset
+          The statistics of variable `v`, named `v_mean`, `v_stdev`, `v_max` and `v_min`.
+        """
+        if not self.moments:
+            raise ValueError("The accumulator does not hold the mean, standard deviation, minimum and maximum.")
+
+        out = xr.Dataset()
+        for v, st in self._stats.items():
+            stats = _moments_final(st)
+            for stat in _moments_stats:
+                out['{}_{}'.format(v, stat)] = self._output(v, stats[stat], stat)
+        return out
+
+    def percentiles(self, values=(10, 50, 90), split=True):
+        """Return the ensemble percentiles of each variable.
+
+        Parameters
+        ----------
+        values : sequence of ints
+          Percentiles between [0, 100].
+        split : bool
+          If True, each percentile is stored in its own variable, instead of along a `percentiles` dimension.
+
+        Returns
+        -------
+        xarray.Dataset
+          The percentiles of variable `v`, named `v`, or `v_p<p>` for percentile `p` if `split` is True.
+        """
+        if not self.sketch:
+            raise ValueError("The accumulator does not hold quantile sketches.")
+
+        q = np.asarray(values, dtype=float) / 100
+        out = xr.Dataset()
+        for v, st in self._stats.items():
+            rows = [row for rows in st['levels'] for row in rows]
+            arr = np.moveaxis(np.stack(rows), 0, -1)
+            if len(st['levels']) == 1:
+                qs = utils.nanquantile(arr, q)
+            else:
+                weights = np.concatenate([np.full(len(rows), 2. ** h) for (h, rows) in enumerate(st['levels'])])
+                qs = _weighted_nanquantile(arr, weights, q)
+
+            if split:
+                for i, p in enumerate(values):
+                    da = self._output(v, qs[..., i], '{}th percentile'.format(p))
+                    if 'description' not in da.attrs:
+                        da.attrs['description'] = '{}th percentile of ensemble'.format(p)
+                    out['{}_p{}'.format(v, p)] = da
+            else:
+                da = self._output(v, qs, 'percentiles', percentiles=list(values))
+                if 'description' not in da.attrs:
+                    da.attrs['description'] = 'Percentiles of ensemble'
+                out[v] = da
+        return out
+
+
+def _ensemble_output(template, data, name, **extra):
+    """Return a statistic of an ensemble variable, given its (dims, coords, attrs, dtype) template."""
+    dims, coords, attrs, dtype = template
+    out = xr.DataArray(data.astype(np.result_type(dtype, np.float32)), dims=dims + tuple(extra),
+                       coords=dict(coords, **extra), attrs=dict(attrs))
+    if 'description' in attrs:
+        out.attrs['description'] = '{} : {} of ensemble'.format(attrs['description'], name)
     return out
+
+
+def _weighted_nanquantile(arr, weights, q):
+    """Return the weighted quantiles of an array along its last axis, ignoring NaNs.
+
+    The quantiles are interpolated linearly between the sorted values, placed at the cumulated weight of the values
+    before them, normalized so that the first and last valid values are at 0 and 1. With unit weights, the results
+    are those of `utils.nanquantile`. Values with a weight of 0 are ignored, like NaNs.
+
+    Parameters
+    ----------
+    arr : np.array
+      Input values.
+    weights : np.array
+      Weights of the values, broadcastable to `arr`.
+    q : sequence of floats
+      Quantiles between [0, 1].
+
+    Returns
+    -------
+    np.array
+      The quantiles, stored along a new last axis. NaN where all values are missing.
+    """
+    weights = np.broadcast_to(weights, arr.shape)
+    arr = np.where(weights > 0, arr, np.nan)
+    order = np.argsort(arr, axis=-1)
+    a = np.take_along_axis(arr, order, axis=-1)
+    w = np.take_along_axis(weights, order, axis=-1)
+    w = np.where(np.isnan(a), 0, w)
+
+    n = np.count_nonzero(~np.isnan(a), axis=-1)[..., np.newaxis]
+    cum = np.cumsum(w, axis=-1)
+    last = np.take_along_axis(w, np.clip(n - 1, 0, None), axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pos = (cum - w) / (cum[..., -1:] - last)
+    pos = np.where(np.isnan(a), np.inf, pos)
+
+    q = np.asarray(q, dtype=float)
+    lo = np.clip((pos[..., np.newaxis, :] <= q[:, np.newaxis]).sum(axis=-1) - 1, 0, None)
+    hi = np.minimum(lo + 1, np.clip(n - 1, 0, None))
+    plo = np.take_along_axis(pos, lo, axis=-1)
+    phi = np.take_along_axis(pos, hi, axis=-1)
+    vlo = np.take_along_axis(a, lo, axis=-1)
+    vhi = np.take_along_axis(a, hi, axis=-1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        frac = np.where(phi > plo, (q - plo) / (phi - plo), 0)
+    out = vlo + (vhi - vlo) * np.clip(frac, 0, 1)
+    return np.where(n > 0, out, np.nan)
@@ -2,10 +2,13 @@
 # Note: stats.dist.shapes: comma separated names of shape parameters
 # The other parameters, common to all distribution, are loc and scale.
 
-import dask
+import functools
+
 import numpy as np
 import xarray as xr
 
+from xclim import lmoments, run_length as rl
+
 
 def select_time(da, **indexer):
     """Select entries according to a time period.
@@ -64,6 +67,94 @@ def select_resample_op(da, op, freq="YS", **indexer):
     return r.apply(op)
 
 
+def rolling_resample_op(da, window, op, freq='YS', how='mean', **indexer):
+    """Apply operation over each period to the moving sum or mean of the input.
+
+    The moving window statistic and the reduction over each period are computed together, one period at a time, from
+    the cumulative sums of the values of the period and of the `window - 1` preceding ones, so that only one period
+    of the moving window series is held in memory. The result is the same as rolling the input over `window` time
+    steps, then selecting the indexer and resampling at `freq`. Dask arrays are rechunked to hold the time series in
+    a single chunk, the size of the chunks along the other dimensions being bounded by the `max_chunk` option.
+
+    Parameters
+    ----------
+    da : xarray.DataArray
+      Input data.
+    window : int
+      Moving window length (time steps). Windows including missing values are ignored.
+    op : {'min', 'max'}
+      Reduce operation.
+    freq : str
+      Resampling frequency defining the periods
+      defined in http://pandas.pydata.org/pandas-docs/stable/timeseries.html#resampling.
+    how : {'mean', 'sum'}
+      Moving window statistic.
+    **indexer : {dim: indexer, }, optional
+      Time attribute and values over which to subset the moving window series. For example, use season='DJF' to
+      select winter values, month=1 to select January, or month=[6,7,8] to select summer months. If not indexer is
+      given, all values are considered.
+
+    Returns
+    -------
+    xarray.DataArray
+      The extreme of the moving window statistic over each period.
+    """
+    if op not in ['min', 'max']:
+        raise ValueError("Operation `{}` should be either 'min' or 'max'.".format(op))
+    if how not in ['mean', 'sum']:
+        raise ValueError("Moving window statistic `{}` should be either 'mean' or 'sum'.".format(how))
+
+    # Number of time steps in each period, including the empty ones.
+    counts = xr.ones_like(da.time, dtype=int).resample(time=freq).sum(dim='time')
+    starts = np.concatenate([[0], np.cumsum(counts.values)[:-1]])
+
+    # Time steps excluded by the indexer.
+    excluded = np.ones(da.time.size, dtype=bool)
+    excluded[da.get_index('time').get_indexer(select_time(da.time, **indexer).get_index('time'))] = False
+
+    da = rl.rechunk_core(da, 'time')
+    out = xr.apply_ufunc(_rolling_resample, da,
+                         input_core_dims=[['time']],
+                         output_core_dims=[['time']],
+                         exclude_dims={'time'},
+                         dask='parallelized',
+                         output_dtypes=[da.dtype if da.dtype.kind == 'f' else float],
+                         output_sizes={'time': counts.size},
+                         keep_attrs=True,
+                         kwargs=dict(window=window, func={'min': np.fmin, 'max': np.fmax}[op], mean=how == 'mean',
+                                     starts=starts, empty=counts.values == 0, excluded=excluded))
+    out.coords['time'] = counts.time
+    return out.transpose(*da.dims)
+
+
+def _rolling_resample(arr, window, func, mean, starts, empty, excluded):
+    """Reduce the moving sum or mean along the last axis over the periods beginning at the `starts` indices."""
+    ends = np.append(starts[1:], arr.shape[-1])
+    out = np.full(arr.shape[:-1] + (len(starts),), np.nan, dtype=arr.dtype if arr.dtype.kind == 'f' else float)
+    for k in np.flatnonzero(~empty):
+        # Values of the period and of the preceding ones falling in the windows ending within the period.
+        lo = max(0, starts[k] - window + 1)
+        x = arr[..., lo:ends[k]]
+        if x.shape[-1] < window:
+            continue
+        valid = ~np.isnan(x)
+
+        # The cumulative sums are computed in double precision to limit the round-off errors of their differences.
+        cs = np.zeros(x.shape[:-1] + (x.shape[-1] + 1,))
+        np.cumsum(np.where(valid, x, 0), axis=-1, out=cs[..., 1:])
+        cv = np.zeros(cs.shape, dtype=int)
+        np.cumsum(valid, axis=-1, out=cv[..., 1:])
+
+        # Value of the windows ending at each time step of the period, from the first one that is complete.
+        full = ((cv[..., window:] - cv[..., :-window]) == window) & ~excluded[lo + window - 1:ends[k]]
+        rolled = np.where(full, cs[..., window:] - cs[..., :-window], np.nan)
+        if mean:
+            rolled /= window
+        out[..., k] = func.reduce(rolled, axis=-1)
+
+    return out
+
+
 def doymax(da):
     """Return the day of year of the maximum value."""
     i = da.argmax(dim='time')
@@ -80,7 +171,7 @@ def doymin(da):
     return out
 
 
-def fit(arr, dist='norm'):
+def fit(arr, dist='norm', method='ML'):
     """Fit an array to a univariate distribution along the time dimension.
 
     Parameters
@@ -90,48 +181,152 @@ def fit(arr, dist='norm'):
     dist : str
       Name of the univariate distribution, such as beta, expon, genextreme, gamma, gumbel_r, lognorm, norm
       (see scipy.stats).
+    method : {'ML', 'MM', 'lmoments'}
+      Fitting method, either the Maximum Likelihood Estimator computed by `scipy` for each time series, the Method
+      of Moments or the method of L-moments, computed over the whole array at once. The latter are much faster, but
+      are only available for the distributions in `generic.moments_estimators` and `lmoments.estimators`
+      respectively. L-moments are more robust than moments for short records.
 
     Returns
     -------
     xarray.DataArray
-      An array of distribution parameters fitted using the method of Maximum Likelihood.
+      An array of distribution parameters fitted using the given method.
     """
     # Get the distribution
     dc = get_dist(dist)
 
-    # Fit the parameters (lazy computation)
-    data = dask.array.apply_along_axis(dc.fit, arr.get_axis_num('time'), arr)
-
-    # Count the number of values used for the fit.
-    # n = arr.count(dim='time')
-
-    # Create a view to a DataArray with the desired dimensions to copy them over to the parameter array.
-    mean = arr.mean(dim='time', keep_attrs=True)
+    if method == 'ML':
+        func, kwargs = lambda x: np.asarray(dc.fit(x)), dict(vectorize=True)
+    else:
+        func, kwargs = _block_fit(dist, method), {}
+    estimator = _estimators[method]
 
     # Create coordinate for the distribution parameters
-    coords = dict(mean.coords.items())
-    coords['dparams'] = ([] if dc.shapes is None else dc.shapes.split(',')) + ['loc', 'scale']
+    dparams = ([] if dc.shapes is None else dc.shapes.replace(' ', '').split(',')) + ['loc', 'scale']
+
+    # Fit the parameters (lazy computation), the time series being held in a single chunk.
+    out = xr.apply_ufunc(func, rl.rechunk_core(arr, 'time'), input_core_dims=[['time']], output_core_dims=[['dparams']],
+                         dask='parallelized', output_dtypes=[float], output_sizes={'dparams': len(dparams)},
+                         **kwargs)
+    out = out.transpose('dparams', *[d for d in arr.dims if d != 'time'])
+    out.coords['dparams'] = dparams
 
     # TODO: add time and time_bnds coordinates (Low will work on this)
     # time.attrs['climatology'] = 'climatology_bounds'
     # coords['time'] =
     # coords['climatology_bounds'] =
 
-    out = xr.DataArray(data=data, coords=coords, dims=(u'dparams',) + mean.dims)
-    out.attrs = arr.attrs
+    out.attrs = arr.attrs.copy()
     out.attrs['original_name'] = getattr(arr, 'standard_name', '')
     out.attrs['standard_name'] = '{0} distribution parameters'.format(dist)
     out.attrs['long_name'] = '{0} distribution parameters for {1}'.format(dist, getattr(arr, 'standard_name', ''))
-    out.attrs['estimator'] = 'Maximum likelihood'
+    out.attrs['estimator'] = estimator
     out.attrs['cell_methods'] = (out.attrs.get('cell_methods', '') + ' time: fit').strip()
     out.attrs['units'] = ''
-    msg = '\nData fitted with {0} statistical distribution using a Maximum Likelihood Estimator'
-    out.attrs['history'] = out.attrs.get('history', '') + msg.format(dist)
+    msg = '\nData fitted with {0} statistical distribution using a {1} Estimator'
+    out.attrs['history'] = out.attrs.get('history', '') + msg.format(dist, estimator)
 
     return out
 
 
-def fa(arr, t, dist='norm', mode='high'):
+_estimators = {'ML': 'Maximum likelihood', 'MM': 'Method of moments', 'lmoments': 'Method of L-moments'}
+
+
+def _block_fit(dist, method):
+    """Return the function fitting distribution `dist` along the last axis of an array with a vectorized method."""
+    if method == 'MM':
+        estimators = moments_estimators
+        func = _fit_moments
+    elif method == 'lmoments':
+        estimators = lmoments.estimators
+        func = lmoments.fit
+    else:
+        raise ValueError("Fitting method `{}` should be one of 'ML', 'MM' or 'lmoments'.".format(method))
+
+    if dist not in estimators:
+        raise ValueError("The {} estimator is not implemented for distribution `{}`, use one of {}."
+                         .format(_estimators[method], dist, sorted(estimators)))
+    return functools.partial(func, dist=dist)
+
+
+def _fit_moments(arr, dist):
+    """Return the parameters of distribution `dist` from the moments of the values along the last axis."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nanmean(arr, axis=-1)
+        dev = arr - mean[..., np.newaxis]
+        std = np.sqrt(np.nanmean(dev ** 2, axis=-1))
+        skew = np.nanmean(dev ** 3, axis=-1) / std ** 3
+        params = moments_estimators[dist](mean, std, skew)
+    return np.stack(np.broadcast_arrays(*params), axis=-1)
+
+
+def _moments_norm(mean, std, skew):
+    return mean, std
+
+
+def _moments_gumbel_r(mean, std, skew):
+    scale = std * np.sqrt(6) / np.pi
+    return mean - np.euler_gamma * scale, scale
+
+
+def _moments_pearson3(mean, std, skew):
+    return skew, mean, std
+
+
+def _moments_gamma(mean, std, skew):
+    # The distribution is only defined for positive skewness.
+    a = np.where(skew > 0, 4 / skew ** 2, np.nan)
+    scale = std * skew / 2
+    return a, mean - a * scale, scale
+
+
+def _moments_lognorm(mean, std, skew):
+    # With w = exp(s^2), the skewness is (w + 2) sqrt(w - 1): solve the cubic in x = sqrt(w - 1).
+    skew = np.where(skew > 0, skew, np.nan)
+    d = np.sqrt(skew ** 2 / 4 + 1)
+    x = np.cbrt(skew / 2 + d) + np.cbrt(skew / 2 - d)
+    w = 1 + x ** 2
+    scale = std / np.sqrt(w * (w - 1))
+    return np.sqrt(np.log(w)), mean - scale * np.sqrt(w), scale
+
+
+def _moments_genextreme(mean, std, skew):
+    from scipy.special import gamma
+
+    def moments(c):
+        # Mean and standard deviation of the standard distribution, the limit at c = 0 being the Gumbel distribution.
+        c = np.where(np.abs(c) < 1e-6, 1e-6, c)
+        g1, g2, g3 = gamma(1 + c), gamma(1 + 2 * c), gamma(1 + 3 * c)
+        v = g2 - g1 ** 2
+        return (1 - g1) / c, np.sqrt(v) / np.abs(c), np.sign(c) * (3 * g1 * g2 - g3 - 2 * g1 ** 3) / v ** 1.5
+
+    # The skewness decreases with the shape parameter, which is found by bisection on the whole array at once.
+    lo = np.full_like(skew, -1 / 3 + 1e-3)
+    hi = np.full_like(skew, 10.)
+    for _ in range(50):
+        c = (lo + hi) / 2
+        above = moments(c)[2] > skew
+        lo = np.where(above, c, lo)
+        hi = np.where(above, hi, c)
+    c = np.where(np.isnan(skew), np.nan, (lo + hi) / 2)
+
+    m, s, _ = moments(c)
+    scale = std / s
+    return c, mean - scale * m, scale
+
+
+# Method of moments estimators of the distribution parameters, ordered as in `scipy.stats`, from the mean, standard
+# deviation and skewness of the sample.
+moments_estimators = {'norm': _moments_norm,
+                      'gumbel_r': _moments_gumbel_r,
+                      'pearson3': _moments_pearson3,
+                      'gamma': _moments_gamma,
+                      'lognorm': _moments_lognorm,
+                      'genextreme': _moments_genextreme,
+                      }
+
+
+def fa(arr, t, dist='norm', mode='high', method='ML'):
     """Return the value corresponding to the given return period.
 
     Parameters
@@ -146,6 +341,8 @@ def fa(arr, t, dist='norm', mode='high'):
       (see scipy.stats).
     mode : {'min', 'max}
       Whether we are looking for a probability of exceedance (max) or a probability of non-exceedance (min).
+    method : {'ML', 'MM', 'lmoments'}
+      Fitting method, see `fit`.
 
     Returns
     -------
@@ -157,38 +354,31 @@ def fa(arr, t, dist='norm', mode='high'):
     # Get the distribution
     dc = get_dist(dist)
 
-    # Fit the parameters of the distribution
-    p = fit(arr, dist)
-
-    # Create a lambda function to facilitate passing arguments to dask. There is probably a better way to do this.
     if mode in ['max', 'high']:
-        def func(x):
-            return dc.isf(1. / t, *x)
+        func = dc.isf
     elif mode in ['min', 'low']:
-        def func(x):
-            return dc.ppf(1. / t, *x)
+        func = dc.ppf
     else:
         raise ValueError("mode `{}` should be either 'max' or 'min'".format(mode))
 
-    data = dask.array.apply_along_axis(func, p.get_axis_num('dparams'), p)
+    # Fit the parameters of the distribution
+    p = fit(arr, dist, method)
 
-    # Create coordinate for the return periods
-    coords = dict(p.coords.items())
-    coords.pop('dparams')
-    coords['return_period'] = t
+    # The quantiles are computed on whole blocks, the parameters being broadcast against the return periods.
+    def quantiles(x):
+        return func(1. / t, *np.moveaxis(x[..., np.newaxis], -2, 0))
 
-    # Create dimensions
-    dims = list(p.dims)
-    dims.remove('dparams')
-    dims.insert(0, u'return_period')
+    out = xr.apply_ufunc(quantiles, p, input_core_dims=[['dparams']], output_core_dims=[['return_period']],
+                         dask='parallelized', output_dtypes=[float], output_sizes={'return_period': len(t)})
+    out = out.transpose('return_period', *[d for d in p.dims if d != 'dparams'])
+    out.coords['return_period'] = t
 
     # TODO: add time and time_bnds coordinates (Low will work on this)
     # time.attrs['climatology'] = 'climatology_bounds'
     # coords['time'] =
     # coords['climatology_bounds'] =
 
-    out = xr.DataArray(data=data, coords=coords, dims=dims)
-    out.attrs = p.attrs
+    out.attrs = p.attrs.copy()
     out.attrs['standard_name'] = '{0} quantiles'.format(dist)
     out.attrs['long_name'] = '{0} return period values for {1}'.format(dist, getattr(arr, 'standard_name', ''))
     out.attrs['cell_methods'] = (out.attrs.get('cell_methods', '') + ' dparams: ppf').strip()
@@ -199,7 +389,89 @@ def fa(arr, t, dist='norm', mode='high'):
     return out
 
 
-def frequency_analysis(da, mode, t, dist, window=1, freq=None, **indexer):
+def fa_bootstrap(arr, t, dist='norm', mode='high', method='lmoments', ci=.9, n=1000, seed=None, batch=100):
+    """Return bootstrap confidence intervals of the values corresponding to the given return periods.
+
+    The input series are resampled with replacement `n` times, each sample is refitted and the bounds of the
+    confidence interval are the quantiles of the resulting return period values. The same resampled years are used
+    at every location, which keeps the spatial dependence of the samples and makes the results independent of the
+    chunking. Dask arrays are rechunked to hold the time series in a single chunk, and processed in parallel over
+    their chunks.
+
+    Parameters
+    ----------
+    arr : xarray.DataArray
+      Maximized/minimized input data with a `time` dimension.
+    t : int or sequence
+      Return period. The period depends on the resolution of the input data. If the input array's resolution is
+      yearly, then the return period is in years.
+    dist : str
+      Name of the univariate distribution, see `moments_estimators` and `lmoments.estimators`.
+    mode : {'min', 'max}
+      Whether we are looking for a probability of exceedance (max) or a probability of non-exceedance (min).
+    method : {'MM', 'lmoments'}
+      Vectorized fitting method, see `fit`.
+    ci : float
+      Confidence level, between 0 and 1.
+    n : int
+      Number of bootstrap samples.
+    seed : int
+      Seed of the random number generator, for reproducible results.
+    batch : int
+      Number of bootstrap samples fitted at once, bounding the memory used by each chunk.
+
+    Returns
+    -------
+    xarray.DataArray
+      The lower and upper bounds of the confidence interval of the values with a 1/t probability of exceedance
+      (if mode=='max'), along the `bounds` dimension.
+    """
+    t = np.atleast_1d(t)
+    dc = get_dist(dist)
+
+    if mode in ['max', 'high']:
+        func = dc.isf
+    elif mode in ['min', 'low']:
+        func = dc.ppf
+    else:
+        raise ValueError("mode `{}` should be either 'max' or 'min'".format(mode))
+
+    if not 0 < ci < 1:
+        raise ValueError("The confidence level should be between 0 and 1.")
+
+    fitter = _block_fit(dist, method)
+    index = np.random.RandomState(seed).randint(0, arr.time.size, size=(n, arr.time.size))
+
+    def bounds(x):
+        q = []
+        for i in range(0, n, batch):
+            # Samples along the second to last axis: (..., batch, time) -> (..., batch, dparams)
+            p = fitter(x[..., index[i:i + batch]])
+            q.append(func(1. / t, *np.moveaxis(p[..., np.newaxis], -2, 0)))
+        return np.moveaxis(np.nanquantile(np.concatenate(q, axis=-2), [(1 - ci) / 2, (1 + ci) / 2], axis=-2), 0, -1)
+
+    out = xr.apply_ufunc(bounds, rl.rechunk_core(arr, 'time'), input_core_dims=[['time']],
+                         output_core_dims=[['return_period', 'bounds']],
+                         dask='parallelized', output_dtypes=[float],
+                         output_sizes={'return_period': len(t), 'bounds': 2})
+    out = out.transpose('return_period', 'bounds', *[d for d in arr.dims if d != 'time'])
+    out.coords['return_period'] = t
+    out.coords['bounds'] = ['lower', 'upper']
+
+    out.attrs = arr.attrs.copy()
+    out.attrs['standard_name'] = '{0} quantiles'.format(dist)
+    out.attrs['long_name'] = '{0:.0%} confidence interval of the {1} return period values for {2}'.format(
+        ci, dist, getattr(arr, 'standard_name', ''))
+    out.attrs['estimator'] = _estimators[method]
+    out.attrs['cell_methods'] = (out.attrs.get('cell_methods', '') + ' time: fit dparams: ppf').strip()
+    out.attrs['mode'] = mode
+    msg = "\nCompute {0:.0%} confidence intervals of values corresponding to return periods from {1} bootstrap samples."
+    out.attrs['history'] = out.attrs.get('history', '') + msg.format(ci, n)
+
+    return out
+
+
+def frequency_analysis(da, mode, t, dist, window=1, freq=None, method='ML', **indexer):
     """Return the value corresponding to a return period.
 
     Parameters
@@ -219,6 +491,8 @@ def frequency_analysis(da, mode, t, dist, window=1, freq=None, **indexer):
     freq : str
       Resampling frequency. If None, the frequency is assumed to be 'YS' unless the indexer is season='DJF',
       in which case `freq` would be set to `YS-DEC`.
+    method : {'ML', 'MM', 'lmoments'}
+      Fitting method, see `fit`.
     **indexer : {dim: indexer, }, optional
       Time attribute and values over which to subset the array. For example, use season='DJF' to select winter values,
       month=1 to select January, or month=[6,7,8] to select summer months. If not indexer is given, all values are
@@ -230,18 +504,17 @@ def frequency_analysis(da, mode, t, dist, window=1, freq=None, **indexer):
       An array of values with a 1/t probability of exceedance or non-exceedance when mode is high or low respectively.
 
     """
-    # Apply rolling average
-    if window > 1:
-        da = da.rolling(time=window, center=False).mean()
-
     # Assign default resampling frequency if not provided
     freq = freq or default_freq(**indexer)
 
-    # Extract the time series of min or max over the period
-    sel = select_resample_op(da, op=mode, freq=freq, **indexer).dropna(dim='time')
+    # Extract the time series of min or max over the period, of the rolling average if window > 1
+    if window > 1:
+        sel = rolling_resample_op(da, window, op=mode, freq=freq, how='mean', **indexer).dropna(dim='time')
+    else:
+        sel = select_resample_op(da, op=mode, freq=freq, **indexer).dropna(dim='time')
 
     # Frequency analysis
-    return fa(sel, t, dist, mode)
+    return fa(sel, t, dist, mode, method)
 
 
 def default_freq(**indexer):
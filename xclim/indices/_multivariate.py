@@ -3,7 +3,8 @@ import logging
 import numpy as np
 import xarray as xr
 
-from xclim import utils, run_length as rl
+from xclim import baseline, utils, run_length as rl
+from xclim.options import period_count_dtype
 from xclim.utils import declare_units, units
 
 logging.basicConfig(level=logging.DEBUG)
@@ -36,8 +37,8 @@ def cold_spell_duration_index(tasmin, tn10, window=6, freq='YS'):
     ----------
     tasmin : xarray.DataArray
       Minimum daily temperature.
-    tn10 : float
-      10th percentile of daily minimum temperature.
+    tn10 : xarray.DataArray or Baseline
+      10th percentile of daily minimum temperature, or the reference period over which it is computed.
     window : int
       Minimum number of days with temperature below threshold to qualify as a cold spell. Default: 6.
     freq : str, optional
@@ -70,23 +71,16 @@ def cold_spell_duration_index(tasmin, tn10, window=6, freq='YS'):
     >>> tn10 = percentile_doy(historical_tasmin, per=.1)
     >>> cold_spell_duration_index(reference_tasmin, tn10)
     """
+    tn10 = baseline.get_percentiles(tn10, tasmin, .1)
     if 'dayofyear' not in tn10.coords.keys():
         raise AttributeError("tn10 should have dayofyear coordinates.")
 
-    # The day of year value of the tasmin series.
-    doy = tasmin.indexes['time'].dayofyear
-
     tn10 = utils.convert_units_to(tn10, tasmin)
-    # If calendar of `tn10` is different from `tasmin`, interpolate.
-    tn10 = utils.adjust_doy_calendar(tn10, tasmin)
-
-    # Create an array with the shape and coords of tasmin, but with values set to tx90 according to the doy index.
-    thresh = xr.full_like(tasmin, np.nan)
-    thresh.data = tn10.sel(dayofyear=doy)
 
-    below = (tasmin < thresh)
+    # Compare to the percentile of each day of the year, interpolated if the calendars differ.
+    below = utils.compare_doy(tasmin, '<', tn10)
 
-    return below.resample(time=freq).apply(rl.windowed_run_count, window=window, dim='time')
+    return rl.resample_windowed_run_count(below, window, freq)
 
 
 def cold_and_dry_days(tas, tgin25, pr, wet25, freq='YS'):
@@ -163,8 +157,8 @@ def daily_freezethaw_cycles(tasmax, tasmin, freq='YS'):
     where :math:`[P]` is 1 if :math:`P` is true, and 0 if false.
     """
     frz = utils.convert_units_to('0 degC', tasmax)
-    ft = (tasmin < frz) * (tasmax > frz) * 1
-    out = ft.resample(time=freq).sum(dim='time')
+    ft = (tasmin < frz) & (tasmax > frz)
+    out = ft.resample(time=freq).sum(dim='time').astype(period_count_dtype(ft.time, freq), copy=False)
     return out
 
 
@@ -333,8 +327,7 @@ def heat_wave_frequency(tasmin, tasmax, thresh_tasmin='22.0 degC', thresh_tasmax
     thresh_tasmin = utils.convert_units_to(thresh_tasmin, tasmin)
 
     cond = (tasmin > thresh_tasmin) & (tasmax > thresh_tasmax)
-    group = cond.resample(time=freq)
-    return group.apply(rl.windowed_run_events, window=window, dim='time')
+    return rl.resample_windowed_run_events(cond, window, freq)
 
 
 @declare_units('days', tasmin='[temperature]', tasmax='[temperature]', thresh_tasmin='[temperature]',
@@ -393,8 +386,7 @@ def heat_wave_max_length(tasmin, tasmax, thresh_tasmin='22.0 degC', thresh_tasma
     thresh_tasmin = utils.convert_units_to(thresh_tasmin, tasmin)
 
     cond = (tasmin > thresh_tasmin) & (tasmax > thresh_tasmax)
-    group = cond.resample(time=freq)
-    max_l = group.apply(rl.longest_run, dim='time')
+    max_l = rl.resample_longest_run(cond, freq)
     return max_l.where(max_l >= window, 0)
 
 
@@ -517,8 +509,8 @@ def tg90p(tas, t90, freq='YS'):
     ----------
     tas : xarray.DataArray
       Mean daily temperature [℃] or [K]
-    t90 : xarray.DataArray
-      90th percentile of daily mean temperature [℃] or [K]
+    t90 : xarray.DataArray or Baseline
+      90th percentile of daily mean temperature [℃] or [K], or the reference period over which it is computed.
     freq : str, optional
       Resampling frequency
 
@@ -536,23 +528,16 @@ def tg90p(tas, t90, freq='YS'):
     >>> t90 = percentile_doy(historical_tas, per=0.9)
     >>> hot_days = tg90p(tas, t90)
     """
+    t90 = baseline.get_percentiles(t90, tas, .9)
     if 'dayofyear' not in t90.coords.keys():
         raise AttributeError("t10 should have dayofyear coordinates.")
 
     t90 = utils.convert_units_to(t90, tas)
 
-    # adjustment of t90 to tas doy range
-    t90 = utils.adjust_doy_calendar(t90, tas)
-
-    # create array of percentile with tas shape and coords
-    thresh = xr.full_like(tas, np.nan)
-    doy = thresh.time.dt.dayofyear.values
-    thresh.data = t90.sel(dayofyear=doy)
-
-    # compute the cold days
-    over = (tas > thresh)
+    # compare to the percentile of each day of the year
+    over = utils.compare_doy(tas, '>', t90)
 
-    return over.resample(time=freq).sum(dim='time')
+    return over.resample(time=freq).sum(dim='time').astype(period_count_dtype(over.time, freq), copy=False)
 
 
 @declare_units('days', tas='[temperature]', t10='[temperature]')
@@ -565,8 +550,8 @@ def tg10p(tas, t10, freq='YS'):
     ----------
     tas : xarray.DataArray
       Mean daily temperature [℃] or [K]
-    t10 : xarray.DataArray
-      10th percentile of daily mean temperature [℃] or [K]
+    t10 : xarray.DataArray or Baseline
+      10th percentile of daily mean temperature [℃] or [K], or the reference period over which it is computed.
     freq : str, optional
       Resampling frequency
 
@@ -584,23 +569,16 @@ def tg10p(tas, t10, freq='YS'):
     >>> t10 = percentile_doy(historical_tas, per=0.1)
     >>> cold_days = tg10p(tas, t10)
     """
+    t10 = baseline.get_percentiles(t10, tas, .1)
     if 'dayofyear' not in t10.coords.keys():
         raise AttributeError("t10 should have dayofyear coordinates.")
 
     t10 = utils.convert_units_to(t10, tas)
 
-    # adjustment of t10 to tas doy range
-    t10 = utils.adjust_doy_calendar(t10, tas)
+    # compare to the percentile of each day of the year
+    below = utils.compare_doy(tas, '<', t10)
 
-    # create array of percentile with tas shape and coords
-    thresh = xr.full_like(tas, np.nan)
-    doy = thresh.time.dt.dayofyear.values
-    thresh.data = t10.sel(dayofyear=doy)
-
-    # compute the cold days
-    below = (tas < thresh)
-
-    return below.resample(time=freq).sum(dim='time')
+    return below.resample(time=freq).sum(dim='time').astype(period_count_dtype(below.time, freq), copy=False)
 
 
 @declare_units('days', tasmin='[temperature]', t90='[temperature]')
@@ -613,8 +591,8 @@ def tn90p(tasmin, t90, freq='YS'):
     ----------
     tasmin : xarray.DataArray
       Minimum daily temperature [℃] or [K]
-    t90 : xarray.DataArray
-      90th percentile of daily minimum temperature [℃] or [K]
+    t90 : xarray.DataArray or Baseline
+      90th percentile of daily minimum temperature [℃] or [K], or the reference period over which it is computed.
     freq : str, optional
       Resampling frequency
 
@@ -632,21 +610,15 @@ def tn90p(tasmin, t90, freq='YS'):
     >>> t90 = percentile_doy(historical_tas, per=0.9)
     >>> hot_days = tg90p(tas, t90)
     """
+    t90 = baseline.get_percentiles(t90, tasmin, .9)
     if 'dayofyear' not in t90.coords.keys():
         raise AttributeError("t10 should have dayofyear coordinates.")
     t90 = utils.convert_units_to(t90, tasmin)
-    # adjustment of t90 to tas doy range
-    t90 = utils.adjust_doy_calendar(t90, tasmin)
 
-    # create array of percentile with tas shape and coords
-    thresh = xr.full_like(tasmin, np.nan)
-    doy = thresh.time.dt.dayofyear.values
-    thresh.data = t90.sel(dayofyear=doy)
+    # compare to the percentile of each day of the year
+    over = utils.compare_doy(tasmin, '>', t90)
 
-    # compute the cold days
-    over = (tasmin > thresh)
-
-    return over.resample(time=freq).sum(dim='time')
+    return over.resample(time=freq).sum(dim='time').astype(period_count_dtype(over.time, freq), copy=False)
 
 
 @declare_units('days', tasmin='[temperature]', t10='[temperature]')
@@ -660,8 +632,8 @@ def tn10p(tasmin, t10, freq='YS'):
 
     tasmin : xarray.DataArray
       Mean daily temperature [℃] or [K]
-    t10 : xarray.DataArray
-      10th percentile of daily minimum temperature [℃] or [K]
+    t10 : xarray.DataArray or Baseline
+      10th percentile of daily minimum temperature [℃] or [K], or the reference period over which it is computed.
     freq : str, optional
       Resampling frequency
 
@@ -679,22 +651,15 @@ def tn10p(tasmin, t10, freq='YS'):
     >>> t10 = percentile_doy(historical_tas, per=0.1)
     >>> cold_days = tg10p(tas, t10)
     """
+    t10 = baseline.get_percentiles(t10, tasmin, .1)
     if 'dayofyear' not in t10.coords.keys():
         raise AttributeError("t10 should have dayofyear coordinates.")
     t10 = utils.convert_units_to(t10, tasmin)
 
-    # adjustment of t10 to tas doy range
-    t10 = utils.adjust_doy_calendar(t10, tasmin)
-
-    # create array of percentile with tas shape and coords
-    thresh = xr.full_like(tasmin, np.nan)
-    doy = thresh.time.dt.dayofyear.values
-    thresh.data = t10.sel(dayofyear=doy)
+    # compare to the percentile of each day of the year
+    below = utils.compare_doy(tasmin, '<', t10)
 
-    # compute the cold days
-    below = (tasmin < thresh)
-
-    return below.resample(time=freq).sum(dim='time')
+    return below.resample(time=freq).sum(dim='time').astype(period_count_dtype(below.time, freq), copy=False)
 
 
 @declare_units('days', tasmax='[temperature]', t90='[temperature]')
@@ -707,8 +672,8 @@ def tx90p(tasmax, t90, freq='YS'):
     ----------
     tasmax : xarray.DataArray
       Maximum daily temperature [℃] or [K]
-    t90 : xarray.DataArray
-      90th percentile of daily maximum temperature [℃] or [K]
+    t90 : xarray.DataArray or Baseline
+      90th percentile of daily maximum temperature [℃] or [K], or the reference period over which it is computed.
     freq : str, optional
       Resampling frequency
 
@@ -726,23 +691,16 @@ def tx90p(tasmax, t90, freq='YS'):
     >>> t90 = percentile_doy(historical_tas, per=0.9)
     >>> hot_days = tg90p(tas, t90)
     """
+    t90 = baseline.get_percentiles(t90, tasmax, .9)
     if 'dayofyear' not in t90.coords.keys():
         raise AttributeError("t10 should have dayofyear coordinates.")
 
     t90 = utils.convert_units_to(t90, tasmax)
 
-    # adjustment of t90 to tas doy range
-    t90 = utils.adjust_doy_calendar(t90, tasmax)
-
-    # create array of percentile with tas shape and coords
-    thresh = xr.full_like(tasmax, np.nan)
-    doy = thresh.time.dt.dayofyear.values
-    thresh.data = t90.sel(dayofyear=doy)
+    # compare to the percentile of each day of the year
+    over = utils.compare_doy(tasmax, '>', t90)
 
-    # compute the cold days
-    over = (tasmax > thresh)
-
-    return over.resample(time=freq).sum(dim='time')
+    return over.resample(time=freq).sum(dim='time').astype(period_count_dtype(over.time, freq), copy=False)
 
 
 @declare_units('days', tasmax='[temperature]', t10='[temperature]')
@@ -755,8 +713,8 @@ def tx10p(tasmax, t10, freq='YS'):
     ----------
     tasmax : xarray.DataArray
       Maximum daily temperature [℃] or [K]
-    t10 : xarray.DataArray
-      10th percentile of daily maximum temperature [℃] or [K]
+    t10 : xarray.DataArray or Baseline
+      10th percentile of daily maximum temperature [℃] or [K], or the reference period over which it is computed.
     freq : str, optional
       Resampling frequency
 
@@ -774,23 +732,16 @@ def tx10p(tasmax, t10, freq='YS'):
     >>> t10 = percentile_doy(historical_tas, per=0.1)
     >>> cold_days = tg10p(tas, t10)
     """
+    t10 = baseline.get_percentiles(t10, tasmax, .1)
     if 'dayofyear' not in t10.coords.keys():
         raise AttributeError("t10 should have dayofyear coordinates.")
 
     t10 = utils.convert_units_to(t10, tasmax)
 
-    # adjustment of t10 to tas doy range
-    t10 = utils.adjust_doy_calendar(t10, tasmax)
-
-    # create array of percentile with tas shape and coords
-    thresh = xr.full_like(tasmax, np.nan)
-    doy = thresh.time.dt.dayofyear.values
-    thresh.data = t10.sel(dayofyear=doy)
+    # compare to the percentile of each day of the year
+    below = utils.compare_doy(tasmax, '<', t10)
 
-    # compute the cold days
-    below = (tasmax < thresh)
-
-    return below.resample(time=freq).sum(dim='time')
+    return below.resample(time=freq).sum(dim='time').astype(period_count_dtype(below.time, freq), copy=False)
 
 
 @declare_units('days', tasmin='[temperature]', tasmax='[temperature]', thresh_tasmin='[temperature]',
@@ -841,8 +792,8 @@ def tx_tn_days_above(tasmin, tasmax, thresh_tasmin='22 degC',
     """
     thresh_tasmax = utils.convert_units_to(thresh_tasmax, tasmax)
     thresh_tasmin = utils.convert_units_to(thresh_tasmin, tasmin)
-    events = ((tasmin > (thresh_tasmin)) & (tasmax > (thresh_tasmax))) * 1
-    return events.resample(time=freq).sum(dim='time')
+    events = (tasmin > thresh_tasmin) & (tasmax > thresh_tasmax)
+    return events.resample(time=freq).sum(dim='time').astype(period_count_dtype(events.time, freq), copy=False)
 
 
 @declare_units('days', tasmax='[temperature]', tx90='[temperature]')
@@ -857,8 +808,8 @@ def warm_spell_duration_index(tasmax, tx90, window=6, freq='YS'):
     ----------
     tasmax : xarray.DataArray
       Maximum daily temperature [℃] or [K]
-    tx90 : float
-      90th percentile of daily maximum temperature [℃] or [K]
+    tx90 : xarray.DataArray or Baseline
+      90th percentile of daily maximum temperature [℃] or [K], or the reference period over which it is computed.
     window : int
       Minimum number of days with temperature below threshold to qualify as a warm spell.
     freq : str, optional
@@ -877,22 +828,16 @@ def warm_spell_duration_index(tasmax, tx90, window=6, freq='YS'):
     precipitation, J. Geophys. Res., 111, D05109, doi: 10.1029/2005JD006290.
 
     """
+    tx90 = baseline.get_percentiles(tx90, tasmax, .9)
     if 'dayofyear' not in tx90.coords.keys():
         raise AttributeError("tx90 should have dayofyear coordinates.")
 
-    # The day of year value of the tasmax series.
-    doy = tasmax.indexes['time'].dayofyear
-
-    # adjustment of tx90 to tasmax doy range
-    tx90 = utils.adjust_doy_calendar(tx90, tasmax)
-
-    # Create an array with the shape and coords of tasmax, but with values set to tx90 according to the doy index.
-    thresh = xr.full_like(tasmax, np.nan)
-    thresh.data = tx90.sel(dayofyear=doy)
+    tx90 = utils.convert_units_to(tx90, tasmax)
 
-    above = (tasmax > thresh)
+    # Compare to the percentile of each day of the year, interpolated if the calendars differ.
+    above = utils.compare_doy(tasmax, '>', tx90)
 
-    return above.resample(time=freq).apply(rl.windowed_run_count, window=window, dim='time')
+    return rl.resample_windowed_run_count(above, window, freq)
 
 
 @declare_units('', pr='[precipitation]', prsn='[precipitation]', tas='[temperature]')
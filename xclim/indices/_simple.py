@@ -3,6 +3,7 @@ import logging
 import xarray as xr
 
 from xclim import run_length as rl, utils
+from xclim.options import period_count_dtype
 from xclim.utils import declare_units, units
 
 logging.basicConfig(level=logging.DEBUG)
@@ -395,8 +396,7 @@ def consecutive_frost_days(tasmin, freq='AS-JUL'):
     frz = 0
     if fu != tu:
         frz = units.convert(frz, fu, tu)
-    group = (tasmin < frz).resample(time=freq)
-    return group.apply(rl.longest_run, dim='time')
+    return rl.resample_longest_run(tasmin < frz, freq)
 
 
 @declare_units('days', tasmin='[temperature]')
@@ -431,8 +431,8 @@ def frost_days(tasmin, freq='YS'):
     frz = 0
     if fu != tu:
         frz = units.convert(frz, fu, tu)
-    f = (tasmin < frz) * 1
-    return f.resample(time=freq).sum(dim='time')
+    f = (tasmin < frz)
+    return f.resample(time=freq).sum(dim='time').astype(period_count_dtype(f.time, freq), copy=False)
 
 
 @declare_units('days', tasmax='[temperature]')
@@ -467,8 +467,8 @@ def ice_days(tasmax, freq='YS'):
     frz = 0
     if fu != tu:
         frz = units.convert(frz, fu, tu)
-    f = (tasmax < frz) * 1
-    return f.resample(time=freq).sum(dim='time')
+    f = (tasmax < frz)
+    return f.resample(time=freq).sum(dim='time').astype(period_count_dtype(f.time, freq), copy=False)
 
 
 @declare_units('mm/day', pr='[precipitation]')
@@ -3,7 +3,8 @@ import logging
 import numpy as np
 import xarray as xr
 
-from xclim import utils, run_length as rl
+from xclim import generic, utils, run_length as rl
+from xclim.options import count_dtype, period_count_dtype
 from xclim.utils import declare_units, units
 
 logging.basicConfig(level=logging.DEBUG)
@@ -61,9 +62,8 @@ def cold_spell_days(tas, thresh='-10 degC', window=5, freq='AS-JUL'):
     """
     t = utils.convert_units_to(thresh, tas)
     over = tas < t
-    group = over.resample(time=freq)
 
-    return group.apply(rl.windowed_run_count, window=window, dim='time')
+    return rl.resample_windowed_run_count(over, window, freq)
 
 
 @declare_units('mm/day', pr='[precipitation]', thresh='[precipitation]')
@@ -160,8 +160,7 @@ def maximum_consecutive_wet_days(pr, thresh='1 mm/day', freq='YS'):
     """
     thresh = utils.convert_units_to(thresh, pr, 'hydro')
 
-    group = (pr > thresh).resample(time=freq)
-    return group.apply(rl.longest_run, dim='time')
+    return rl.resample_longest_run(pr > thresh, freq)
 
 
 @declare_units('C days', tas='[temperature]', thresh='[temperature]')
@@ -349,12 +348,12 @@ def growing_season_length(tas, thresh='5.0 degC', window=6, freq='YS'):
     # compute growth season length on resampled data
     thresh = utils.convert_units_to(thresh, tas)
 
-    c = ((tas > thresh) * 1).rolling(time=window).sum().chunk(tas.chunks)
+    c = (tas > thresh).astype(count_dtype()).rolling(time=window).sum()
 
     def compute_gsl(c):
         nt = c.time.size
-        i = xr.DataArray(np.arange(nt), dims='time').chunk({'time': 1})
-        ind = xr.broadcast(i, c)[0].chunk(c.chunks)
+        # The index is broadcast against `c` by `where`, so that it follows the chunks of the input.
+        ind = xr.DataArray(np.arange(nt), dims='time', coords={'time': c.time})
         i1 = ind.where(c == window).min(dim='time')
         i1 = xr.where(np.isnan(i1), nt, i1)
         i11 = i1.reindex_like(c, method='ffill')
@@ -392,9 +391,8 @@ def heat_wave_index(tasmax, thresh='25.0 degC', window=5, freq='YS'):
     """
     thresh = utils.convert_units_to(thresh, tasmax)
     over = tasmax > thresh
-    group = over.resample(time=freq)
 
-    return group.apply(rl.windowed_run_count, window=window, dim='time')
+    return rl.resample_windowed_run_count(over, window, freq)
 
 
 @declare_units('C days', tas='[temperature]', thresh='[temperature]')
@@ -498,8 +496,8 @@ def tx_days_above(tasmax, thresh='25.0 degC', freq='YS'):
         TX_{ij} > Threshold [℃]
     """
     thresh = utils.convert_units_to(thresh, tasmax)
-    f = (tasmax > (thresh)) * 1
-    return f.resample(time=freq).sum(dim='time')
+    f = tasmax > thresh
+    return f.resample(time=freq).sum(dim='time').astype(period_count_dtype(f.time, freq), copy=False)
 
 
 @declare_units('days', tasmax='[temperature]', thresh='[temperature]')
@@ -532,8 +530,8 @@ def warm_day_frequency(tasmax, thresh='30 degC', freq='YS'):
 
     """
     thresh = utils.convert_units_to(thresh, tasmax)
-    events = (tasmax > thresh) * 1
-    return events.resample(time=freq).sum(dim='time')
+    events = tasmax > thresh
+    return events.resample(time=freq).sum(dim='time').astype(period_count_dtype(events.time, freq), copy=False)
 
 
 @declare_units('days', tasmin='[temperature]', thresh='[temperature]')
@@ -557,8 +555,8 @@ def warm_night_frequency(tasmin, thresh='22 degC', freq='YS'):
       The number of days with tasmin > thresh per period
     """
     thresh = utils.convert_units_to(thresh, tasmin, )
-    events = (tasmin > thresh) * 1
-    return events.resample(time=freq).sum(dim='time')
+    events = tasmin > thresh
+    return events.resample(time=freq).sum(dim='time').astype(period_count_dtype(events.time, freq), copy=False)
 
 
 @declare_units('days', pr='[precipitation]', thresh='[precipitation]')
@@ -592,8 +590,8 @@ def wetdays(pr, thresh='1.0 mm/day', freq='YS'):
     """
     thresh = utils.convert_units_to(thresh, pr, 'hydro')
 
-    wd = (pr >= thresh) * 1
-    return wd.resample(time=freq).sum(dim='time')
+    wd = pr >= thresh
+    return wd.resample(time=freq).sum(dim='time').astype(period_count_dtype(wd.time, freq), copy=False)
 
 
 @declare_units('days', pr='[precipitation]', thresh='[precipitation]')
@@ -632,9 +630,7 @@ def maximum_consecutive_dry_days(pr, thresh='1 mm/day', freq='YS'):
     the start and end of the series, but the numerical algorithm does.
     """
     t = utils.convert_units_to(thresh, pr, 'hydro')
-    group = (pr < t).resample(time=freq)
-
-    return group.apply(rl.longest_run, dim='time')
+    return rl.resample_longest_run(pr < t, freq)
 
 
 @declare_units('mm', pr='[precipitation]')
@@ -668,9 +664,8 @@ def max_n_day_precipitation_amount(pr, window=1, freq='YS'):
     >>> output = max_n_day_precipitation_amount(da, window, freq="YS")
     """
 
-    # rolling sum of the values
-    arr = pr.rolling(time=window, center=False).sum()
-    out = arr.resample(time=freq).max(dim='time', keep_attrs=True)
+    # maximum of the rolling sum of the values, computed without storing the rolling sum
+    out = generic.rolling_resample_op(pr, window, 'max', freq=freq, how='sum')
 
     out.attrs['units'] = pr.units
     # Adjust values and units to make sure they are daily
@@ -707,6 +702,7 @@ def tropical_nights(tasmin, thresh='20.0 degC', freq='YS'):
         TN_{ij} > Threshold [℃]
     """
     thresh = utils.convert_units_to(thresh, tasmin)
-    return tasmin.pipe(lambda x: (tasmin > thresh) * 1) \
+    return tasmin.pipe(lambda x: tasmin > thresh) \
         .resample(time=freq) \
-        .sum(dim='time')
+        .sum(dim='time') \
+        .astype(period_count_dtype(tasmin.time, freq), copy=False)
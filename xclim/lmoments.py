@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+L-moments
+=========
+
+Sample L-moments and the estimators of distribution parameters based on them, following Hosking (1990). L-moments
+are linear combinations of the order statistics of a sample, which makes them cheap to compute over many series at
+once and less sensitive than the conventional moments to outliers and short records. They are the standard tool of
+regional frequency analysis.
+
+The parameters are ordered as in `scipy.stats`, so that they can be passed to the scipy distributions.
+
+Example
+-------
+>>> from xclim import generic
+>>> p = generic.fit(annual_maxima, 'genextreme', method='lmoments')
+
+References
+----------
+Hosking, J. R. M. (1990). L-moments: analysis and estimation of distributions using linear combinations of order
+statistics. Journal of the Royal Statistical Society, Series B, 52(1), 105-124.
+
+Hosking, J. R. M. and Wallis, J. R. (1997). Regional frequency analysis: an approach based on L-moments. Cambridge
+University Press.
+"""
+import numpy as np
+
+
+def lmoments(arr, nmom=4):
+    """Return the sample L-moments of the values along the last axis.
+
+    The L-moments are computed from the unbiased estimators of the probability weighted moments of the sorted
+    values. Missing values are ignored.
+
+    Parameters
+    ----------
+    arr : numpy.ndarray
+      Samples, along the last axis.
+    nmom : int
+      Number of L-moments, at most 4.
+
+    Returns
+    -------
+    numpy.ndarray
+      The L-moments l1, l2, and the L-moment ratios t3 = l3 / l2 and t4 = l4 / l2, along the last axis.
+    """
+    if not 1 <= nmom <= 4:
+        raise ValueError("The number of L-moments should be between 1 and 4.")
+
+    # Missing values are sorted last, and given a weight of 0.
+    x = np.sort(arr, axis=-1)
+    valid = ~np.isnan(x)
+    n = valid.sum(axis=-1, keepdims=True).astype(float)
+    x = np.where(valid, x, 0)
+
+    # Probability weighted moments b_r = n^-1 sum_j [(j-1)...(j-r)] / [(n-1)...(n-r)] x_(j)
+    j = np.arange(x.shape[-1], dtype=float)
+    w = np.ones_like(x * n)
+    b = []
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for r in range(nmom):
+            if r > 0:
+                w = w * (j - r + 1) / (n - r)
+            b.append((w * x).sum(axis=-1) / n[..., 0])
+
+        # Coefficients of the shifted Legendre polynomials.
+        coefs = [[1], [-1, 2], [1, -6, 6], [-1, 12, -30, 20]]
+        out = [sum(c * br for (c, br) in zip(coef, b)) for coef in coefs[:nmom]]
+        out[2:] = [lr / out[1] for lr in out[2:]]
+    return np.stack(out, axis=-1)
+
+
+def _norm(l1, l2, t3):
+    return l1, l2 * np.sqrt(np.pi)
+
+
+def _gumbel_r(l1, l2, t3):
+    scale = l2 / np.log(2)
+    return l1 - np.euler_gamma * scale, scale
+
+
+def _genextreme(l1, l2, t3):
+    from scipy.special import gamma
+
+    z = 2 / (3 + t3) - np.log(2) / np.log(3)
+    k = 7.8590 * z + 2.9554 * z ** 2
+    # The limit at k = 0 is the Gumbel distribution.
+    ks = np.where(np.abs(k) < 1e-6, 1e-6, k)
+    g = gamma(1 + ks)
+    scale = l2 * ks / ((1 - 2 ** -ks) * g)
+    return k, l1 - scale * (1 - g) / ks, scale
+
+
+def _pearson3_moments(l1, l2, t3):
+    """Return the mean, standard deviation and skewness of the Pearson type III distribution."""
+    from scipy.special import gammaln
+
+    # Rational approximations of the shape parameter.
+    t = np.abs(t3)
+    z = np.where(t < 1 / 3, 3 * np.pi * t3 ** 2, 1 - t)
+    small = (1 + 0.2906 * z) / (z + 0.1882 * z ** 2 + 0.0442 * z ** 3)
+    large = (0.36067 * z - 0.59567 * z ** 2 + 0.25361 * z ** 3) / \
+        (1 - 2.78861 * z + 2.56096 * z ** 2 - 0.77045 * z ** 3)
+    alpha = np.where(t < 1 / 3, small, large)
+
+    std = l2 * np.sqrt(np.pi * alpha) * np.exp(gammaln(alpha) - gammaln(alpha + .5))
+    return l1, std, 2 * np.sign(t3) / np.sqrt(alpha)
+
+
+def _pearson3(l1, l2, t3):
+    mean, std, skew = _pearson3_moments(l1, l2, t3)
+    return skew, mean, std
+
+
+def _gamma(l1, l2, t3):
+    mean, std, skew = _pearson3_moments(l1, l2, t3)
+    # The distribution is only defined for positive skewness.
+    skew = np.where(t3 > 0, skew, np.nan)
+    a = 4 / skew ** 2
+    scale = std * skew / 2
+    return a, mean - a * scale, scale
+
+
+def _lognorm(l1, l2, t3):
+    from scipy.special import ndtr
+
+    # Shape parameter k of the generalized normal distribution, which is a lognormal distribution of shape -k.
+    t = t3 ** 2
+    k = -t3 * (2.0466534 - 3.6544371 * t + 1.8396733 * t ** 2 - 0.20360244 * t ** 3) / \
+        (1 - 2.0182173 * t + 1.2420401 * t ** 2 - 0.21741801 * t ** 3)
+    k = np.where(t3 > 0, k, np.nan)
+    alpha = l2 * k * np.exp(-k ** 2 / 2) / (1 - 2 * ndtr(-k / np.sqrt(2)))
+    xi = l1 - alpha / k * (1 - np.exp(k ** 2 / 2))
+    return -k, xi + alpha / k, -alpha / k
+
+
+# Estimators of the distribution parameters, ordered as in `scipy.stats`, from the first two L-moments and the
+# L-skewness of the sample.
+estimators = {'norm': _norm,
+              'gumbel_r': _gumbel_r,
+              'genextreme': _genextreme,
+              'pearson3': _pearson3,
+              'gamma': _gamma,
+              'lognorm': _lognorm,
+              }
+
+
+def fit(arr, dist):
+    """Return the parameters of a distribution estimated from the sample L-moments along the last axis.
+
+    Parameters
+    ----------
+    arr : numpy.ndarray
+      Samples, along the last axis.
+    dist : {'norm', 'gumbel_r', 'genextreme', 'pearson3', 'gamma', 'lognorm'}
+      Name of the distribution in `scipy.stats`. The lognormal distribution is fitted through the generalized
+      normal distribution.
+
+    Returns
+    -------
+    numpy.ndarray
+      The distribution parameters along the last axis.
+    """
+    if dist not in estimators:
+        raise ValueError("No L-moments estimator for distribution `{}`, use one of {}."
+                         .format(dist, sorted(estimators)))
+
+    lm = lmoments(arr, nmom=3)
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        params = estimators[dist](*np.moveaxis(lm, -1, 0))
+    return np.stack(np.broadcast_arrays(*params), axis=-1)
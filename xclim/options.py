@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Global options
+==============
+
+Options controlling how xclim computes its indicators, set either globally or within a context.
+
+Example
+-------
+>>> import xclim
+>>> with xclim.set_options(dtype='float32', missing_policy='pct', missing_options={'tolerance': .05}):
+...     out = xclim.atmos.tx_days_above(tasmax)
+"""
+import importlib.util
+
+import numpy as np
+
+OPTIONS = {'dtype': None,
+           'backend': 'auto',
+           'max_chunk': 1000000,
+           'chunks': {'time': 10},
+           'baseline_dir': None,
+           'baseline_max_size': 2 ** 30,
+           'missing_policy': 'any',
+           'missing_options': {},
+           }
+
+
+def _positive_integer(value):
+    return isinstance(value, int) and value > 0
+
+
+_VALIDATORS = {'dtype': lambda v: v in [None, 'float32', 'float64'],
+               'backend': lambda v: v in ['auto', 'numpy'] or (v == 'numba' and importlib.util.find_spec('numba')),
+               'max_chunk': _positive_integer,
+               'chunks': lambda v: v is None or isinstance(v, dict),
+               'baseline_dir': lambda v: v is None or isinstance(v, str),
+               'baseline_max_size': _positive_integer,
+               'missing_policy': lambda v: v in ['any', 'pct', 'wmo'],
+               'missing_options': lambda v: isinstance(v, dict),
+               }
+
+
+class set_options(object):
+    """Set global options for xclim.
+
+    Can be used as a context manager, in which case the previous values are restored on exit, or as a function call
+    setting the options globally.
+
+    Parameters
+    ----------
+    dtype : {None, 'float32', 'float64'}
+      Floating point precision of the input, intermediate and output arrays of indicators. With 'float32', day
+      counts are stored as 16-bit integers when their range allows it. With None (default), the precision of the input
+      data is kept.
+    backend : {'auto', 'numpy', 'numba'}
+      Implementation of the run length kernels. With 'auto' (default), the numba kernels are used if numba is
+      installed. The 'numba' backend requires numba.
+    max_chunk : int
+      Maximum number of elements per chunk when arrays are rechunked to hold the time dimension in a single chunk.
+      Default: 1000000.
+    chunks : dict
+      Chunks of the files opened by `ensembles.create_ensemble`. Default: {'time': 10}.
+    baseline_dir : str
+      Directory where baseline percentiles are stored. Default: `xclim/baseline` in the user's cache directory
+      (`$XDG_CACHE_HOME`, or `~/.cache`).
+    baseline_max_size : int
+      Maximum total size of the stored baseline percentiles, in bytes. Default: 1 GiB.
+    missing_policy : {'any', 'pct', 'wmo'}
+      Missing value policy of the indicators that do not define their own, see the `checks.missing_<policy>`
+      functions. Default: 'any'.
+    missing_options : dict
+      Options passed to the default missing value policy.
+    """
+
+    def __init__(self, **kwargs):
+        self.old = {}
+        for k, v in kwargs.items():
+            if k not in OPTIONS:
+                raise ValueError("Argument name {!r} is not in the set of valid options {!r}.".format(k, set(OPTIONS)))
+            if k in _VALIDATORS and not _VALIDATORS[k](v):
+                raise ValueError("Value {!r} is not valid for option `{}`.".format(v, k))
+            self.old[k] = OPTIONS[k]
+        OPTIONS.update(kwargs)
+
+    def __enter__(self):
+        return
+
+    def __exit__(self, *args):
+        OPTIONS.update(self.old)
+
+
+def float_dtype(dtype=np.float64):
+    """Return the floating point type of arrays computed from data of type `dtype`."""
+    if OPTIONS['dtype'] is not None:
+        return np.dtype(OPTIONS['dtype'])
+    dtype = np.dtype(dtype)
+    return dtype if dtype.kind == 'f' else np.dtype(np.float64)
+
+
+def count_dtype(n=None):
+    """Return the integer type of day counts, which are at most `n` if given."""
+    if OPTIONS['dtype'] == 'float32':
+        if n is None or n <= np.iinfo(np.int16).max:
+            return np.dtype(np.int16)
+        return np.dtype(np.int32)
+    return np.dtype(int)
+
+
+def period_count_dtype(time, freq):
+    """Return the integer type of day counts over the periods of `freq`, which are at most the number of time
+    steps of the longest period of the `time` coordinate."""
+    if OPTIONS['dtype'] != 'float32' or time.size == 0:
+        return count_dtype()
+    return count_dtype(int(time.resample(time=freq).count().max()))
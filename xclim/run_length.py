@@ -1,44 +1,45 @@
 # -*- coding: utf-8 -*-
 """Run length algorithms module"""
 
-import numpy as np
-import xarray as xr
+import functools
 import logging
 from warnings import warn
 
+import numpy as np
+import xarray as xr
+
+from xclim.options import OPTIONS, count_dtype, float_dtype
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
 logging.captureWarnings(True)
+# Silence the numba compiler, which logs at the DEBUG level set by the indices modules.
+logging.getLogger('numba').setLevel(logging.WARNING)
+
+
+def rle(da, dim='time', max_chunk=None):
+    """Return the length of each run of True values, stored at the position where the run starts.
 
+    Parameters
+    ----------
+    da : N-dimensional Xarray data array (boolean)
+      Input array.
+    dim : Xarray dimension (default = 'time')
+      Dimension along which to calculate consecutive run.
+    max_chunk : int
+      Maximum number of elements per chunk when the array needs to be rechunked along `dim`. Defaults to the
+      `max_chunk` option.
 
-def rle(da, dim='time', max_chunk=1000000):
-    n = len(da[dim])
-    i = xr.DataArray(np.arange(da[dim].size), dims=dim).chunk({'time': 1})
-    ind = xr.broadcast(i, da)[0].chunk(da.chunks)
-    b = ind.where(~da)  # find indexes where false
-    end1 = da.where(b[dim] == b[dim][-1], drop=True) * 0 + n  # add additional end value index (deal with end cases)
-    start1 = da.where(b[dim] == b[dim][0], drop=True) * 0 - 1  # add additional start index (deal with end cases)
-    b = xr.concat([start1, b, end1], dim)
-
-    # Ensure bfill operates on entire (unchunked) time dimension
-    # Determine appropraite chunk size for other dims - do not exceed 'max_chunk' total size per chunk (default 1000000)
-    ndims = len(b.shape)
-    chunk_dim = b[dim].size
-    # divide extra dims into equal size
-    # Note : even if calculated chunksize > dim.size result will have chunk==dim.size
-    if ndims > 1:
-        chunksize_ex_dims = np.round(np.power(max_chunk / chunk_dim, 1 / (ndims - 1)))
-    chunks = {}
-    chunks[dim] = -1
-    for dd in b.dims:
-        if dd != dim:
-            chunks[dd] = chunksize_ex_dims
-    b = b.chunk(chunks)
-
-    # back fill nans with first position after
-    z = b.bfill(dim=dim)
-    # calculate lengths
-    d = z.diff(dim=dim) - 1
-    d = d.where(d >= 0)
-    return d
+    Returns
+    -------
+    N-dimensional xarray data array (int)
+      Length of the run starting at each position, 0 where no run starts.
+    """
+    out = _apply_rl('rle', da, dim, [[dim]], count_dtype(da[dim].size), max_chunk=max_chunk)
+    return out.transpose(*da.dims)
 
 
 def longest_run(da, dim='time'):
@@ -56,11 +57,7 @@ def longest_run(da, dim='time'):
         N-dimensional array (int)
           Length of longest run of True values along dimension
         """
-
-    d = rle(da, dim=dim)
-    rl_long = d.max(dim=dim)
-
-    return rl_long
+    return _apply_rl('longest_run', da, dim, [[]], count_dtype(da[dim].size))
 
 
 def windowed_run_events(da, window, dim='time'):
@@ -80,9 +77,7 @@ def windowed_run_events(da, window, dim='time'):
         out : N-dimensional xarray data array (int)
           Number of distinct runs of a minimum length.
         """
-    d = rle(da, dim=dim)
-    out = (d >= window).sum(dim=dim)
-    return out
+    return _apply_rl('windowed_run_events', da, dim, [[]], count_dtype(da[dim].size), window)
 
 
 def windowed_run_count(da, window, dim='time'):
@@ -103,9 +98,7 @@ def windowed_run_count(da, window, dim='time'):
         out : N-dimensional xarray data array (int)
           Total number of true values part of a consecutive runs of at least `window` long.
         """
-    d = rle(da, dim=dim)
-    out = d.where(d >= window, 0).sum(dim=dim)
-    return out
+    return _apply_rl('windowed_run_count', da, dim, [[]], count_dtype(da[dim].size), window)
 
 
 def first_run(da, window, dim='time'):
@@ -126,17 +119,423 @@ def first_run(da, window, dim='time'):
         out : N-dimensional xarray data array (int)
           Index of first item in first valid run. Returns np.nan if there are no valid run.
         """
-    dims = list(da.dims)
-    if 'time' not in dims:
-        da['time'] = da[dim]
-        da.swap_dims({dim: 'time'})
-    da = da.astype('int')
-    i = xr.DataArray(np.arange(da[dim].size), dims=dim).chunk({'time': 1})
-    ind = xr.broadcast(i, da)[0].chunk(da.chunks)
-    wind_sum = da.rolling(time=window).sum()
-    out = ind.where(wind_sum >= window).min(dim=dim) - (
-        window - 1)  # remove window -1 as rolling result index is last element of the moving window
-    return out
+    return _apply_rl('first_run', da, dim, [[]], float_dtype(), window)
+
+
+def resample_longest_run(da, freq, dim='time'):
+    """Return the length of the longest consecutive run of True values over each period.
+
+    Runs are split at period boundaries, and all periods are processed in a single pass over `dim`.
+
+    Parameters
+    ----------
+    da : N-dimensional Xarray data array (boolean)
+      Input array
+    freq : str
+      Resampling frequency defining the periods.
+    dim : Xarray dimension (default = 'time')
+      Dimension along which to calculate consecutive run
+
+    Returns
+    -------
+    N-dimensional xarray data array (int)
+      Length of longest run of True values over each period.
+    """
+    return _apply_grouped_rl('longest_run', da, freq, dim)
+
+
+def resample_windowed_run_events(da, window, freq, dim='time'):
+    """Return the number of runs of a minimum length over each period.
+
+    Runs are split at period boundaries, and all periods are processed in a single pass over `dim`.
+
+    Parameters
+    ----------
+    da : N-dimensional Xarray data array (boolean)
+      Input array
+    window : int
+      Minimum run length.
+    freq : str
+      Resampling frequency defining the periods.
+    dim : Xarray dimension (default = 'time')
+      Dimension along which to calculate consecutive run
+
+    Returns
+    -------
+    N-dimensional xarray data array (int)
+      Number of distinct runs of a minimum length over each period.
+    """
+    return _apply_grouped_rl('windowed_run_events', da, freq, dim, window)
+
+
+def resample_windowed_run_count(da, window, freq, dim='time'):
+    """Return the number of consecutive true values over each period for runs at least as long as given duration.
+
+    Runs are split at period boundaries, and all periods are processed in a single pass over `dim`.
+
+    Parameters
+    ----------
+    da : N-dimensional Xarray data array (boolean)
+      Input array
+    window : int
+      Minimum run length.
+    freq : str
+      Resampling frequency defining the periods.
+    dim : Xarray dimension (default = 'time')
+      Dimension along which to calculate consecutive run
+
+    Returns
+    -------
+    N-dimensional xarray data array (int)
+      Total number of true values part of a consecutive runs of at least `window` long over each period.
+    """
+    return _apply_grouped_rl('windowed_run_count', da, freq, dim, window)
+
+
+def resample_first_run(da, window, freq, dim='time'):
+    """Return the index of the first item of a run of at least a given length over each period.
+
+    Runs are split at period boundaries, and all periods are processed in a single pass over `dim`.
+
+    Parameters
+    ----------
+    da : N-dimensional Xarray data array (boolean)
+      Input array
+    window : int
+      Minimum run length.
+    freq : str
+      Resampling frequency defining the periods.
+    dim : Xarray dimension (default = 'time')
+      Dimension along which to calculate consecutive run
+
+    Returns
+    -------
+    N-dimensional xarray data array (float)
+      Index, relative to the start of the period, of the first item in the first valid run. NaN if there are no
+      valid run.
+    """
+    return _apply_grouped_rl('first_run', da, freq, dim, window)
+
+
+def period_starts(da, freq, dim='time'):
+    """Return the position of the first element of each period along `dim`.
+
+    Parameters
+    ----------
+    da : xarray.DataArray
+      Input array.
+    freq : str
+      Resampling frequency defining the periods.
+    dim : Xarray dimension (default = 'time')
+      Dimension along which the periods are defined.
+
+    Returns
+    -------
+    xarray.DataArray
+      Index of the first element of each period, indexed by the period labels. NaN for empty periods.
+    """
+    i = xr.DataArray(np.arange(da[dim].size), dims=dim, coords={dim: da[dim]})
+    return i.resample(**{dim: freq}).min(dim=dim)
+
+
+def _apply_grouped_rl(kernel, da, freq, dim, window=1, max_chunk=None):
+    """Apply a grouped run length kernel over each period defined by `freq` along dimension `dim`."""
+    first = period_starts(da, freq, dim)
+    valid = first.notnull().values
+    starts = first.values[valid].astype(np.int64)
+
+    # Counts are at most the length of the longest period.
+    n = np.diff(np.append(starts, da[dim].size)).max(initial=0)
+    dtype = float_dtype() if kernel == 'first_run' else count_dtype(n)
+    out = _apply_rl('grouped_' + kernel, da, dim, [['_period'], ], dtype, starts, window, max_chunk=max_chunk,
+                    output_sizes={'_period': len(starts)})
+
+    out = out.rename({'_period': dim}).assign_coords(**{dim: first[dim][valid]})
+    if not valid.all():
+        # Empty periods are filled with NaNs, as they would be by resampling.
+        out = out.reindex(**{dim: first[dim]})
+    return out.transpose(dim, *[d for d in da.dims if d != dim])
+
+
+def _grouped_runs_nd(arr, starts):
+    """Return the running length of the runs of True values along the last axis, restarting at each period start,
+    and a mask of the positions where the runs end."""
+    x = np.asarray(arr, dtype=bool)
+    brk = np.zeros(x.shape[-1], dtype=bool)
+    brk[starts] = True
+
+    cs = np.cumsum(x, axis=-1)
+    run = cs - np.maximum.accumulate(np.where(x, np.where(brk, cs - 1, 0), cs), axis=-1)
+
+    end = x.copy()
+    end[..., :-1] &= ~x[..., 1:] | brk[1:]
+    return run, end
+
+
+def _grouped_longest_run_nd(arr, starts, window):
+    run, _ = _grouped_runs_nd(arr, starts)
+    return np.maximum.reduceat(run, starts, axis=-1)
+
+
+def _grouped_windowed_run_events_nd(arr, starts, window):
+    run, end = _grouped_runs_nd(arr, starts)
+    return np.add.reduceat(end & (run >= window), starts, axis=-1)
+
+
+def _grouped_windowed_run_count_nd(arr, starts, window):
+    run, end = _grouped_runs_nd(arr, starts)
+    return np.add.reduceat(np.where(end & (run >= window), run, 0), starts, axis=-1)
+
+
+def _grouped_first_run_nd(arr, starts, window):
+    run, _ = _grouped_runs_nd(arr, starts)
+    n = run.shape[-1]
+    pos = np.where(run == window, np.arange(n) - window + 1, n)
+    first = np.minimum.reduceat(pos, starts, axis=-1)
+    return np.where(first < n, first - starts, np.nan)
+
+
+def rechunk_core(da, dim, max_chunk=None):
+    """Rechunk a dask-backed array so that `dim` is held in a single chunk.
+
+    The size of the chunks along the other dimensions is bounded by `max_chunk` elements, which defaults to the
+    `max_chunk` option. Arrays that are not backed by dask, or already hold `dim` in a single chunk, are returned
+    unchanged.
+
+    Parameters
+    ----------
+    da : xarray.DataArray
+      Input array.
+    dim : str
+      Core dimension that must not be split across chunks.
+    max_chunk : int
+      Maximum number of elements per chunk.
+
+    Returns
+    -------
+    xarray.DataArray
+      Rechunked array.
+    """
+    if da.chunks is None or len(da.chunks[da.get_axis_num(dim)]) == 1:
+        return da
+
+    max_chunk = max_chunk or OPTIONS['max_chunk']
+    chunks = {dim: -1}
+    if da.ndim > 1:
+        # Divide the other dimensions into chunks of equal size.
+        size = max(1, int(np.round(np.power(max_chunk / da[dim].size, 1 / (da.ndim - 1)))))
+        chunks.update({d: size for d in da.dims if d != dim})
+    return da.chunk(chunks)
+
+
+def _apply_rl(kernel, da, dim, output_core_dims, dtype, *args, max_chunk=None, keep_attrs=False, output_sizes=None):
+    """Apply a run length kernel operating over the last axis of an array along dimension `dim`.
+
+    Dask arrays are rechunked with :func:`rechunk_core`, and the kernel implementation is selected by
+    :func:`get_kernel`.
+    """
+    da = rechunk_core(da, dim, max_chunk)
+    func = get_kernel(kernel)
+    return xr.apply_ufunc(lambda x: func(np.asarray(x, dtype=bool), *args).astype(dtype, copy=False),
+                          da,
+                          input_core_dims=[[dim], ],
+                          output_core_dims=output_core_dims,
+                          dask='parallelized',
+                          output_dtypes=[dtype, ],
+                          output_sizes=output_sizes,
+                          keep_attrs=keep_attrs)
+
+
+def get_kernel(name):
+    """Return the run length kernel operating over the last axis of a boolean array.
+
+    The compiled numba kernels are used if numba is installed, otherwise the vectorized NumPy implementations are
+    returned. The choice can be forced with the `backend` option.
+
+    Parameters
+    ----------
+    name : {'rle', 'longest_run', 'windowed_run_events', 'windowed_run_count', 'first_run'}
+      Name of the run length algorithm. The same names prefixed by 'grouped_' (except 'rle') return the algorithms
+      restarting at each period start.
+
+    Returns
+    -------
+    func
+      Function taking a boolean array, the period start positions for grouped algorithms, and the window length if
+      the algorithm requires one.
+    """
+    backend = OPTIONS['backend']
+    if backend == 'numba' or (backend == 'auto' and numba is not None):
+        return _numba_kernels()[name]
+    return _numpy_kernels[name]
+
+
+def _rle_nd(arr):
+    """Return the length of each run of True values along the last axis, stored at the run start position.
+
+    The lengths are obtained from a cumulative sum over the reversed array that is reset at each False value, so that
+    every True value holds the number of consecutive True values remaining in its run.
+    """
+    x = np.asarray(arr, dtype=bool)
+    r = x[..., ::-1]
+    cs = np.cumsum(r, axis=-1)
+    remaining = cs - np.maximum.accumulate(np.where(r, 0, cs), axis=-1)
+    starts = x.copy()
+    starts[..., 1:] &= ~x[..., :-1]
+    return np.where(starts, remaining[..., ::-1], 0)
+
+
+def _longest_run_nd(arr):
+    x = np.asarray(arr, dtype=bool)
+    cs = np.cumsum(x, axis=-1)
+    return (cs - np.maximum.accumulate(np.where(x, 0, cs), axis=-1)).max(axis=-1)
+
+
+def _windowed_run_events_nd(arr, window):
+    return (_rle_nd(arr) >= window).sum(axis=-1)
+
+
+def _windowed_run_count_nd(arr, window):
+    d = _rle_nd(arr)
+    return np.where(d >= window, d, 0).sum(axis=-1)
+
+
+def _first_run_nd(arr, window):
+    valid = _rle_nd(arr) >= window
+    return np.where(valid.any(axis=-1), valid.argmax(axis=-1), np.nan)
+
+
+_numpy_kernels = {'rle': _rle_nd,
+                  'longest_run': _longest_run_nd,
+                  'windowed_run_events': _windowed_run_events_nd,
+                  'windowed_run_count': _windowed_run_count_nd,
+                  'first_run': _first_run_nd,
+                  'grouped_longest_run': _grouped_longest_run_nd,
+                  'grouped_windowed_run_events': _grouped_windowed_run_events_nd,
+                  'grouped_windowed_run_count': _grouped_windowed_run_count_nd,
+                  'grouped_first_run': _grouped_first_run_nd}
+
+
+def _rle_gu(x, out):
+    count = 0
+    for i in range(x.shape[0] - 1, -1, -1):
+        count = count + 1 if x[i] else 0
+        out[i] = count
+    for i in range(x.shape[0] - 1, 0, -1):
+        if x[i - 1]:
+            out[i] = 0
+
+
+def _longest_run_gu(x, out):
+    count = 0
+    out[0] = 0
+    for i in range(x.shape[0]):
+        count = count + 1 if x[i] else 0
+        out[0] = max(out[0], count)
+
+
+def _windowed_run_events_gu(x, window, out):
+    count = 0
+    out[0] = 0
+    for i in range(x.shape[0]):
+        count = count + 1 if x[i] else 0
+        if count == window:
+            out[0] += 1
+
+
+def _windowed_run_count_gu(x, window, out):
+    count = 0
+    out[0] = 0
+    for i in range(x.shape[0]):
+        count = count + 1 if x[i] else 0
+        if count == window:
+            out[0] += window
+        elif count > window:
+            out[0] += 1
+
+
+def _first_run_gu(x, window, out):
+    count = 0
+    out[0] = np.nan
+    for i in range(x.shape[0]):
+        count = count + 1 if x[i] else 0
+        if count == window:
+            out[0] = i - window + 1
+            break
+
+
+def _grouped_longest_run_gu(x, starts, window, out):
+    n = x.shape[0]
+    for k in range(starts.shape[0]):
+        end = starts[k + 1] if k + 1 < starts.shape[0] else n
+        count = 0
+        out[k] = 0
+        for i in range(starts[k], end):
+            count = count + 1 if x[i] else 0
+            out[k] = max(out[k], count)
+
+
+def _grouped_windowed_run_events_gu(x, starts, window, out):
+    n = x.shape[0]
+    for k in range(starts.shape[0]):
+        end = starts[k + 1] if k + 1 < starts.shape[0] else n
+        count = 0
+        out[k] = 0
+        for i in range(starts[k], end):
+            count = count + 1 if x[i] else 0
+            if count == window:
+                out[k] += 1
+
+
+def _grouped_windowed_run_count_gu(x, starts, window, out):
+    n = x.shape[0]
+    for k in range(starts.shape[0]):
+        end = starts[k + 1] if k + 1 < starts.shape[0] else n
+        count = 0
+        out[k] = 0
+        for i in range(starts[k], end):
+            count = count + 1 if x[i] else 0
+            if count == window:
+                out[k] += window
+            elif count > window:
+                out[k] += 1
+
+
+def _grouped_first_run_gu(x, starts, window, out):
+    n = x.shape[0]
+    for k in range(starts.shape[0]):
+        end = starts[k + 1] if k + 1 < starts.shape[0] else n
+        count = 0
+        out[k] = np.nan
+        for i in range(starts[k], end):
+            count = count + 1 if x[i] else 0
+            if count == window:
+                out[k] = i - window + 1 - starts[k]
+                break
+
+
+@functools.lru_cache(maxsize=None)
+def _numba_kernels():
+    """Compile the run length algorithms as generalized ufuncs operating over the last axis.
+
+    Compilation is deferred to the first call to avoid slowing down the import of the module.
+    """
+    def gufunc(func, signature, layout):
+        return numba.guvectorize([signature], layout, nopython=True)(func)
+
+    return {'rle': gufunc(_rle_gu, 'void(b1[:], i8[:])', '(n)->(n)'),
+            'longest_run': gufunc(_longest_run_gu, 'void(b1[:], i8[:])', '(n)->()'),
+            'windowed_run_events': gufunc(_windowed_run_events_gu, 'void(b1[:], i8, i8[:])', '(n),()->()'),
+            'windowed_run_count': gufunc(_windowed_run_count_gu, 'void(b1[:], i8, i8[:])', '(n),()->()'),
+            'first_run': gufunc(_first_run_gu, 'void(b1[:], i8, f8[:])', '(n),()->()'),
+            'grouped_longest_run': gufunc(_grouped_longest_run_gu, 'void(b1[:], i8[:], i8, i8[:])',
+                                          '(n),(m),()->(m)'),
+            'grouped_windowed_run_events': gufunc(_grouped_windowed_run_events_gu, 'void(b1[:], i8[:], i8, i8[:])',
+                                                  '(n),(m),()->(m)'),
+            'grouped_windowed_run_count': gufunc(_grouped_windowed_run_count_gu, 'void(b1[:], i8[:], i8, i8[:])',
+                                                 '(n),(m),()->(m)'),
+            'grouped_first_run': gufunc(_grouped_first_run_gu, 'void(b1[:], i8[:], i8, f8[:])',
+                                        '(n),(m),()->(m)')}
 
 
 def rle_1d(arr):
@@ -275,14 +674,7 @@ def windowed_run_count_ufunc(x, window):
     out : func
       A function operating along the time dimension of a dask-array.
     """
-    return xr.apply_ufunc(windowed_run_count_1d,
-                          x,
-                          input_core_dims=[['time'], ],
-                          vectorize=True,
-                          dask='parallelized',
-                          output_dtypes=[np.int, ],
-                          keep_attrs=True,
-                          kwargs={'window': window})
+    return _apply_rl('windowed_run_count', x, 'time', [[]], count_dtype(x.time.size), window, keep_attrs=True)
 
 
 def windowed_run_events_ufunc(x, window):
@@ -300,14 +692,7 @@ def windowed_run_events_ufunc(x, window):
     out : func
       A function operating along the time dimension of a dask-array.
     """
-    return xr.apply_ufunc(windowed_run_events_1d,
-                          x,
-                          input_core_dims=[['time'], ],
-                          vectorize=True,
-                          dask='parallelized',
-                          output_dtypes=[np.int, ],
-                          keep_attrs=True,
-                          kwargs={'window': window})
+    return _apply_rl('windowed_run_events', x, 'time', [[]], count_dtype(x.time.size), window, keep_attrs=True)
 
 
 def longest_run_ufunc(x):
@@ -324,26 +709,27 @@ def longest_run_ufunc(x):
     out : func
       A function operating along the time dimension of a dask-array.
     """
-    return xr.apply_ufunc(longest_run_1d,
-                          x,
-                          input_core_dims=[['time'], ],
-                          vectorize=True,
-                          dask='parallelized',
-                          output_dtypes=[np.int, ],
-                          keep_attrs=True,
-                          )
+    return _apply_rl('longest_run', x, 'time', [[]], count_dtype(x.time.size), keep_attrs=True)
 
 
 def first_run_ufunc(x, window, index=None):
-    ind = xr.apply_ufunc(first_run_1d,
-                         x,
-                         input_core_dims=[['time'], ],
-                         vectorize=True,
-                         dask='parallelized',
-                         output_dtypes=[np.float, ],
-                         keep_attrs=True,
-                         kwargs={'window': window}
-                         )
+    """Dask-parallel version of first_run_1d, ie the index of the first item of a run of at least a given length.
+
+    Parameters
+    ----------
+    x : bool array
+      Input array
+    window : int
+      Minimum duration of consecutive run to accumulate values.
+    index : str
+      Attribute of the time index whose value is returned instead of the position, e.g. 'dayofyear'.
+
+    Returns
+    -------
+    out : func
+      A function operating along the time dimension of a dask-array.
+    """
+    ind = _apply_rl('first_run', x, 'time', [[]], float_dtype(), window, keep_attrs=True)
 
     if index is not None and ~np.isnan(ind):
         val = getattr(x.indexes['time'], index)
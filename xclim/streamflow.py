@@ -30,7 +30,8 @@ class Stats(Streamflow):
         indexer = kwds['indexer']
         freq = kwds['freq'] or generic.default_freq(**indexer)
 
-        miss = (checks.missing_any(generic.select_time(da, **indexer), freq) for da in args)
+        policy, opts = self._missing_policy()
+        miss = (policy(generic.select_time(da, **indexer), freq, **opts) for da in args)
         return reduce(np.logical_or, miss)
 
 
@@ -44,6 +45,7 @@ freq_analysis = Stats(identifier='q{window}{mode}{indexer}',
                       long_name='N-year return period {mode} {indexer} {window}-day flow',
                       description="Streamflow frequency analysis for the {mode} {indexer} {window}-day flow "
                                   "estimated using the {dist} distribution.",
+                      full_time=True,
                       compute=generic.frequency_analysis)
 
 
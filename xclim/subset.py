@@ -1,5 +1,10 @@
+from collections import OrderedDict
+
 import numpy as np
+import xarray as xr
+from dask.base import tokenize
 from pyproj import Geod
+from scipy.spatial import cKDTree
 
 
 def subset_bbox(da, lon_bnds=None, lat_bnds=None, start_yr=None, end_yr=None):
@@ -107,34 +112,54 @@ def subset_gridpoint(da, lon, lat, start_yr=None, end_yr=None):
     >>> dsSub = utils.subset_gridpoint(ds, lon=-75,lat=45,start_yr=1990,end_yr=1999)
     """
 
-    g = Geod(ellps='WGS84')  # WGS84 ellipsoid - decent globaly
-    # adjust negative/positive longitudes if necessary
-    if np.all(da.lon > 0) and lon < 0:
-        lon += 360
-    if np.all(da.lon < 0) and lon > 0:
-        lon -= 360
+    iy, ix = _nearest_gridpoints(da, lon, lat)
+    ydim, xdim = _grid_dims(da)
+    out = da.isel(**{ydim: iy[0], xdim: ix[0]})
+    return _subset_years(out, da, start_yr, end_yr)
 
-    if len(da.lon.shape) == 1 & len(da.lat.shape) == 1:
-        # create a 2d grid of lon, lat values
-        lon1, lat1 = np.meshgrid(np.asarray(da.lon.values), np.asarray(da.lat.values))
-
-    else:
-        lon1 = da.lon.values
-        lat1 = da.lat.values
-    shp_orig = lon1.shape
-    lon1 = np.reshape(lon1, lon1.size)
-    lat1 = np.reshape(lat1, lat1.size)
-    # calculate geodesic distance between grid points and point of interest
-    az12, az21, dist = g.inv(lon1, lat1, np.broadcast_to(lon, lon1.shape), np.broadcast_to(lat, lat1.shape))
-    dist = dist.reshape(shp_orig)
-
-    iy, ix = np.unravel_index(np.argmin(dist, axis=None), dist.shape)
-    xydims = [x for x in da.dims if 'time' not in x]
-
-    args = dict()
-    args[xydims[0]] = iy
-    args[xydims[1]] = ix
-    out = da.isel(**args)
+
+def subset_gridpoints(da, lon, lat, start_yr=None, end_yr=None):
+    """Extract the nearest gridpoints from datarray for multiple lat lon coordinates.
+    Time series can optionally be subsetted by year(s)
+
+    Return a data array (or dataset) of the grid points falling nearest each input longitude and latitude
+    coordinates, stacked along a new `site` dimension. All points are extracted with a single indexing operation,
+    which is much faster than multiple calls to `subset_gridpoint`.
+
+    Parameters
+    ----------
+    da : xarray.DataArray or xarray.DataSet
+      Input data.
+    lon : sequence of floats
+      Longitude coordinates.
+    lat : sequence of floats
+      Latitude coordinates.
+    start_yr : int
+      First year of the subset. Defaults to first year of input.
+    end_yr : int
+      Last year of the subset. Defaults to last year of input.
+
+    Returns
+    -------
+    xarray.DataArray or xarray.DataSet
+      Subsetted data array or dataset, with the points along the `site` dimension.
+
+    Examples
+    --------
+    >>> from xclim import subset
+    >>> ds = xr.open_dataset('pr.day.nc')
+    Subset multiple stations and years
+    >>> prSub = subset.subset_gridpoints(ds.pr, lon=[-75, -70], lat=[45, 46], start_yr=1990, end_yr=1999)
+    """
+    lon, lat = np.broadcast_arrays(np.atleast_1d(lon), np.atleast_1d(lat))
+    iy, ix = _nearest_gridpoints(da, lon, lat)
+    ydim, xdim = _grid_dims(da)
+    out = da.isel(**{ydim: xr.DataArray(iy, dims='site'), xdim: xr.DataArray(ix, dims='site')})
+    return _subset_years(out, da, start_yr, end_yr)
+
+
+def _subset_years(out, da, start_yr=None, end_yr=None):
+    """Subset the years of the output of a grid point selection from `da`."""
     if start_yr or end_yr:
         if not start_yr:
             start_yr = da.time.dt.year.min()
@@ -153,3 +178,66 @@ def subset_gridpoint(da, lon, lat, start_yr=None, end_yr=None):
         out = out.where(time_cond, drop=True)
 
     return out
+
+
+def _grid_dims(da):
+    """Return the names of the y and x dimensions of the grid."""
+    if da.lon.ndim == 1 and da.lat.ndim == 1:
+        return da.lat.dims[0], da.lon.dims[0]
+    return da.lon.dims
+
+
+# Spatial indices of the most recently used grids.
+_grid_indices = OrderedDict()
+_GRID_INDICES_SIZE = 8
+
+# Number of nearest grid points, on the unit sphere, among which the nearest on the WGS84 ellipsoid is found.
+_CANDIDATES = 8
+
+
+def _unit_sphere(lon, lat):
+    """Return the cartesian coordinates of points on the unit sphere."""
+    lon, lat = np.deg2rad(lon), np.deg2rad(lat)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def _grid_index(lon, lat):
+    """Return a KD-tree of the grid points on the unit sphere, with their flattened longitudes and latitudes.
+
+    The trees are cached, keyed on the longitude and latitude arrays, so that they are built once per grid.
+    """
+    key = tokenize(lon, lat)
+    if key in _grid_indices:
+        _grid_indices.move_to_end(key)
+        return _grid_indices[key]
+
+    if lon.ndim == 1 and lat.ndim == 1:
+        # create a 2d grid of lon, lat values
+        lon, lat = np.meshgrid(lon, lat)
+    index = (cKDTree(_unit_sphere(lon.ravel(), lat.ravel())), lon.shape, lon.ravel(), lat.ravel())
+
+    _grid_indices[key] = index
+    if len(_grid_indices) > _GRID_INDICES_SIZE:
+        _grid_indices.popitem(last=False)
+    return index
+
+
+def _nearest_gridpoints(da, lon, lat):
+    """Return the grid indices of the points nearest to the given coordinates.
+
+    The nearest grid points on the unit sphere are found from the cached spatial index of the grid, then the
+    nearest on the WGS84 ellipsoid is chosen among them from their geodesic distances. Longitudes can be given in
+    either the [-180, 180] or [0, 360] conventions, whatever that of the grid.
+    """
+    tree, shape, lon1, lat1 = _grid_index(np.asarray(da.lon.values), np.asarray(da.lat.values))
+    lon = np.atleast_1d(np.asarray(lon, dtype=float))
+    lat = np.atleast_1d(np.asarray(lat, dtype=float))
+
+    k = min(_CANDIDATES, lon1.size)
+    _, cand = tree.query(_unit_sphere(lon, lat), k=k)
+    cand = cand.reshape(lon.size, k)
+
+    g = Geod(ellps='WGS84')  # WGS84 ellipsoid - decent globaly
+    az12, az21, dist = g.inv(lon1[cand].ravel(), lat1[cand].ravel(), np.repeat(lon, k), np.repeat(lat, k))
+    best = cand[np.arange(lon.size), np.argmin(dist.reshape(lon.size, k), axis=1)]
+    return np.unravel_index(best, shape)
@@ -6,9 +6,11 @@ xclim xarray.DataArray utilities module
 
 import abc
 import calendar
+import contextlib
 import datetime as dt
 import functools
 import re
+import threading
 import warnings
 from collections import defaultdict
 from inspect import signature
@@ -18,7 +20,7 @@ import pint
 import xarray as xr
 from boltons.funcutils import wraps
 
-from . import checks
+from . import checks, options, run_length
 
 units = pint.UnitRegistry(autoconvert_offset_to_baseunit=True)
 units.define(pint.unit.UnitDefinition('percent', '%', (),
@@ -65,12 +67,16 @@ units.enable_contexts(hydro)
 # @end
 binary_ops = {'>': 'gt', '<': 'lt', '>=': 'ge', '<=': 'le'}
 
+# Intermediate results shared by the indicators computed together by `compute_many`.
+_shared = threading.local()
+
 # Maximum day of year in each calendar.
 calendars = {'standard': 366,
              'gregorian': 366,
              'proleptic_gregorian': 366,
              'julian': 366,
              'no_leap': 365,
+             'noleap': 365,
              '365_day': 365,
              'all_leap': 366,
              '366_day': 366,
@@ -92,11 +98,6 @@ def units2pint(value):
       Units of the data array.
 
     """
-
-    def _transform(s):
-        """Convert a CF-unit string to a pint expression."""
-        return re.subn(r'\^?(-?\d)', r'**\g<1>', s)[0]
-
     if isinstance(value, str):
         unit = value
     elif isinstance(value, xr.DataArray):
@@ -106,12 +107,24 @@ def units2pint(value):
     else:
         raise NotImplementedError("Value of type {} not supported.".format(type(value)))
 
+    return _parse_units(unit)
+
+
+@functools.lru_cache(maxsize=512)
+def _parse_units(unit):
+    """Return the pint Unit of a pint or CF-Convention unit string."""
+
+    def _transform(s):
+        """Convert a CF-unit string to a pint expression."""
+        return re.subn(r'\^?(-?\d)', r'**\g<1>', s)[0]
+
     try:  # Pint compatible
         return units.parse_expression(unit).units
     except (pint.UndefinedUnitError, pint.DimensionalityError):  # Convert from CF-units to pint-compatible
         return units.parse_expression(_transform(unit)).units
 
 
+@functools.lru_cache(maxsize=512)
 def pint2cfunits(value):
     """Return a CF-Convention unit string from a `pint` unit.
 
@@ -190,10 +203,8 @@ def convert_units_to(source, target, context=None):
         raise NotImplementedError
 
     if isinstance(source, str):
-        q = units.parse_expression(source)
-
         # Return magnitude of converted quantity. This is going to fail if units are not compatible.
-        return q.to(tu).m
+        return _convert_expression(source, tu)
 
     if isinstance(source, units.Quantity):
         return source.to(tu).m
@@ -204,11 +215,7 @@ def convert_units_to(source, target, context=None):
         if fu == tu:
             return source
 
-        tu_u = pint2cfunits(tu)
-        with units.context(context or 'none'):
-            out = units.convert(source, fu, tu)
-            out.attrs['units'] = tu_u
-            return out
+        return _memoize(('convert_units_to', tu, context), _convert_dataarray, source, fu, tu, context)
 
     # TODO remove backwards compatibility of int/float thresholds after v1.0 release
     if isinstance(source, (float, int)):
@@ -222,6 +229,59 @@ def convert_units_to(source, target, context=None):
     raise NotImplementedError("source of type {} is not supported.".format(type(source)))
 
 
+@functools.lru_cache(maxsize=512)
+def _convert_expression(source, tu):
+    """Return the magnitude of a quantity expression converted to units `tu`."""
+    return units.parse_expression(source).to(tu).m
+
+
+@functools.lru_cache(maxsize=512)
+def conversion_factors(fu, tu, context=None):
+    """Return the scale and offset converting values from units `fu` to units `tu`.
+
+    Parameters
+    ----------
+    fu : pint.Unit
+      Source units.
+    tu : pint.Unit
+      Target units.
+    context : str
+      The `pint` unit context in which the conversion is done.
+
+    Returns
+    -------
+    (float, float)
+      Scale and offset such that values in `tu` are equal to `scale * x + offset`, where `x` are values in `fu`.
+    """
+    # Unit conversions are affine, so that two points define them. The second point is far from the first one to
+    # limit the round-off error on the scale.
+    with units.context(context or 'none'):
+        y0, y1 = units.convert(np.array([0., 1e6]), fu, tu)
+    return (y1 - y0) / 1e6, y0
+
+
+def _convert_dataarray(source, fu, tu, context):
+    """Convert the values of a DataArray from units `fu` to units `tu`.
+
+    The conversion is applied lazily on dask arrays and preserves floating point dtypes and attributes.
+    """
+    scale, offset = conversion_factors(fu, tu, context)
+    dtype = source.dtype if np.issubdtype(source.dtype, np.floating) else np.dtype(float)
+
+    out = xr.apply_ufunc(_affine, source,
+                         dask='parallelized',
+                         output_dtypes=[dtype],
+                         keep_attrs=True,
+                         kwargs={'scale': dtype.type(scale), 'offset': dtype.type(offset)})
+    out.attrs['units'] = pint2cfunits(tu)
+    return out
+
+
+def _affine(x, scale, offset):
+    """Return `x * scale + offset`."""
+    return x * scale + offset
+
+
 def _check_units(val, dim):
     if dim is None or val is None:
         return
@@ -230,6 +290,11 @@ def _check_units(val, dim):
     if isinstance(val, (int, float)):
         return
 
+    # Baseline specifications are resolved into percentiles with the units of the input data.
+    from xclim.baseline import Baseline
+    if isinstance(val, Baseline):
+        return
+
     expected = units.get_dimensionality(dim.replace('dimensionless', ''))
     val_dim = units2pint(val).dimensionality
     if val_dim == expected:
@@ -316,8 +381,8 @@ def threshold_count(da, op, thresh, freq):
         raise ValueError("Operation `{}` not recognized.".format(op))
 
     func = getattr(da, '_binary_op')(get_op(op))
-    c = func(da, thresh) * 1
-    return c.resample(time=freq).sum(dim='time')
+    c = func(da, thresh)
+    return c.resample(time=freq).sum(dim='time').astype(options.period_count_dtype(da.time, freq), copy=False)
 
 
 def percentile_doy(arr, window=5, per=.1):
@@ -331,32 +396,187 @@ def percentile_doy(arr, window=5, per=.1):
       Input data.
     window : int
       Number of days around each day of the year to include in the calculation.
-    per : float
-      Percentile between [0,1]
+    per : float or sequence of floats
+      Percentile between [0,1]. If a sequence is given, the percentiles are stored along a `percentiles` dimension.
 
     Returns
     -------
     xarray.DataArray
       The percentiles indexed by the day of the year.
-    """
-    # TODO: Support percentile array, store percentile in coordinates.
-    #  This is supported by DataArray.quantile, but not by groupby.reduce.
-    rr = arr.rolling(min_periods=1, center=True, time=window).construct('window')
-
-    # Create empty percentile array
-    g = rr.groupby('time.dayofyear')
 
-    p = g.reduce(np.nanpercentile, dim=('time', 'window'), q=per * 100)
+    Notes
+    -----
+    The samples of each day of the year are gathered through a precomputed table of time indices, and all
+    percentiles are computed from a single sort of those samples. The gathered samples hold `window` times the
+    values of the days they cover, so the days of the year are processed in slices holding at most `max_chunk`
+    samples (see `xclim.set_options`), instead of copying the moving window over the whole array at once.
+    """
+    q = np.atleast_1d(per)
+    doy, index = _doy_window_index(arr.time.dt.dayofyear.values, window)
+    max_chunk = options.OPTIONS['max_chunk']
+    arr = run_length.rechunk_core(arr, 'time', max_chunk)
+
+    p = xr.apply_ufunc(_percentile_doy_nd,
+                       arr,
+                       input_core_dims=[['time'], ],
+                       output_core_dims=[['dayofyear', 'percentiles'], ],
+                       dask='parallelized',
+                       output_dtypes=[arr.dtype if arr.dtype.kind == 'f' else np.float64, ],
+                       output_sizes={'dayofyear': len(doy), 'percentiles': len(q)},
+                       kwargs={'index': index, 'q': q, 'max_chunk': max_chunk})
+    p = p.assign_coords(dayofyear=doy, percentiles=q)
+
+    p = p.transpose('dayofyear', 'percentiles', *[d for d in p.dims if d not in ('dayofyear', 'percentiles')])
+    if np.isscalar(per):
+        p = p.squeeze('percentiles', drop=True)
 
     # The percentile for the 366th day has a sample size of 1/4 of the other days.
     # To have the same sample size, we interpolate the percentile from 1-365 doy range to 1-366
     if p.dayofyear.max() == 366:
-        p = adjust_doy_calendar(p.loc[p.dayofyear < 366], arr)
+        p = adjust_doy_calendar(p.loc[dict(dayofyear=p.dayofyear < 366)], arr)
 
     p.attrs.update(arr.attrs.copy())
     return p
 
 
+def _doy_window_index(doy, window):
+    """Return the unique days of the year and the indices of the samples in the moving window around each of them.
+
+    Parameters
+    ----------
+    doy : np.array
+      Day of the year of each time step.
+    window : int
+      Number of days around each day of the year to include in the sample.
+
+    Returns
+    -------
+    np.array, np.array
+      The sorted days of the year, and a (doy, samples) array of indices along time, padded with -1.
+    """
+    n = len(doy)
+    udoy, inv = np.unique(doy, return_inverse=True)
+    counts = np.bincount(inv)
+
+    # Position of each time step within its day of year group.
+    order = np.argsort(inv, kind='stable')
+    rank = np.arange(n) - np.repeat(np.cumsum(counts) - counts, counts)
+    steps = np.full((len(udoy), counts.max()), -1)
+    steps[inv[order], rank] = order
+
+    # Centered moving window, with the same alignment as `rolling(center=True)`.
+    idx = steps[:, :, np.newaxis] + (np.arange(window) - window // 2)
+    idx[(steps[:, :, np.newaxis] < 0) | (idx < 0) | (idx >= n)] = -1
+    return udoy, idx.reshape(len(udoy), -1)
+
+
+def _percentile_doy_nd(arr, index, q, max_chunk):
+    """Return the percentiles of the samples gathered by `index` along the last axis, ignoring NaNs.
+
+    The days of the year are processed in slices so that the gathered samples hold at most `max_chunk` values.
+    """
+    # Append a NaN so that the padding indices (-1) point to a missing value.
+    pad = np.full(arr.shape[:-1] + (1,), np.nan, dtype=np.result_type(arr.dtype, np.float32))
+    x = np.concatenate([arr, pad], axis=-1)
+
+    out = np.empty(x.shape[:-1] + (index.shape[0], len(q)), dtype=x.dtype)
+    step = max(1, max_chunk // max(1, x[..., 0].size * index.shape[1]))
+    for i in range(0, index.shape[0], step):
+        out[..., i:i + step, :] = nanquantile(x[..., index[i:i + step]], q)
+    return out
+
+
+def nanquantile(arr, q):
+    """Return the quantiles of an array along its last axis, ignoring NaNs.
+
+    All quantiles are computed from a single sort using linear interpolation, as in `numpy.nanpercentile`, up to
+    round-off errors.
+
+    Parameters
+    ----------
+    arr : np.array
+      Input values.
+    q : sequence of floats
+      Quantiles between [0, 1].
+
+    Returns
+    -------
+    np.array
+      The quantiles, stored along a new last axis, in double precision as in numpy. NaN where all values are missing.
+    """
+    a = np.sort(arr, axis=-1)
+    n = np.count_nonzero(~np.isnan(a), axis=-1)[..., np.newaxis]
+
+    pos = (n - 1) * np.asarray(q, dtype=float)
+    lo = np.clip(np.floor(pos).astype(int), 0, None)
+    hi = np.clip(np.minimum(lo + 1, n - 1), 0, None)
+    vlo = np.take_along_axis(a, lo, axis=-1)
+    vhi = np.take_along_axis(a, hi, axis=-1)
+
+    out = vlo + (vhi - vlo) * (pos - lo)
+    return np.where(n > 0, out, np.nan)
+
+
+def compare_doy(da, op, thresh):
+    """Compare daily values to a threshold indexed by the day of the year.
+
+    The threshold is taken for the day of the year of each time step within each chunk, so that it is never
+    broadcast to the full shape of the input.
+
+    Parameters
+    ----------
+    da : xarray.DataArray
+      Input data with a `time` coordinate.
+    op : {>, <, >=, <=, gt, lt, ge, le }
+      Logical operator, e.g. da > thresh.
+    thresh : xarray.DataArray
+      Threshold values with `dayofyear` coordinates. If its calendar differs from the input's, it is interpolated.
+
+    Returns
+    -------
+    xarray.DataArray
+      Boolean array with the shape and coordinates of the input.
+    """
+    if op in binary_ops:
+        op = binary_ops[op]
+    elif op in binary_ops.values():
+        pass
+    else:
+        raise ValueError("Operation `{}` not recognized.".format(op))
+
+    thresh = adjust_doy_calendar(thresh, da)
+    thresh = thresh.astype(options.float_dtype(thresh.dtype), copy=False)
+
+    # Position of the day of year of each time step along the threshold's dayofyear dimension.
+    pos = thresh.indexes['dayofyear'].get_indexer(da.time.dt.dayofyear.values)
+    if (pos < 0).any():
+        raise ValueError("Threshold is not defined for all days of the year of the input.")
+    idx = xr.DataArray(pos, dims='time', coords={'time': da.time})
+
+    if thresh.chunks is not None:
+        thresh = thresh.chunk({'dayofyear': -1})
+
+    return xr.apply_ufunc(_compare_doy,
+                          da, idx, thresh,
+                          input_core_dims=[[], [], ['dayofyear']],
+                          dask='parallelized',
+                          output_dtypes=[bool],
+                          kwargs={'op': _np_ops[op]})
+
+
+_np_ops = {'gt': np.greater, 'lt': np.less, 'ge': np.greater_equal, 'le': np.less_equal}
+
+
+def _compare_doy(x, idx, thresh, op):
+    """Compare `x` to the values of `thresh` taken along its last axis at positions `idx`."""
+    # Leading broadcast dimensions missing from one of the arrays are not inserted by `apply_ufunc`.
+    idx = idx[..., np.newaxis]
+    ndim = max(idx.ndim, thresh.ndim)
+    idx = idx.reshape((1,) * (ndim - idx.ndim) + idx.shape)
+    thresh = thresh.reshape((1,) * (ndim - thresh.ndim) + thresh.shape)
+    return op(x, np.take_along_axis(thresh, idx, axis=-1)[..., 0])
+
+
 def infer_doy_max(arr):
     """Return the largest doy allowed by calendar.
 
@@ -408,7 +628,7 @@ def _interpolate_doy_calendar(source, doy_max):
         raise AttributeError("source should have dayofyear coordinates.")
 
     # Interpolation of source to target dayofyear range
-    doy_max_source = source.dayofyear.max()
+    doy_max_source = int(source.dayofyear.max())
 
     # Interpolate to fill na values
     tmp = source.interpolate_na(dim='dayofyear')
@@ -467,8 +687,7 @@ def get_daily_events(da, da_value, operator):
     xarray.DataArray
 
     """
-    events = operator(da, da_value) * 1
-    events = events.where(~np.isnan(da))
+    events = operator(da, da_value).where(~np.isnan(da))
     events = events.rename('events')
     return events
 
@@ -565,6 +784,40 @@ def walk_map(d, func):
     return out
 
 
+@contextlib.contextmanager
+def _sharing():
+    """Share unit conversions, validations and missing value fingerprints between the indicators computed in the
+    block."""
+    prev = getattr(_shared, 'cache', None)
+    _shared.cache = {} if prev is None else prev
+    try:
+        with checks.missing_cache.sharing():
+            yield _shared.cache
+    finally:
+        _shared.cache = prev
+
+
+def _memoize(key, func, *args, **kwds):
+    """Call `func`, reusing the result of a previous identical call when results are shared.
+
+    Array arguments are identified by their `id`, other arguments by their `repr`. A reference to the arguments is
+    kept along with the result so that their `id` cannot be reused by another object while the results are shared.
+    """
+    cache = getattr(_shared, 'cache', None)
+    if cache is None:
+        return func(*args, **kwds)
+
+    def ident(v):
+        return id(v) if isinstance(v, (xr.DataArray, xr.Dataset, np.ndarray)) else repr(v)
+
+    # Methods are identified by their function, so that indicators of the same class share results.
+    key = (key, getattr(func, '__func__', func)) + tuple(map(ident, args))
+    key += tuple((k, ident(v)) for (k, v) in sorted(kwds.items()))
+    if key not in cache:
+        cache[key] = (func(*args, **kwds), args, kwds)
+    return cache[key][0]
+
+
 # This class needs to be subclassed by individual indicator classes defining metadata information, compute and
 # missing functions. It can handle indicators with any number of forcing fields.
 class Indicator(object):
@@ -585,6 +838,14 @@ class Indicator(object):
     # The `pint` unit context. Use 'hydro' to allow conversion from kg m-2 s-1 to mm/day.
     context = 'none'
 
+    # Missing value policy, the name of a `checks.missing_<policy>` function, e.g. 'any', 'pct' or 'wmo', and the
+    # options passed to it. Defaults to the `missing_policy` and `missing_options` options.
+    missing_policy = None
+    missing_options = None
+
+    # Whether the computation needs the whole time series in a single chunk, e.g. for run length statistics.
+    full_time = False
+
     # Additional information that can be used by third party libraries or to describe the file content.
     title = ''  # A succinct description of what is in the dataset. Default parsed from compute.__doc__
     abstract = ''  # Parsed
@@ -675,11 +936,11 @@ class Indicator(object):
 
         # Pre-computation validation checks
         for da in das:
-            self.validate(da)
+            _memoize('validate', self.validate, da)
         self.cfprobe(*das)
 
-        # Compute the indicator values, ignoring NaNs.
-        out = self.compute(*das, **ba.kwargs)
+        # Compute the indicator values, ignoring NaNs, at the precision set in the options.
+        out = self.compute(*(_memoize('cast', _cast, da) for da in das), **ba.kwargs)
 
         # Convert to output units
         out = convert_units_to(out, self.units, self.context)
@@ -690,9 +951,11 @@ class Indicator(object):
         # Bind call arguments to the `missing` function, whose signature might be different from `compute`.
         mba = signature(self.missing).bind(*das, **ba.arguments)
 
-        # Mask results that do not meet criteria defined by the `missing` method.
-        mask = self.missing(*mba.args, **mba.kwargs)
-        ma_out = out.where(~mask)
+        # Mask results that do not meet criteria defined by the `missing` method. Cached masks are kept as long as
+        # the inputs are alive, even if `missing` computes them from derived arrays.
+        with checks.missing_cache.owner(*das):
+            mask = self.missing(*mba.args, **mba.kwargs)
+        ma_out = _cast(out.where(~mask))
 
         return ma_out.rename(formatted_id)
 
@@ -760,15 +1023,23 @@ class Indicator(object):
 
         return out
 
-    @staticmethod
-    def missing(*args, **kwds):
+    def missing(self, *args, **kwds):
         """Return whether an output is considered missing or not."""
         from functools import reduce
 
         freq = kwds.get('freq')
-        miss = (checks.missing_any(da, freq) for da in args)
+        policy, opts = self._missing_policy()
+        miss = (policy(da, freq, **opts) for da in args)
         return reduce(np.logical_or, miss)
 
+    def _missing_policy(self):
+        """Return the missing value policy function and its options."""
+        if self.missing_policy is None:
+            name, opts = options.OPTIONS['missing_policy'], options.OPTIONS['missing_options']
+        else:
+            name, opts = self.missing_policy, self.missing_options or {}
+        return getattr(checks, 'missing_{}'.format(name)), opts
+
     def validate(self, da):
         """Validate input data requirements.
         Raise error if conditions are not met."""
@@ -785,6 +1056,131 @@ class Indicator2D(Indicator):
     _nvar = 2
 
 
+def _cast(da):
+    """Cast floating point arrays to the precision set in the options, keeping their attributes."""
+    if da.dtype.kind != 'f' or options.OPTIONS['dtype'] is None:
+        return da
+    out = da.astype(options.float_dtype(), copy=False)
+    # Older versions of xarray drop the attributes.
+    out.attrs.update(da.attrs)
+    return out
+
+
+def plan_chunks(obj, indicators=(), memory=None, dim='time'):
+    r"""Return the chunks of the input of a set of indicators.
+
+    Indicators relying on run lengths (see `Indicator.full_time`) need the whole time series in a single chunk,
+    while resampling reductions work on any chunking along time. If one of the indicators needs the whole time
+    series, the time dimension is held in a single chunk and the other dimensions are divided into chunks of equal
+    size. Otherwise, chunks cover as much of the other dimensions as possible and at least one year of daily data,
+    so that they are not needlessly small.
+
+    Parameters
+    ----------
+    obj : Union[xarray.DataArray, xarray.Dataset]
+      Input data.
+    indicators : sequence
+      Indicator instances, or (indicator, dict) tuples, to be computed on the input.
+    memory : int
+      Memory budget of a single chunk, in bytes. Defaults to `max_chunk` elements, see `xclim.set_options`.
+    dim : str
+      Time dimension.
+
+    Returns
+    -------
+    dict
+      Chunk size along each dimension, -1 meaning that the dimension is held in a single chunk.
+
+    Example
+    -------
+    >>> from xclim import atmos, plan_chunks
+    >>> chunks = plan_chunks(ds, [atmos.tx_max, atmos.consecutive_frost_days], memory=2 ** 27)
+    >>> ds = ds.chunk(chunks)
+    """
+    das = list(obj.data_vars.values()) if isinstance(obj, xr.Dataset) else [obj]
+    itemsize = max([options.float_dtype(da.dtype).itemsize for da in das] + [1])
+    size = max(1, (memory or options.OPTIONS['max_chunk'] * itemsize) // itemsize)
+
+    sizes = dict(obj.sizes)
+    nt = sizes.pop(dim)
+    full_time = any((ind[0] if isinstance(ind, tuple) else ind).full_time for ind in indicators)
+
+    if full_time:
+        nd = nt
+    else:
+        # At least one year of daily values, more if the other dimensions fit in the budget.
+        nd = min(nt, max(366, size // max(1, int(np.prod(list(sizes.values()), dtype=float)))))
+
+    chunks = {dim: -1 if nd == nt else nd}
+
+    # Divide the other dimensions into chunks of equal size, starting with the smallest dimensions so that those
+    # held in a single chunk leave more room to the others.
+    m = size / nd
+    for i, (d, s) in enumerate(sorted(sizes.items(), key=lambda item: item[1])):
+        n = max(1, int(np.round(np.power(m, 1 / (len(sizes) - i)))))
+        chunks[d] = -1 if n >= s else n
+        m /= min(n, s)
+    return chunks
+
+
+def compute_many(ds, indicators, memory=None, **kwds):
+    r"""Compute multiple indicators on the variables of a dataset.
+
+    The indicators are computed together so that their input validation and unit conversions are computed once per
+    input variable, and missing value masks once per input variable and frequency (see `checks.missing_cache`).
+    With dask arrays, the outputs form a single graph in which identical tasks are merged, so that each input chunk
+    is read once when the returned dataset is computed.
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+      Input dataset, whose variables are named after the input parameters of the indicators, e.g. `tasmin`,
+      `tasmax` or `pr`.
+    indicators : sequence
+      Indicator instances, or (indicator, dict) tuples where the dictionary holds arguments specific to that
+      indicator.
+    memory : int
+      Memory budget of a single chunk, in bytes, see `plan_chunks`. Dask arrays are rechunked once according to
+      the indicators to compute, so that they need not be rechunked by each indicator.
+    **kwds
+      Arguments passed to every indicator whose signature accepts them, e.g. `freq`.
+
+    Returns
+    -------
+    xarray.Dataset
+      The indicators, named after their formatted identifier.
+
+    Example
+    -------
+    >>> from xclim import atmos, compute_many
+    >>> out = compute_many(ds, [atmos.tx_max, (atmos.tn_days_below, {'thresh': '-10 degC'})], freq='MS')
+    >>> out.to_netcdf('indicators.nc')
+    """
+    if ds.chunks:
+        ds = ds.chunk(plan_chunks(ds, indicators, memory))
+
+    # Variables are extracted once, since results are shared between identical input objects.
+    variables = {name: ds[name] for name in ds.data_vars}
+
+    out = xr.Dataset(attrs=ds.attrs)
+    with _sharing():
+        for ind in indicators:
+            ind, args = ind if isinstance(ind, tuple) else (ind, {})
+            names = ind._parameters[:ind._nvar]
+            missing = [name for name in names if name not in variables]
+            if missing:
+                raise KeyError("Variables {} required by `{}` are not in the dataset.".format(missing, ind.identifier))
+
+            kw = {k: v for (k, v) in kwds.items() if k in ind._parameters}
+            kw.update(args)
+            da = ind(*(variables[name] for name in names), **kw)
+
+            if da.name in out.data_vars:
+                raise ValueError("Indicator `{}` is computed more than once.".format(da.name))
+            out[da.name] = da
+    return out
+
+
 def parse_doc(doc):
     """Crude regex parsing."""
     if doc is None: